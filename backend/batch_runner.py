@@ -0,0 +1,341 @@
+"""Bulk prompt generation over a bounded worker pool.
+
+Used by POST /api/prompts/batch and as a standalone, resumable CLI:
+
+    python batch_runner.py --input prompts.jsonl --output results.jsonl
+    python batch_runner.py --input prompts.jsonl --output results.jsonl --user-id <id> --concurrency 16
+
+Input is one PromptGenerate object per line ({"user_input": ..., "mode":
+"sniper" | "titan", ...}) plus an optional "id" that is echoed back.
+Output is one result per line, in completion order, carrying the input
+line's index. The output file doubles as the checkpoint: rerunning the
+same command skips every line that already has a successful result and
+retries the rest. With --user-id, generated prompts are stored with one
+multi-row upsert per checkpoint flush. Each result is checkpointed with
+its prompt_id before the upsert and a {"stored": [indices]} line is
+appended after it, so prompts whose upsert never completed are stored
+again under the same id on resume instead of being duplicated.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, ValidationError
+
+from models import PromptGenerate
+
+logger = logging.getLogger(__name__)
+
+VALID_MODES = ("sniper", "titan")
+
+
+class BatchItem(BaseModel):
+    index: int
+    id: Optional[str] = None
+    request: Optional[PromptGenerate] = None
+    # Set for lines that can never succeed (bad JSON, unknown mode, ...)
+    error: Optional[str] = None
+
+
+def parse_line(index: int, line: str) -> Optional[BatchItem]:
+    """Batch item for one JSONL line, or None for a blank line"""
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+        item_id = record.get("id")
+        request = PromptGenerate(**record)
+    except (json.JSONDecodeError, AttributeError, ValidationError) as e:
+        return BatchItem(index=index, error=f"Invalid batch line: {e}")
+    item = BatchItem(index=index, id=None if item_id is None else str(item_id), request=request)
+    if request.mode not in VALID_MODES:
+        item.error = "Invalid mode. Must be 'sniper' or 'titan'"
+    return item
+
+
+def parse_batch(lines: Iterable[str]) -> Iterator[BatchItem]:
+    """Batch items from JSONL lines, numbered by line; blank lines are skipped"""
+    for index, line in enumerate(lines):
+        item = parse_line(index, line)
+        if item is not None:
+            yield item
+
+
+async def read_batch(chunks: AsyncIterable[bytes], max_items: Optional[int] = None) -> AsyncIterator[BatchItem]:
+    """Batch items from a JSONL byte stream, parsed as each line arrives.
+
+    After max_items items, an error item is yielded for the next line and
+    the rest of the stream is left unread.
+    """
+    buffer = b""
+    index = count = 0
+
+    async def lines() -> AsyncIterator[bytes]:
+        nonlocal buffer
+        async for chunk in chunks:
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+        if buffer:
+            yield buffer
+
+    async for line in lines():
+        item = parse_line(index, line.decode("utf-8", errors="replace"))
+        index += 1
+        if item is None:
+            continue
+        count += 1
+        if max_items is not None and count > max_items:
+            yield BatchItem(index=item.index, error=f"Batch is limited to {max_items} items")
+            return
+        yield item
+
+
+def batch_prompt_id(user_id: str, batch_id: str, index: int) -> str:
+    """Stable prompt id for one item of a named batch, so a rerun replaces rather than duplicates it"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"promptpilot:batch/{user_id}/{batch_id}/{index}"))
+
+
+class BatchRunner:
+    """Runs generations for batch items on a fixed number of workers.
+
+    Items are pulled lazily from the input, so memory stays bounded by
+    the worker count however long the batch is. Each item is retried
+    with exponential backoff before being reported as an error; results
+    are yielded as soon as each item finishes.
+    """
+
+    def __init__(self, generator, concurrency: int = 8, max_attempts: int = 3, retry_delay: float = 1.0):
+        self.generator = generator
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_delay = retry_delay
+
+    async def process(self, item: BatchItem) -> Dict[str, Any]:
+        """Generate one item, returning its result record"""
+        result: Dict[str, Any] = {"index": item.index, "id": item.id}
+        if item.error:
+            return {**result, "status": "error", "error": item.error, "attempts": 0, "retryable": False}
+
+        request = item.request
+        started = time.perf_counter()
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                generation = await self.generator.generate_concurrently(
+                    request.user_input,
+                    request.mode,
+                    include_examples=request.include_examples,
+                    validation_level=request.validation_level,
+                    include_suggestions=request.include_clarifications
+                )
+            except Exception as e:
+                error = e
+                logger.warning(f"Batch item {item.index} attempt {attempt}/{self.max_attempts} failed: {e}")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                continue
+            return {
+                **result,
+                "status": "ok",
+                "mode": request.mode,
+                "prompt": generation.prompt,
+                "llm_used": generation.llm_used,
+                "suggestions": generation.suggestions,
+                "tokens": generation.tokens,
+                "attempts": attempt,
+                "processing_time": (time.perf_counter() - started) * 1000
+            }
+        return {
+            **result,
+            "status": "error",
+            "error": getattr(error, "detail", str(error)),
+            "attempts": self.max_attempts,
+            "retryable": True
+        }
+
+    async def run(
+        self, items: Union[Iterable[BatchItem], AsyncIterable[BatchItem]]
+    ) -> AsyncIterator[Tuple[BatchItem, Dict[str, Any]]]:
+        """Yield (item, result record) pairs in completion order"""
+        todo: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def feed():
+            try:
+                if isinstance(items, AsyncIterable):
+                    async for item in items:
+                        await todo.put(item)
+                else:
+                    for item in items:
+                        await todo.put(item)
+            finally:
+                for _ in range(self.concurrency):
+                    await todo.put(None)
+
+        async def work():
+            while True:
+                item = await todo.get()
+                if item is None:
+                    await done.put(None)
+                    return
+                await done.put((item, await self.process(item)))
+
+        tasks = [asyncio.create_task(feed())] + [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            finished = 0
+            while finished < self.concurrency:
+                result = await done.get()
+                if result is None:
+                    finished += 1
+                else:
+                    yield result
+            # Surface errors from reading the input
+            await tasks[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class BatchCheckpoint:
+    """Append-only JSONL result log used to resume an interrupted batch"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Successful results whose prompt was not confirmed stored, by index
+        self.unstored: Dict[int, Dict[str, Any]] = {}
+
+    def completed(self) -> Set[int]:
+        """Indices of items that need no further attempts; also loads unstored"""
+        self.unstored = {}
+        if not os.path.exists(self.path):
+            return set()
+        completed = set()
+        with open(self.path, "rb+") as log:
+            valid_end = 0
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    break
+                valid_end += len(line)
+                if "stored" in record:
+                    for index in record["stored"]:
+                        self.unstored.pop(index, None)
+                    continue
+                if record.get("status") == "ok" or not record.get("retryable", True):
+                    completed.add(record["index"])
+                if record.get("prompt_id"):
+                    self.unstored[record["index"]] = record
+            log.truncate(valid_end)
+        return completed
+
+    def append(self, records: List[Dict[str, Any]]):
+        """Durably record finished items"""
+        if not records:
+            return
+        with open(self.path, "a", encoding="utf-8") as log:
+            for record in records:
+                log.write(json.dumps(record, default=str) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+    def mark_stored(self, indices: List[int]):
+        """Record that the prompts for these items have been saved"""
+        if indices:
+            self.append([{"stored": indices}])
+
+
+async def run_cli(args):
+    from generation import dynamic_generator, build_generated_prompt, load_templates
+    from database import connect_to_database, close_database_connection, get_repository
+
+    checkpoint = BatchCheckpoint(args.output)
+    completed = checkpoint.completed()
+    if completed:
+        logger.info(f"Resuming: {len(completed)} items already done")
+
+    if args.user_id:
+        await connect_to_database()
+    await load_templates()
+    runner = BatchRunner(dynamic_generator, args.concurrency, args.attempts, args.retry_delay)
+    counts = {"ok": 0, "error": 0}
+    pending: List[Tuple[BatchItem, Dict[str, Any]]] = []
+    # Checkpointed results whose prompts must be stored again
+    restore: List[Tuple[BatchItem, Dict[str, Any]]] = []
+    last_flush = time.monotonic()
+
+    def remaining(source) -> Iterator[BatchItem]:
+        for item in parse_batch(source):
+            if args.user_id and item.index in checkpoint.unstored:
+                restore.append((item, checkpoint.unstored.pop(item.index)))
+            if item.index not in completed:
+                yield item
+
+    async def flush():
+        nonlocal pending, restore, last_flush
+        # Taken up front so a failed upsert is never checkpointed twice
+        batch, pending = pending, []
+        restoring, restore = restore, []
+        last_flush = time.monotonic()
+        if args.user_id:
+            for _, record in batch:
+                if record["status"] == "ok":
+                    record["prompt_id"] = str(uuid.uuid4())
+        checkpoint.append([record for _, record in batch])
+        if not args.user_id:
+            return
+        stored, prompts = [], []
+        for item, record in restoring + batch:
+            if record["status"] == "ok":
+                prompt = build_generated_prompt(
+                    args.user_id, item.request, record["prompt"], record["llm_used"],
+                    record["processing_time"], record["prompt_id"]
+                )
+                stored.append(item.index)
+                prompts.append(prompt.model_dump())
+        if prompts:
+            await get_repository().create_prompts(prompts)
+            checkpoint.mark_stored(stored)
+
+    try:
+        with open(args.input, encoding="utf-8") as source:
+            async for item, record in runner.run(remaining(source)):
+                counts[record["status"]] += 1
+                pending.append((item, record))
+                if len(pending) >= args.flush_every or time.monotonic() - last_flush >= args.flush_interval:
+                    await flush()
+    finally:
+        await flush()
+        if args.user_id:
+            await close_database_connection()
+
+    print(json.dumps({"completed": counts, "skipped": len(completed), "output": args.output}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="JSONL file of PromptGenerate objects")
+    parser.add_argument("--output", required=True, help="JSONL results file, also used to resume")
+    parser.add_argument("--user-id", help="store generated prompts for this user")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")))
+    parser.add_argument("--attempts", type=int, default=3, help="attempts per item")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="seconds before the first retry")
+    parser.add_argument("--flush-every", type=int, default=50, help="results per checkpoint flush")
+    parser.add_argument("--flush-interval", type=float, default=5.0, help="max seconds between flushes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_cli(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Intent classifier accuracy and latency benchmark.
+
+Trains the local classifier on a labeled set (a JSONL export of
+prompt_sessions, or a synthetic set built from templates when --input is
+omitted), then reports hold-out accuracy, coverage above the confidence
+threshold and per-prediction latency:
+
+    python benchmarks/bench_intent_classifier.py
+    python benchmarks/bench_intent_classifier.py --input sessions.jsonl --threshold 0.7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from intent_classifier import IntentClassifier, evaluate, read_jsonl, split
+
+# Phrasings that avoid the keyword matcher's patterns, i.e. the prompts
+# that previously went to the LLM fallback
+TEMPLATES = {
+    "coding": [
+        "build me a {x} endpoint that returns paginated results",
+        "make a command line tool that converts {x} files",
+        "create a react component for {x}",
+        "generate a regex that matches {x}",
+    ],
+    "debugging": [
+        "my {x} crashes on startup with a segfault",
+        "why does {x} return undefined here",
+        "the {x} build fails after upgrading",
+        "tests for {x} keep timing out",
+    ],
+    "writing": [
+        "draft a newsletter about {x}",
+        "compose a linkedin post announcing {x}",
+        "put together release notes for {x}",
+        "prepare a press release on {x}",
+    ],
+    "analysis": [
+        "what are the pros and cons of {x}",
+        "break down the market for {x}",
+        "which is better for {x} and why",
+        "summarize the trends in {x} data",
+    ],
+    "general": [
+        "tell me about {x}",
+        "what is {x}",
+        "give me a fun fact about {x}",
+        "who invented {x}",
+    ],
+}
+TOPICS = [
+    "invoices", "weather stations", "a todo app", "kubernetes", "csv exports", "payments",
+    "our mobile app", "electric cars", "coffee shops", "the login page", "rust", "a podcast",
+    "solar panels", "the billing service", "remote work", "a chess engine", "email signups",
+]
+
+
+def synthetic_dataset(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for _ in range(size):
+        label = rng.choice(list(TEMPLATES))
+        texts.append(rng.choice(TEMPLATES[label]).format(x=rng.choice(TOPICS)))
+        labels.append(label)
+    return texts, labels
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(args):
+    texts, labels = read_jsonl(args.input) if args.input else synthetic_dataset(args.samples)
+    (train_texts, train_labels), (test_texts, test_labels) = split(texts, labels, args.holdout)
+
+    started = time.perf_counter()
+    classifier = IntentClassifier.train(train_texts, train_labels, epochs=args.epochs)
+    print(f"trained on {len(train_texts)} samples in {time.perf_counter() - started:.2f}s")
+    print(f"hold-out: {evaluate(classifier, test_texts, test_labels, args.threshold)}")
+
+    latencies = []
+    for text in test_texts:
+        started = time.perf_counter()
+        classifier.predict(text)
+        latencies.append(time.perf_counter() - started)
+    print(
+        f"predict latency: p50 {percentile(latencies, 50) * 1e6:.0f} us, "
+        f"p99 {percentile(latencies, 99) * 1e6:.0f} us"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL export of prompt_sessions")
+    parser.add_argument("--samples", type=int, default=5000, help="synthetic set size when --input is omitted")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    run(parser.parse_args())
@@ -0,0 +1,102 @@
+"""Intent matcher micro-benchmark.
+
+Compares the compiled single-pass IntentMatcher used by IntentRecognizer
+with the previous approach (a substring scan per pattern per intent) on
+inputs of increasing length, and reports throughput. The matcher's cost
+grows with the input only, while the substring scan grows with input
+length times pattern count, so both are also timed with a larger
+synthetic pattern set:
+
+    python benchmarks/bench_intent_matcher.py
+    python benchmarks/bench_intent_matcher.py --sizes 1000 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from intent_matcher import IntentMatcher
+from prompt_enhancer import IntentRecognizer
+
+FILLER = (
+    "please help me with this task it should be clear and concise and handle the classic "
+    "edge cases we discussed in the meeting yesterday including the stories from the team "
+    "about their texts and the copyrighted materials that were reviewed last quarter"
+).split()
+
+
+def legacy_scores(intent_patterns, user_prompt):
+    """The substring scan IntentRecognizer.detect_intent used before IntentMatcher"""
+    prompt_lower = user_prompt.lower()
+    intent_scores = {}
+    for intent, patterns in intent_patterns.items():
+        score = sum(1 for pattern in patterns if pattern in prompt_lower)
+        if score > 0:
+            intent_scores[intent] = score
+    return intent_scores
+
+
+def make_input(size: int, rng: random.Random) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    # A couple of real signals somewhere in the middle
+    middle = len(words) // 2
+    words[middle:middle] = ["debug", "this", "python", "function", "error"]
+    return " ".join(words)
+
+
+def timed(fn, text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat
+
+
+def run(sizes, repeat: int):
+    recognizer = IntentRecognizer()
+    matcher = recognizer.matcher
+    rng = random.Random(7)
+
+    print(f"{'chars':>9}  {'legacy':>12}  {'compiled':>12}  {'compiled MB/s':>13}  result")
+    for size in sizes:
+        text = make_input(size, rng)
+        legacy = timed(lambda t: legacy_scores(recognizer.intent_patterns, t), text, repeat)
+        compiled = timed(matcher.scores, text, repeat)
+        best = matcher.best(text)
+        print(
+            f"{len(text):>9}  {legacy * 1000:>9.3f} ms  {compiled * 1000:>9.3f} ms  "
+            f"{len(text) / compiled / 1e6:>13.1f}  {best.value if best else None}"
+        )
+
+    # Scaling with the number of patterns
+    text = make_input(sizes[-1], rng)
+    for extra in (0, 500, 2000):
+        patterns = {
+            intent: list(phrases) + [f"{intent.value} topic {i}" for i in range(extra // len(recognizer.intent_patterns))]
+            for intent, phrases in recognizer.intent_patterns.items()
+        }
+        count = sum(len(phrases) for phrases in patterns.values())
+        legacy = timed(lambda t: legacy_scores(patterns, t), text, max(1, repeat // 10))
+        compiled = timed(IntentMatcher(patterns).scores, text, max(1, repeat // 10))
+        print(f"{count:>5} patterns, {len(text)} chars: legacy {legacy * 1000:.2f} ms / compiled {compiled * 1000:.2f} ms")
+
+    # Matching semantics: word boundaries the substring scan ignored
+    for sample in ["Give me a classic car story", "Port this C++ code to Python"]:
+        legacy = {intent.value: score for intent, score in legacy_scores(recognizer.intent_patterns, sample).items()}
+        compiled = {intent.value: score for intent, score in matcher.scores(sample).items()}
+        print(f"{sample!r}: legacy {legacy} / compiled {compiled}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[200, 2000, 20000, 200000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
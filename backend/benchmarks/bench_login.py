@@ -0,0 +1,78 @@
+"""Login storm benchmark.
+
+Runs concurrent logins against the API in-process while polling an
+unrelated endpoint (/api/health), and reports login throughput and the
+health endpoint's latency percentiles. Compare hashing configurations by
+changing PASSWORD_HASH_WORKERS / PASSWORD_HASH_MODE / BCRYPT_ROUNDS:
+
+    python benchmarks/bench_login.py --logins 200 --concurrency 50
+    PASSWORD_HASH_MODE=process python benchmarks/bench_login.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+import server
+from database import connect_to_database, close_database_connection
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(logins: int, concurrency: int):
+    await connect_to_database()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        credentials = {"email": "bench@example.com", "password": "bench-password"}
+        await client.post("/api/register", json={"username": "bench", **credentials})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = []
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/api/login", json=credentials)
+                statuses.append(response.status_code)
+
+        health_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/api/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    await close_database_connection()
+    server.password_hasher.shutdown()
+
+    print(f"hasher:              {server.password_hasher.stats()}")
+    print(f"logins:              {logins} in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+    print(f"login statuses:      { {code: statuses.count(code) for code in set(statuses)} }")
+    print(f"/api/health samples: {len(health_latencies)}")
+    print(f"/api/health p50:     {percentile(health_latencies, 50) * 1000:.1f} ms")
+    print(f"/api/health p99:     {percentile(health_latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.concurrency))
@@ -0,0 +1,186 @@
+"""Repository conformance checks and micro-benchmark.
+
+Runs the same sequence of operations against every available backend
+through the InstrumentedRepository layer, asserting that they behave
+identically, then times the hot read paths:
+
+    python benchmarks/bench_repository.py
+    python benchmarks/bench_repository.py --backends memory sqlite --prompts 5000
+
+The Supabase backend is included when SUPABASE_URL / SUPABASE_ANON_KEY are set.
+Conformance data is created under a throwaway user and deleted afterwards.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database import InMemoryDatabase
+from repository import InstrumentedRepository, Repository, decode_cursor, encode_cursor
+from sqlite_database import SQLiteDatabase
+from user_cache import UserCache
+
+
+async def open_backend(name: str, workdir: str):
+    if name == "memory":
+        return InMemoryDatabase()
+    if name == "sqlite":
+        backend = SQLiteDatabase(os.path.join(workdir, "bench.sqlite3"))
+    elif name == "supabase":
+        from supabase_config import SupabaseDatabase
+        backend = SupabaseDatabase()
+    else:
+        raise ValueError(f"Unknown backend: {name}")
+    if not await backend.connect():
+        raise RuntimeError(f"Could not connect to {name}")
+    return backend
+
+
+async def close_backend(backend):
+    if hasattr(backend, "disconnect"):
+        await backend.disconnect()
+
+
+def make_user(**overrides):
+    now = datetime.now(timezone.utc)
+    user = {
+        "id": str(uuid.uuid4()),
+        "username": "bench",
+        "email": f"bench-{uuid.uuid4().hex[:12]}@example.com",
+        "hashed_password": "not-a-real-hash",
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now,
+    }
+    user.update(overrides)
+    return user
+
+
+def make_prompt(user_id: str, created_at: datetime, text: str = "bench prompt"):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "raw_input": text,
+        "generated_output": f"Generated: {text}",
+        "detected_role": "developer",
+        "persona": "sniper",
+        "source": "bench",
+        "analytics": {"tokens": 42},
+        "created_at": created_at,
+    }
+
+
+async def check_conformance(repo: InstrumentedRepository):
+    """Assert the Repository contract against a throwaway user"""
+    assert isinstance(repo.backend, Repository), "backend does not implement Repository"
+    assert repo.is_connected()
+
+    user = make_user()
+    await repo.create_user(user)
+    try:
+        by_email = await repo.get_user_by_email(user["email"])
+        assert by_email and by_email["id"] == user["id"], "get_user_by_email"
+        assert (await repo.get_user_by_id(user["id"]))["email"] == user["email"], "get_user_by_id"
+        assert await repo.get_user_by_id(str(uuid.uuid4())) is None, "missing user should be None"
+
+        # Cached reads must not survive a write through the repository
+        assert await repo.update_user(user["id"], {"username": "renamed"}), "update_user"
+        assert (await repo.get_user_by_id(user["id"]))["username"] == "renamed", "stale cache after update"
+
+        base = datetime.now(timezone.utc)
+        prompts = [make_prompt(user["id"], base + timedelta(seconds=i), f"prompt {i}") for i in range(5)]
+        for prompt in prompts:
+            await repo.create_prompt(prompt)
+        listed = await repo.get_user_prompts(user["id"], limit=3)
+        assert [p["id"] for p in listed] == [p["id"] for p in reversed(prompts)][:3], "prompts newest first"
+        assert listed[0]["analytics"] == {"tokens": 42}, "JSON columns round-trip"
+
+        next_page = await repo.get_user_prompts(user["id"], limit=3, before=decode_cursor(encode_cursor(listed[-1])))
+        assert [p["id"] for p in next_page] == [p["id"] for p in reversed(prompts)][3:], "keyset pagination"
+        summaries = await repo.get_user_prompt_summaries(user["id"], limit=3)
+        assert [p["id"] for p in summaries] == [p["id"] for p in listed], "summaries match full rows"
+        assert "generated_output" not in summaries[0] and summaries[0]["output_preview"], "summary projection"
+        assert (await repo.get_prompt(prompts[0]["id"], user["id"]))["raw_input"] == "prompt 0", "get_prompt"
+        assert await repo.get_prompt(prompts[0]["id"], str(uuid.uuid4())) is None, "get_prompt is owner-scoped"
+
+        found = await repo.search_prompts(user["id"], "Prompt 3")
+        assert found and found[0]["id"] == prompts[3]["id"] and "score" in found[0], "search_prompts"
+        assert not await repo.search_prompts(str(uuid.uuid4()), "prompt"), "search_prompts is owner-scoped"
+
+        assert await repo.delete_prompt(prompts[-1]["id"], user["id"]), "delete_prompt"
+        assert prompts[-1]["id"] not in [p["id"] for p in await repo.search_prompts(user["id"], "prompt")], "search after delete"
+        assert not await repo.delete_prompt(prompts[0]["id"], str(uuid.uuid4())), "delete_prompt is owner-scoped"
+        assert len(await repo.get_user_prompts(user["id"])) == 4
+
+        event = {
+            "id": str(uuid.uuid4()),
+            "user_id": user["id"],
+            "event_type": "bench",
+            "event_data": {"ok": True},
+            "timestamp": base,
+        }
+        assert await repo.create_analytics_event(event), "create_analytics_event"
+        events = await repo.get_analytics_events(user["id"])
+        assert events and events[0]["event_type"] == "bench", "get_analytics_events"
+
+        stats = await repo.get_stats()
+        assert stats["users_count"] >= 1 and stats["prompts_count"] >= 4, "get_stats"
+    finally:
+        assert await repo.delete_user(user["id"]), "delete_user"
+    assert await repo.get_user_by_id(user["id"]) is None, "stale cache after delete"
+
+
+async def bench(repo: InstrumentedRepository, prompts: int, reads: int):
+    user = make_user()
+    await repo.create_user(user)
+    base = datetime.now(timezone.utc)
+
+    started = time.perf_counter()
+    for i in range(prompts):
+        await repo.create_prompt(make_prompt(user["id"], base + timedelta(milliseconds=i)))
+    insert_elapsed = time.perf_counter() - started
+
+    for _ in range(reads):
+        await repo.get_user_prompts(user["id"], limit=50)
+        await repo.get_user_prompt_summaries(user["id"], limit=50)
+        await repo.get_user_by_id(user["id"])
+        await repo.get_user_by_email(user["email"])
+
+    await repo.delete_user(user["id"])
+    return insert_elapsed
+
+
+async def run(backends, prompts: int, reads: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in backends:
+            backend = await open_backend(name, workdir)
+            repo = InstrumentedRepository(backend, cache=UserCache())
+            try:
+                await check_conformance(repo)
+                print(f"[{name}] conformance: ok")
+
+                insert_elapsed = await bench(repo, prompts, reads)
+                print(f"[{name}] inserted {prompts} prompts in {insert_elapsed:.2f}s ({prompts / insert_elapsed:.0f}/s)")
+                for operation, stats in repo.operation_stats().items():
+                    print(f"[{name}]   {operation:<26} {stats}")
+            finally:
+                await close_backend(backend)
+
+
+if __name__ == "__main__":
+    default_backends = ["memory", "sqlite"]
+    if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_ANON_KEY"):
+        default_backends.append("supabase")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=default_backends, choices=["memory", "sqlite", "supabase"])
+    parser.add_argument("--prompts", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.backends, args.prompts, args.reads))
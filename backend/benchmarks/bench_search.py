@@ -0,0 +1,116 @@
+"""Prompt history search benchmark.
+
+Loads a synthetic history for a single user into the in-memory and
+SQLite backends, then reports query latency percentiles for a mix of
+rare, common and multi-term queries:
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --prompts 100000 --queries 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database import InMemoryDatabase
+from sqlite_database import SQLiteDatabase
+
+TOPICS = (
+    "python javascript react fastapi sql database index query marketing campaign email "
+    "newsletter story character plot poem essay summary analysis report budget forecast "
+    "customer support ticket refund recipe travel itinerary fitness workout resume cover "
+    "letter interview lesson plan quiz physics chemistry biology history design logo brand"
+).split()
+# Topic words first, then filler, drawn with Zipf-like frequencies as in natural text
+VOCABULARY = TOPICS + [f"word{i}" for i in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+QUERIES = ["python", "marketing email", "refund ticket customer", "poem", "sql index query", "word900"]
+
+
+def make_prompt(user_id: str, created_at: datetime, rng: random.Random):
+    words = rng.choices(VOCABULARY, WEIGHTS, k=12)
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "raw_input": "Write a " + " ".join(words),
+        "generated_output": "You are an expert. " + " ".join(rng.choices(VOCABULARY, WEIGHTS, k=120)),
+        "detected_role": "assistant",
+        "persona": "Expert Assistant",
+        "source": "bench",
+        "analytics": {},
+        "created_at": created_at,
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def bench(name: str, db, prompts: int, queries: int):
+    rng = random.Random(42)
+    user_id = str(uuid.uuid4())
+    base = datetime.now(timezone.utc)
+    await db.create_user({
+        "id": user_id,
+        "username": "bench",
+        "email": f"{user_id}@example.com",
+        "hashed_password": "not-a-real-hash",
+        "is_active": True,
+        "created_at": base,
+        "updated_at": base,
+    })
+
+    started = time.perf_counter()
+    batch = []
+    for i in range(prompts):
+        batch.append(make_prompt(user_id, base + timedelta(milliseconds=i), rng))
+        if len(batch) == 1000:
+            await db.create_prompts(batch)
+            batch = []
+    if batch:
+        await db.create_prompts(batch)
+    load_elapsed = time.perf_counter() - started
+
+    latencies = {query: [] for query in QUERIES}
+    hits = {}
+    for i in range(queries):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        results = await db.search_prompts(user_id, query, limit=20)
+        latencies[query].append(time.perf_counter() - started)
+        hits[query] = len(results)
+
+    print(f"[{name}] indexed {prompts} prompts in {load_elapsed:.1f}s")
+    for query, samples in latencies.items():
+        print(f"[{name}]   {query!r:<26} {hits[query]:>3} hits   p50 {percentile(samples, 50) * 1000:7.2f} ms   p99 {percentile(samples, 99) * 1000:7.2f} ms")
+
+
+async def run(backends, prompts: int, queries: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in backends:
+            if name == "memory":
+                await bench(name, InMemoryDatabase(), prompts, queries)
+            else:
+                db = SQLiteDatabase(os.path.join(workdir, "bench.sqlite3"))
+                await db.connect()
+                try:
+                    await bench(name, db, prompts, queries)
+                finally:
+                    await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite"])
+    parser.add_argument("--prompts", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=120)
+    args = parser.parse_args()
+    asyncio.run(run(args.backends, args.prompts, args.queries))
@@ -0,0 +1,68 @@
+"""Tracing overhead benchmark.
+
+Reports the cost of a span when the request is untraced (no current
+span), when it is traced, and of finishing a request-sized trace
+(Server-Timing header plus OTLP serialization for sampled traces):
+
+    python benchmarks/bench_tracing.py
+    python benchmarks/bench_tracing.py --iterations 200000 --spans 12
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tracing import Trace, current_span, otlp_payload, span
+
+
+def time_spans(iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with span("bench"):
+            pass
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--spans", type=int, default=10, help="spans per simulated request")
+    args = parser.parse_args()
+
+    untraced = time_spans(args.iterations)
+
+    requests = max(args.iterations // args.spans, 1)
+    trace = Trace(max_spans=args.iterations + 1)
+    token = current_span.set(trace.start_span("root", None))
+    traced = time_spans(args.iterations)
+    current_span.reset(token)
+
+    header_us = export_us = 0.0
+    for _ in range(requests):
+        trace = Trace()
+        root = trace.start_span("POST /api/prompts/generate", None)
+        token = current_span.set(root)
+        for index in range(args.spans):
+            with span(f"stage.{index % 4}"):
+                pass
+        current_span.reset(token)
+        root.end()
+
+        started = time.perf_counter()
+        trace.server_timing()
+        header_us += time.perf_counter() - started
+        started = time.perf_counter()
+        json.dumps(otlp_payload([trace], "bench"))
+        export_us += time.perf_counter() - started
+
+    print(f"untraced span:          {untraced:8.3f} us")
+    print(f"traced span:            {traced:8.3f} us")
+    print(f"Server-Timing header:   {header_us / requests * 1e6:8.3f} us per request ({args.spans} spans)")
+    print(f"OTLP serialization:     {export_us / requests * 1e6:8.3f} us per sampled request (off the request path)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
+import bisect
 import logging
 import os
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List, Union
 from supabase_config import get_supabase_client, init_supabase, close_supabase
+from sqlite_database import sqlite_db
+from search_index import PromptSearchIndex
+from repository import InstrumentedRepository, PromptCursor, summarize_prompt
+from user_cache import user_cache
 
 logger = logging.getLogger(__name__)
 
 # In-memory storage for all data (fallback)
 class InMemoryDatabase:
+    """In-memory backend with the same async interface as SupabaseDatabase.
+    
+    Secondary indexes keep lookups independent of the total data size:
+    users_by_email maps emails to user ids, and each user's prompts are
+    kept in created_at order (with a parallel list of sort keys for
+    bisection), so history fetches cost O(limit). A per-user inverted
+    index backs search_prompts.
+    """
     def __init__(self):
         self.users = {}
         self.prompts = {}
@@ -16,6 +30,12 @@ class InMemoryDatabase:
         self.personas = {}
         self.knowledge_documents = {}
         
+        # Secondary indexes
+        self.users_by_email: Dict[str, str] = {}
+        self.prompts_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        self.prompt_keys_by_user: Dict[str, List[Any]] = {}
+        self.search_index = PromptSearchIndex()
+        
     def clear_all(self):
         """Clear all in-memory data"""
         self.users.clear()
@@ -25,21 +45,163 @@ class InMemoryDatabase:
         self.intents.clear()
         self.personas.clear()
         self.knowledge_documents.clear()
+        self.users_by_email.clear()
+        self.prompts_by_user.clear()
+        self.prompt_keys_by_user.clear()
+        self.search_index.clear()
+    
+    # User operations
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new user"""
+        if user_data["email"] in self.users_by_email:
+            raise ValueError("Email already registered")
+        self.users[user_data["id"]] = user_data
+        self.users_by_email[user_data["email"]] = user_data["id"]
+        return user_data
+    
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        user_id = self.users_by_email.get(email)
+        return self.users.get(user_id) if user_id else None
+    
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        return self.users.get(user_id)
+    
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update user data"""
+        user = self.users.get(user_id)
+        if user is None:
+            return False
+        if "email" in update_data and update_data["email"] != user["email"]:
+            del self.users_by_email[user["email"]]
+            self.users_by_email[update_data["email"]] = user_id
+        user.update(update_data, updated_at=datetime.now(timezone.utc))
+        return True
+    
+    async def delete_user(self, user_id: str) -> bool:
+        """Delete a user"""
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return False
+        self.users_by_email.pop(user["email"], None)
+        return True
+    
+    # Prompt operations
+    async def create_prompt(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new prompt"""
+        user_id = prompt_data["user_id"]
+        self.prompts[prompt_data["id"]] = prompt_data
+        
+        user_prompts = self.prompts_by_user.setdefault(user_id, [])
+        keys = self.prompt_keys_by_user.setdefault(user_id, [])
+        sort_key = (prompt_data["created_at"], prompt_data["id"])
+        # New prompts almost always land at the end
+        index = bisect.bisect_right(keys, sort_key)
+        keys.insert(index, sort_key)
+        user_prompts.insert(index, prompt_data)
+        self.search_index.add(prompt_data)
+        return prompt_data
+    
+    async def create_prompts(self, prompts: List[Dict[str, Any]]) -> int:
+        """Create several prompts at once, replacing any with the same id"""
+        for prompt_data in prompts:
+            existing = self.prompts.get(prompt_data["id"])
+            if existing is not None:
+                await self.delete_prompt(existing["id"], existing["user_id"])
+            await self.create_prompt(prompt_data)
+        return len(prompts)
+    
+    async def get_user_prompts(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get user's prompts, newest first, starting after the before cursor"""
+        user_prompts = self.prompts_by_user.get(user_id, [])
+        end = len(user_prompts)
+        if before is not None:
+            end = bisect.bisect_left(self.prompt_keys_by_user.get(user_id, []), before)
+        start = max(0, end - max(0, limit))
+        return user_prompts[start:end][::-1]
+    
+    async def get_user_prompt_summaries(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get summaries of user's prompts, newest first"""
+        return [summarize_prompt(prompt) for prompt in await self.get_user_prompts(user_id, limit, before)]
+    
+    async def get_prompt(self, prompt_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single prompt owned by the user"""
+        prompt = self.prompts.get(prompt_id)
+        if prompt is None or prompt["user_id"] != user_id:
+            return None
+        return prompt
+    
+    async def delete_prompt(self, prompt_id: str, user_id: str) -> bool:
+        """Delete a prompt"""
+        prompt = self.prompts.get(prompt_id)
+        if prompt is None or prompt["user_id"] != user_id:
+            return False
+        del self.prompts[prompt_id]
+        
+        keys = self.prompt_keys_by_user[user_id]
+        index = bisect.bisect_left(keys, (prompt["created_at"], prompt_id))
+        del keys[index]
+        del self.prompts_by_user[user_id][index]
+        self.search_index.remove(prompt)
+        return True
+    
+    async def search_prompts(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Full-text search over user's prompts, best matches first"""
+        return [
+            {**summarize_prompt(self.prompts[prompt_id]), "score": round(score, 4)}
+            for prompt_id, score in self.search_index.search(user_id, query, limit, offset)
+        ]
+    
+    # Analytics operations
+    async def create_analytics_event(self, event_data: Dict[str, Any]) -> bool:
+        """Create analytics event"""
+        self.analytics_events.append(event_data)
+        return True
+    
+    async def get_analytics_events(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get user's analytics events, newest first"""
+        events = [event for event in self.analytics_events if event.get("user_id") == user_id]
+        events.sort(key=lambda event: event.get("timestamp"), reverse=True)
+        return events[:limit]
+    
+    def is_connected(self) -> bool:
+        return True
+    
+    async def get_stats(self) -> Dict[str, int]:
+        """Row counts for status reporting"""
+        return {"users_count": len(self.users), "prompts_count": len(self.prompts)}
 
 # Global database instances
 db_instance = InMemoryDatabase()
 use_supabase = False
+use_sqlite = False
 supabase_client = None
+repository: Optional[InstrumentedRepository] = None
 
 async def connect_to_database():
-    """Initialize database connection (Supabase or in-memory fallback)"""
-    global use_supabase, supabase_client
+    """Initialize database connection.
+    
+    DATABASE_BACKEND selects "supabase", "sqlite" or "memory". When unset,
+    Supabase is used if credentials are configured, otherwise in-memory.
+    """
+    global use_supabase, use_sqlite, supabase_client
+    
+    backend = os.getenv('DATABASE_BACKEND', '').lower()
+    
+    if backend == 'sqlite':
+        logger.info("🚀 Opening SQLite database")
+        if await sqlite_db.connect():
+            use_sqlite = True
+            return
+        logger.warning("⚠️ SQLite database unavailable")
     
     # Check if Supabase credentials are available
     supabase_url = os.getenv('SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_ANON_KEY')
+    postgrest_url = os.getenv('POSTGREST_URL')
     
-    if supabase_url and supabase_key:
+    if backend in ('', 'supabase') and ((supabase_url and supabase_key) or postgrest_url):
         logger.info("🚀 Attempting to connect to Supabase database")
         try:
             success = await init_supabase()
@@ -62,31 +224,53 @@ connect_to_mongo = connect_to_database
 
 async def close_database_connection():
     """Close database connection"""
-    global use_supabase, supabase_client
+    global use_supabase, use_sqlite, supabase_client
     
     if use_supabase and supabase_client:
         await close_supabase()
         logger.info("🔌 Supabase connection closed")
+    elif use_sqlite:
+        await sqlite_db.disconnect()
     else:
         logger.info("🔌 Clearing in-memory database")
         db_instance.clear_all()
     
+    user_cache.clear()
     use_supabase = False
+    use_sqlite = False
     supabase_client = None
 
 # Alias for backward compatibility
 close_mongo_connection = close_database_connection
 
 def get_database():
-    """Get database instance (Supabase or in-memory)"""
+    """Get database instance (Supabase, SQLite or in-memory)"""
     if use_supabase and supabase_client:
         return supabase_client
+    if use_sqlite:
+        return sqlite_db
     return db_instance
 
+def get_repository() -> InstrumentedRepository:
+    """Get the active backend behind the shared instrumentation/caching layer"""
+    global repository
+    backend = get_database()
+    if repository is None or repository.backend is not backend:
+        repository = InstrumentedRepository(backend)
+    return repository
+
 def is_using_supabase() -> bool:
     """Check if using Supabase database"""
     return use_supabase
 
+def get_database_type() -> str:
+    """Name of the active database backend"""
+    if use_supabase:
+        return "supabase"
+    if use_sqlite:
+        return "sqlite"
+    return "in_memory"
+
 async def create_indexes():
     """Initialize database structure"""
     try:
@@ -98,8 +282,10 @@ async def create_indexes():
         logger.warning(f"⚠️ Failed to initialize database structure: {e}")
 
 async def check_database_health():
-    """Check in-memory database health"""
+    """Check database health"""
     try:
+        if use_sqlite:
+            return sqlite_db.is_connected()
         # Always healthy for in-memory database
         logger.debug("✅ In-memory database health check: Always healthy")
         return True
@@ -0,0 +1,143 @@
+"""Prompt generation shared by the API server, the job worker and the batch CLI.
+
+Importing this module builds the generator and the prompt write-behind
+queue but no app, job store or tracer, so job_queue.py and
+batch_runner.py can use it without importing server.py.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Provider keys are read when the generator is built
+load_dotenv(Path(__file__).parent / '.env')
+
+from database import get_repository
+from models import Prompt, PromptGenerate
+from prompt_enhancer import DynamicPromptGenerator, LLMService, db_service
+from response_cache import create_response_cache
+from tracing import span
+from write_behind import create_write_behind_queue
+
+logger = logging.getLogger(__name__)
+
+llm_service = LLMService()
+dynamic_generator = DynamicPromptGenerator(llm_service, cache=create_response_cache())
+
+async def load_templates() -> int:
+    """Register the prompt_templates table's templates with the generator"""
+    loaded = dynamic_generator.templates.load_rows(await db_service.get_prompt_templates())
+    logger.info(f"Loaded {loaded} prompt templates from the database")
+    return loaded
+
+async def write_prompts(prompts: List[Dict[str, Any]]):
+    """Write a batch of generated prompt records"""
+    await get_repository().create_prompts(prompts)
+
+# Generated prompts are persisted in the background, after the response is sent
+prompt_writer = create_write_behind_queue(
+    "prompts",
+    write_prompts,
+    decode=lambda record: Prompt(**record).model_dump()
+)
+
+def build_generated_prompt(
+    user_id: str,
+    request: PromptGenerate,
+    generated_prompt: str,
+    llm_used: str,
+    processing_time: float,
+    prompt_id: Optional[str] = None
+) -> Prompt:
+    """Create the prompt record for a generation"""
+    return Prompt(
+        id=prompt_id or str(uuid.uuid4()),
+        user_id=user_id,
+        raw_input=request.user_input,
+        generated_output=generated_prompt,
+        detected_role="Dynamic AI Assistant",
+        persona="Expert Assistant",
+        source="dynamic_generation",
+        analytics={
+            "input_length": len(request.user_input),
+            "output_length": len(generated_prompt),
+            "processing_time": processing_time,
+            "mode_used": request.mode,
+            "llm_used": llm_used
+        },
+        created_at=datetime.now(timezone.utc)
+    )
+
+def save_generated_prompt(
+    user_id: str,
+    request: PromptGenerate,
+    generated_prompt: str,
+    llm_used: str,
+    processing_time: float,
+    prompt_id: Optional[str] = None
+) -> Prompt:
+    """Create the prompt record for a generation and queue it for persistence"""
+    prompt = build_generated_prompt(user_id, request, generated_prompt, llm_used, processing_time, prompt_id)
+    prompt_writer.enqueue(prompt.model_dump())
+    return prompt
+
+def build_generation_metadata(
+    llm_used: str,
+    processing_time: float,
+    cache: Optional[Dict[str, Any]] = None,
+    tokens: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Response metadata shared by the generation endpoints"""
+    return {
+        "detected_intent": {"name": "dynamic", "slug": "dynamic"},
+        "assigned_persona": {"name": "Dynamic AI Assistant", "slug": "dynamic"},
+        "confidence_score": 0.9,
+        "processing_time": processing_time,
+        "validation_passed": True,
+        "llm_used": llm_used,
+        "cache": cache,
+        "tokens": tokens
+    }
+
+async def run_generation(user_id: str, request: PromptGenerate) -> Dict[str, Any]:
+    """Generate and save a prompt, returning the /prompts/generate response body"""
+    start_time = time.perf_counter()
+
+    # Generate the prompt and suggestions concurrently (titan mode for anything but sniper)
+    result = await dynamic_generator.generate_concurrently(
+        request.user_input,
+        request.mode,
+        include_examples=request.include_examples,
+        validation_level=request.validation_level,
+        include_suggestions=request.include_clarifications
+    )
+
+    processing_time = (time.perf_counter() - start_time) * 1000
+
+    # Queued for the write-behind insert; the insert itself happens after the response
+    with span("db.enqueue_prompt"):
+        prompt = save_generated_prompt(user_id, request, result.prompt, result.llm_used, processing_time)
+
+    return {
+        "prompt_id": prompt.id,
+        "quick_prompt": result.prompt,  # Same prompt for both modes
+        "professional_prompt": result.prompt,
+        "metadata": build_generation_metadata(
+            result.llm_used,
+            processing_time,
+            dynamic_generator.cache_metadata(result.cache_hit, result.suggestions_cache_hit),
+            result.tokens
+        ),
+        "suggestions": result.suggestions,
+        "source": "dynamic_generation"
+    }
+
+async def run_generation_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for /prompts/generate requests submitted with async=true"""
+    return await run_generation(job["user_id"], PromptGenerate(**job["payload"]))
+
+job_handlers = {"prompt_generation": run_generation_job}
@@ -0,0 +1,259 @@
+"""Local intent classifier: hashed word n-grams and a softmax linear model.
+
+Used by IntentRecognizer when no keyword matches, so that most prompts
+are classified on the CPU in microseconds instead of with an LLM call.
+Trained from logged prompt_sessions (original_prompt -> detected_intent):
+
+    python intent_classifier.py train --from-supabase --output intent_classifier.npz
+    python intent_classifier.py train --input sessions.jsonl --output intent_classifier.npz
+    python intent_classifier.py evaluate --model intent_classifier.npz --input holdout.jsonl
+
+JSONL input has one {"original_prompt": ..., "detected_intent": ...} object
+per line; sessions whose intent was never detected (UNKNOWN_INTENT) are
+skipped. The model is a single .npz file holding the weights, bias,
+label names and feature settings.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT_VERSION = 1
+DEFAULT_DIM = 2 ** 16
+TOKEN_RE = re.compile(r"[a-z0-9_+#]+")
+# detected_intent of sessions logged before intent detection finished
+UNKNOWN_INTENT = "unknown"
+
+
+def featurize(text: str, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed unigram + bigram features as (indices, L2-normalized log counts)"""
+    tokens = TOKEN_RE.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    counts = Counter(zlib.crc32(gram.encode("utf-8")) % dim for gram in grams)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    norm = np.linalg.norm(values)
+    if norm > 0:
+        values /= norm
+    return indices, values
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self, labels: Sequence[str], weights: np.ndarray, bias: np.ndarray):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.dim = weights.shape[0]
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """Probability per label"""
+        indices, values = featurize(text, self.dim)
+        return _softmax(values @ self.weights[indices] + self.bias)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely label and its probability"""
+        probs = self.predict_proba(text)
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        dim: int = DEFAULT_DIM,
+        epochs: int = 20,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        batch_size: int = 64,
+        seed: int = 0,
+    ) -> "IntentClassifier":
+        """Fit with mini-batch AdaGrad on the softmax cross-entropy loss"""
+        label_names = sorted(set(labels))
+        label_ids = np.array([label_names.index(label) for label in labels])
+        features = [featurize(text, dim) for text in texts]
+        classes = len(label_names)
+
+        weights = np.zeros((dim, classes), dtype=np.float32)
+        bias = np.zeros(classes, dtype=np.float32)
+        weight_sq = np.full((dim, classes), 1e-8, dtype=np.float32)
+        bias_sq = np.full(classes, 1e-8, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for epoch in range(epochs):
+            order = rng.permutation(len(features))
+            total_loss = 0.0
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                rows = np.concatenate([np.full(len(features[i][0]), n) for n, i in enumerate(batch)])
+                cols = np.concatenate([features[i][0] for i in batch])
+                vals = np.concatenate([features[i][1] for i in batch])
+
+                logits = np.tile(bias, (len(batch), 1))
+                np.add.at(logits, rows, vals[:, None] * weights[cols])
+                probs = _softmax(logits)
+                targets = label_ids[batch]
+                total_loss -= np.log(probs[np.arange(len(batch)), targets] + 1e-12).sum()
+
+                grad_logits = probs
+                grad_logits[np.arange(len(batch)), targets] -= 1.0
+                grad_logits /= len(batch)
+
+                grad_weights = vals[:, None] * grad_logits[rows] + l2 * weights[cols]
+                touched, inverse = np.unique(cols, return_inverse=True)
+                grad_rows = np.zeros((len(touched), classes), dtype=np.float32)
+                np.add.at(grad_rows, inverse, grad_weights)
+                weight_sq[touched] += grad_rows ** 2
+                weights[touched] -= learning_rate * grad_rows / np.sqrt(weight_sq[touched])
+
+                grad_bias = grad_logits.sum(axis=0)
+                bias_sq += grad_bias ** 2
+                bias -= learning_rate * grad_bias / np.sqrt(bias_sq)
+
+            logger.info(f"epoch {epoch + 1}/{epochs}: loss {total_loss / len(features):.4f}")
+
+        return cls(label_names, weights, bias)
+
+    def save(self, path: str):
+        """Write the model artifact (.npz)"""
+        np.savez_compressed(
+            path,
+            format_version=np.array(MODEL_FORMAT_VERSION),
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Read a model artifact written by save()"""
+        with np.load(path, allow_pickle=False) as artifact:
+            version = int(artifact["format_version"])
+            if version != MODEL_FORMAT_VERSION:
+                raise ValueError(f"Unsupported intent model format {version} in {path}")
+            return cls([str(label) for label in artifact["labels"]], artifact["weights"], artifact["bias"])
+
+
+def load_intent_classifier() -> Optional[IntentClassifier]:
+    """Load the model named by INTENT_CLASSIFIER_PATH, or None if there isn't one"""
+    path = os.getenv("INTENT_CLASSIFIER_PATH", "intent_classifier.npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        classifier = IntentClassifier.load(path)
+        logger.info(f"✅ Loaded intent classifier from {path} ({len(classifier.labels)} intents)")
+        return classifier
+    except Exception as e:
+        logger.error(f"❌ Failed to load intent classifier from {path}: {e}")
+        return None
+
+
+def read_jsonl(path: str) -> Tuple[List[str], List[str]]:
+    """(texts, labels) from a JSONL export of prompt sessions"""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            if line.strip():
+                record = json.loads(line)
+                if record["detected_intent"] == UNKNOWN_INTENT:
+                    continue
+                texts.append(record["original_prompt"])
+                labels.append(record["detected_intent"])
+    return texts, labels
+
+
+async def fetch_sessions(limit: int) -> Tuple[List[str], List[str]]:
+    """(texts, labels) from the prompt_sessions table"""
+    from supabase_config import get_supabase_client
+
+    client = await get_supabase_client()
+    if not client.is_connected():
+        await client.connect()
+    rows = [row for row in await client.get_intent_training_data(limit) if row["detected_intent"] != UNKNOWN_INTENT]
+    return [row["original_prompt"] for row in rows], [row["detected_intent"] for row in rows]
+
+
+def split(texts: Sequence[str], labels: Sequence[str], holdout: float, seed: int = 0):
+    order = np.random.default_rng(seed).permutation(len(texts))
+    cut = int(len(order) * (1 - holdout))
+    pick = lambda ids: ([texts[i] for i in ids], [labels[i] for i in ids])
+    return pick(order[:cut]), pick(order[cut:])
+
+
+def evaluate(classifier: IntentClassifier, texts: Iterable[str], labels: Iterable[str], threshold: float) -> dict:
+    """Accuracy overall and on predictions above the confidence threshold"""
+    correct = confident = confident_correct = total = 0
+    for text, label in zip(texts, labels):
+        predicted, confidence = classifier.predict(text)
+        total += 1
+        correct += predicted == label
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += predicted == label
+    return {
+        "samples": total,
+        "accuracy": round(correct / total, 4) if total else None,
+        "threshold": threshold,
+        "coverage": round(confident / total, 4) if total else None,
+        "accuracy_above_threshold": round(confident_correct / confident, 4) if confident else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train a model from logged sessions")
+    source = train_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL file of sessions")
+    source.add_argument("--from-supabase", action="store_true", help="read prompt_sessions from Supabase")
+    train_parser.add_argument("--limit", type=int, default=50000, help="max sessions to read from Supabase")
+    train_parser.add_argument("--output", default="intent_classifier.npz")
+    train_parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    train_parser.add_argument("--epochs", type=int, default=20)
+    train_parser.add_argument("--holdout", type=float, default=0.2)
+    train_parser.add_argument("--threshold", type=float, default=float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.6")))
+
+    eval_parser = commands.add_parser("evaluate", help="report accuracy of a model")
+    eval_parser.add_argument("--model", default="intent_classifier.npz")
+    eval_parser.add_argument("--input", required=True, help="JSONL file of sessions")
+    eval_parser.add_argument("--threshold", type=float, default=float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.6")))
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "train":
+        if args.from_supabase:
+            texts, labels = asyncio.run(fetch_sessions(args.limit))
+        else:
+            texts, labels = read_jsonl(args.input)
+        (train_texts, train_labels), (test_texts, test_labels) = split(texts, labels, args.holdout)
+        classifier = IntentClassifier.train(train_texts, train_labels, dim=args.dim, epochs=args.epochs)
+        classifier.save(args.output)
+        print(f"Saved {args.output}: {len(train_texts)} training samples, labels {classifier.labels}")
+        if test_texts:
+            print(json.dumps(evaluate(classifier, test_texts, test_labels, args.threshold), indent=2))
+    else:
+        classifier = IntentClassifier.load(args.model)
+        texts, labels = read_jsonl(args.input)
+        print(json.dumps(evaluate(classifier, texts, labels, args.threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import re
+from typing import Dict, Generic, Hashable, List, Mapping, Optional, Sequence, Tuple, TypeVar, Union
+
+K = TypeVar("K", bound=Hashable)
+
+# A pattern is a phrase, optionally with a weight (default 1.0)
+Pattern = Union[str, Tuple[str, float]]
+
+# Inflections accepted after a pattern that ends in a letter ("error" -> "errors")
+SUFFIXES = r"(?:s|es|d|ed|ing|ged|ging)?"
+WORD_CHAR = r"[a-z0-9_]"
+
+
+def _trie_regex(phrases: Sequence[str]) -> str:
+    """Regex alternation for phrases with common prefixes factored out.
+
+    A single alternation of dozens of phrases makes the engine retry every
+    alternative at each position; as a trie, one character comparison
+    discards all phrases that don't share it.
+    """
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and not end else "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return build(trie)
+
+
+class IntentMatcher(Generic[K]):
+    """Scores every intent against a text in a single regex pass.
+
+    All phrases are compiled into one trie-shaped regex wrapped in a
+    lookahead, so overlapping phrases ("write code" and "code for") are
+    found in one scan. Matches respect word boundaries ("class" does not
+    match "classic") while still allowing symbols such as "c++", and each
+    phrase counts at most once, with its weight, toward every intent that
+    lists it.
+    """
+
+    def __init__(self, patterns: Mapping[K, Sequence[Pattern]]):
+        self.intents: List[K] = list(patterns)
+        self.phrase_scores: Dict[str, List[Tuple[int, float]]] = {}
+        for index, intent in enumerate(self.intents):
+            for pattern in patterns[intent]:
+                phrase, weight = (pattern, 1.0) if isinstance(pattern, str) else pattern
+                self.phrase_scores.setdefault(phrase.lower(), []).append((index, weight))
+
+        # At each word start, capture the phrase (plus inflection) found there.
+        # Longer phrases are tried first, so "creative writing" beats "creative".
+        phrases = sorted(self.phrase_scores, key=len, reverse=True)
+        inflected = [p for p in phrases if p[-1].isalpha()]
+        plain = [p for p in phrases if not p[-1].isalpha()]
+        alternatives = []
+        if inflected:
+            alternatives.append(f"(?P<inflected>{_trie_regex(inflected)}){SUFFIXES}")
+        if plain:
+            alternatives.append(f"(?P<plain>{_trie_regex(plain)})")
+        self.regex = re.compile(
+            rf"(?<!{WORD_CHAR})(?=(?:{'|'.join(alternatives)})(?!{WORD_CHAR}))"
+        )
+
+    def matches(self, text: str) -> List[str]:
+        """Distinct phrases found in text, in order of first occurrence"""
+        found = {}
+        for match in self.regex.finditer(text.lower()):
+            groups = match.groupdict()
+            found[groups.get("inflected") or groups.get("plain")] = True
+        return list(found)
+
+    def scores(self, text: str) -> Dict[K, float]:
+        """Score per intent (only intents with a positive score)"""
+        totals = [0.0] * len(self.intents)
+        for phrase in self.matches(text):
+            for index, weight in self.phrase_scores[phrase]:
+                totals[index] += weight
+        return {self.intents[i]: score for i, score in enumerate(totals) if score > 0}
+
+    def best(self, text: str) -> Optional[K]:
+        """Highest scoring intent, earliest declared on ties, or None if nothing matched"""
+        scores = self.scores(text)
+        if not scores:
+            return None
+        return max(scores, key=scores.get)
@@ -0,0 +1,441 @@
+"""Durable background jobs for long-running generations.
+
+Jobs live in a SQLite file (JOB_STORE_PATH), so they survive restarts
+and can be executed by any process that opens the same file. The API
+server runs JOB_WORKERS workers in-process by default; set JOB_WORKERS=0
+there and run the executor on its own instead:
+
+    python job_queue.py worker --concurrency 4
+
+A worker claims a job by taking a lease on it and renews the lease while
+the job runs. Jobs whose lease expires (the worker crashed or was
+killed) are picked up again, up to JOB_MAX_ATTEMPTS attempts in total.
+
+The same file keeps the finished items of batch requests sent with a
+batch_id, so a retried batch only runs the items that have no result.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Job = Dict[str, Any]
+JobHandler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+
+-- Finished items of POST /api/prompts/batch requests sent with a batch_id
+CREATE TABLE IF NOT EXISTS batch_results (
+    user_id TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    item_index INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (user_id, batch_id, item_index)
+);
+CREATE INDEX IF NOT EXISTS idx_batch_results_created ON batch_results(created_at);
+"""
+
+JSON_COLUMNS = ("payload", "result")
+TIME_COLUMNS = ("created_at", "started_at", "finished_at")
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    job = dict(row)
+    for column in JSON_COLUMNS:
+        job[column] = json.loads(job[column]) if job[column] else None
+    for column in TIME_COLUMNS:
+        if job[column] is not None:
+            job[column] = datetime.fromtimestamp(job[column], timezone.utc).isoformat()
+    return job
+
+
+class JobStore:
+    """SQLite-backed job table shared by the API and worker processes.
+
+    Like SQLiteDatabase, statements run on one dedicated thread in WAL
+    mode. Claims use BEGIN IMMEDIATE so that concurrent workers, in this
+    or another process, never take the same job.
+    """
+
+    def __init__(self, path: str = "jobs.sqlite3", max_attempts: int = 2):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.conn: Optional[sqlite3.Connection] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # Set (and replaced) whenever a worker in this process finishes an attempt
+        self.changed: Optional[asyncio.Event] = None
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def connect(self):
+        """Open the job store and create the schema"""
+        if self.conn is not None:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+        await self._run(self._connect)
+        logger.info(f"✅ Job store ready at {self.path}")
+
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+
+    async def close(self):
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _fetch(self, job_id: str) -> Optional[Job]:
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def _submit(self, kind: str, user_id: Optional[str], payload: Dict[str, Any]) -> Job:
+        job_id = str(uuid.uuid4())
+        self.conn.execute(
+            "INSERT INTO jobs (id, kind, user_id, payload, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, user_id, json.dumps(payload, default=str), QUEUED, time.time())
+        )
+        return self._fetch(job_id)
+
+    async def submit(self, kind: str, payload: Dict[str, Any], user_id: Optional[str] = None) -> Job:
+        """Queue a job and return it"""
+        return await self._run(self._submit, kind, user_id, payload)
+
+    async def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Job]:
+        """A job by id, or None if it doesn't exist or belongs to another user"""
+        job = await self._run(self._fetch, job_id)
+        if job is None or (user_id is not None and job["user_id"] != user_id):
+            return None
+        return job
+
+    def _claim(self, worker_id: str, lease_seconds: float, kinds: List[str]) -> Optional[Job]:
+        now = time.time()
+        placeholders = ", ".join("?" for _ in kinds)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # Jobs left running by a dead worker have run out of attempts
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, worker_id = NULL "
+                "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                (FAILED, "Worker lost while running the job", now, RUNNING, now, self.max_attempts)
+            )
+            row = self.conn.execute(
+                f"SELECT id FROM jobs WHERE kind IN ({placeholders}) AND "
+                "(status = ? OR (status = ? AND lease_expires_at < ?)) "
+                "ORDER BY created_at LIMIT 1",
+                (*kinds, QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (RUNNING, worker_id, now + lease_seconds, now, row["id"])
+            )
+        return self._fetch(row["id"])
+
+    async def claim(self, worker_id: str, lease_seconds: float, kinds: List[str]) -> Optional[Job]:
+        """Take the oldest runnable job of the given kinds, or None if there is none"""
+        return await self._run(self._claim, worker_id, lease_seconds, kinds)
+
+    def _renew(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        cursor = self.conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+            (time.time() + lease_seconds, job_id, worker_id, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    async def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if the worker no longer owns the job"""
+        return await self._run(self._renew, job_id, worker_id, lease_seconds)
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, worker_id = NULL, "
+            "lease_expires_at = NULL WHERE id = ? AND worker_id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error,
+             time.time() if status in FINISHED_STATES else None, job_id, worker_id)
+        )
+
+    async def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]):
+        await self._run(self._finish, job_id, worker_id, SUCCEEDED, result, None)
+        self._notify()
+
+    async def fail(self, job_id: str, worker_id: str, error: str, attempts: int):
+        """Record a failed attempt, queueing the job again if it has attempts left"""
+        status = QUEUED if attempts < self.max_attempts else FAILED
+        await self._run(self._finish, job_id, worker_id, status, None, error)
+        self._notify()
+
+    def _purge(self, older_than: float) -> int:
+        placeholders = ", ".join("?" for _ in FINISHED_STATES)
+        cutoff = time.time() - older_than
+        cursor = self.conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+            (*FINISHED_STATES, cutoff)
+        )
+        purged = cursor.rowcount
+        cursor = self.conn.execute("DELETE FROM batch_results WHERE created_at < ?", (cutoff,))
+        return purged + cursor.rowcount
+
+    async def purge(self, older_than: float) -> int:
+        """Delete jobs that finished, and batch results saved, more than older_than seconds ago"""
+        return await self._run(self._purge, older_than)
+
+    def _batch_results(self, user_id: str, batch_id: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT result FROM batch_results WHERE user_id = ? AND batch_id = ? ORDER BY item_index",
+            (user_id, batch_id)
+        ).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+    async def batch_results(self, user_id: str, batch_id: str) -> List[Dict[str, Any]]:
+        """Results saved for a user's batch, in item order"""
+        return await self._run(self._batch_results, user_id, batch_id)
+
+    def _save_batch_result(self, user_id: str, batch_id: str, record: Dict[str, Any]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO batch_results (user_id, batch_id, item_index, result, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, batch_id, record["index"], json.dumps(record, default=str), time.time())
+        )
+
+    async def save_batch_result(self, user_id: str, batch_id: str, record: Dict[str, Any]):
+        """Save the finished result of one batch item"""
+        await self._run(self._save_batch_result, user_id, batch_id, record)
+
+    def _counts(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["jobs"] for row in rows}
+
+    async def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        return await self._run(self._counts)
+
+    def _notify(self):
+        if self.changed is not None:
+            self.changed.set()
+            self.changed = None
+
+    async def wait(self, timeout: float):
+        """Sleep until a local worker finishes a job attempt or timeout passes.
+
+        Jobs run by another process are only seen when the timeout ends,
+        so callers re-read the job after every wait.
+        """
+        if self.changed is None:
+            self.changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobWorker:
+    """Pool of coroutines that claim and run jobs from a JobStore"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        retention_seconds: float = 86400.0,
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.tasks: List[asyncio.Task] = []
+        self.stopping = False
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        """Start the worker coroutines"""
+        if self.tasks or self.concurrency <= 0:
+            return
+        self.stopping = False
+        self.tasks = [asyncio.create_task(self._loop(n)) for n in range(self.concurrency)]
+        self.tasks.append(asyncio.create_task(self._purge_loop()))
+        logger.info(f"🚀 Job worker {self.worker_id} started with {self.concurrency} slots")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop claiming jobs and wait for running ones; unfinished jobs are retried after their lease expires"""
+        self.stopping = True
+        if not self.tasks:
+            return
+        _, pending = await asyncio.wait(self.tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.tasks = []
+
+    async def _loop(self, slot: int):
+        while not self.stopping:
+            try:
+                job = await self.store.claim(self.worker_id, self.lease_seconds, list(self.handlers))
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                # The job is retried once its lease expires
+                logger.error(f"Running job {job['id']} failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_job(self, job: Job):
+        """Run a claimed job, renewing its lease until it finishes"""
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        self.running += 1
+        try:
+            result = await self.handlers[job["kind"]](job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Job {job['id']} attempt {job['attempts']} failed: {e}")
+            await self.store.fail(job["id"], self.worker_id, getattr(e, "detail", str(e)) or type(e).__name__, job["attempts"])
+        else:
+            self.completed += 1
+            await self.store.complete(job["id"], self.worker_id, result)
+        finally:
+            self.running -= 1
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.store.renew(job_id, self.worker_id, self.lease_seconds):
+                return
+
+    async def _purge_loop(self):
+        while not self.stopping:
+            try:
+                purged = await self.store.purge(self.retention_seconds)
+                if purged:
+                    logger.info(f"🧹 Purged {purged} finished jobs and batch results")
+            except Exception as e:
+                logger.error(f"Job purge failed: {e}")
+            for _ in range(60):
+                if self.stopping:
+                    return
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "slots": self.concurrency,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+def create_job_store() -> JobStore:
+    """Job store at JOB_STORE_PATH allowing JOB_MAX_ATTEMPTS attempts per job"""
+    return JobStore(
+        os.getenv("JOB_STORE_PATH", "jobs.sqlite3"),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "2")),
+    )
+
+
+def create_job_worker(store: JobStore, handlers: Dict[str, JobHandler], concurrency: Optional[int] = None) -> JobWorker:
+    """Job worker configured from JOB_WORKERS, JOB_POLL_INTERVAL, JOB_LEASE_SECONDS and JOB_RETENTION_SECONDS"""
+    return JobWorker(
+        store,
+        handlers,
+        concurrency=int(os.getenv("JOB_WORKERS", "2")) if concurrency is None else concurrency,
+        poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1.0")),
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60")),
+        retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "86400")),
+    )
+
+
+async def run_worker(concurrency: int):
+    from generation import job_handlers, load_templates, prompt_writer
+    from database import connect_to_database, close_database_connection
+
+    job_store = create_job_store()
+    await connect_to_database()
+    await load_templates()
+    await prompt_writer.start()
+    await job_store.connect()
+    worker = create_job_worker(job_store, job_handlers, concurrency)
+    await worker.start()
+    try:
+        await asyncio.gather(*worker.tasks)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await worker.stop()
+        await job_store.close()
+        await prompt_writer.stop()
+        await close_database_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = commands.add_parser("worker", help="run jobs until interrupted")
+    worker_parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_WORKERS", "2")) or 2)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_worker(args.concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """Rolling window of recent successful call latencies (in seconds)"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def record(self, latency: float):
+        """Record a latency sample"""
+        self.samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None if it is empty"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = math.ceil(pct / 100 * len(ordered))
+        return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class HedgingPolicy:
+    """Decides how long to wait on a provider before hedging to the next one.
+
+    A fixed per-provider delay can be set with LLM_HEDGE_DELAY_<PROVIDER>
+    (e.g. LLM_HEDGE_DELAY_GEMINI=1.5). Otherwise the delay tracks the
+    observed latency percentile (LLM_HEDGE_PERCENTILE) of the provider,
+    clamped to [LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MAX_DELAY], and falls back
+    to LLM_HEDGE_DELAY until enough samples have been collected.
+    """
+
+    def __init__(self, providers: Iterable[str]):
+        self.default_delay = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+        self.percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+        self.max_delay = float(os.getenv("LLM_HEDGE_MAX_DELAY", "10.0"))
+
+        self.overrides: Dict[str, float] = {}
+        for provider in providers:
+            override = os.getenv(f"LLM_HEDGE_DELAY_{provider.upper()}")
+            if override:
+                self.overrides[provider] = float(override)
+
+    def delay_for(self, provider: str, window: LatencyWindow) -> float:
+        """Hedge delay in seconds for the given provider"""
+        if provider in self.overrides:
+            return self.overrides[provider]
+        if len(window) < self.min_samples:
+            return self.default_delay
+        observed = window.percentile(self.percentile)
+        return min(self.max_delay, max(self.min_delay, observed))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected by an open circuit breaker"""
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker over a rolling window of call outcomes.
+
+    The breaker opens once at least LLM_BREAKER_MIN_CALLS calls in the last
+    LLM_BREAKER_WINDOW seconds have an error rate of LLM_BREAKER_ERROR_RATE
+    or more. Calls slower than LLM_BREAKER_SLOW_CALL seconds (0 disables)
+    count as errors. After LLM_BREAKER_COOLDOWN seconds a single probe call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window_seconds = float(os.getenv("LLM_BREAKER_WINDOW", "60"))
+        self.error_rate_threshold = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+        self.min_calls = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+        self.cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        self.slow_call_threshold = float(os.getenv("LLM_BREAKER_SLOW_CALL", "0"))
+
+        self.state = CircuitState.CLOSED
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.latencies = LatencyWindow()
+
+    def _prune(self, now: float):
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+
+    def error_rate(self) -> float:
+        """Error rate over the rolling window"""
+        self._prune(time.monotonic())
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be allowed (without reserving it)"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not self.probe_in_flight
+
+    def awaiting_probe(self) -> bool:
+        """Whether the cooldown has passed and the half-open probe hasn't been taken yet"""
+        if self.state == CircuitState.OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return self.state == CircuitState.HALF_OPEN and not self.probe_in_flight
+
+    def acquire(self) -> bool:
+        """Reserve a call, raising CircuitOpenError if the breaker rejects it.
+
+        Returns True if the call is the half-open probe; pass that to release().
+        """
+        if self.state == CircuitState.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = CircuitState.HALF_OPEN
+            self.probe_in_flight = False
+
+        if self.state == CircuitState.OPEN:
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+        if self.state == CircuitState.HALF_OPEN:
+            if self.probe_in_flight:
+                raise CircuitOpenError(f"Circuit half-open for {self.name}, probe in flight")
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def release(self, probe: bool):
+        """Give back a reservation without recording an outcome (e.g. a cancelled call)"""
+        if probe:
+            self.probe_in_flight = False
+
+    def record_success(self, latency: Optional[float] = None):
+        """Record a successful call"""
+        if latency is not None:
+            self.latencies.record(latency)
+            if self.slow_call_threshold and latency > self.slow_call_threshold:
+                self.record_failure()
+                return
+
+        if self.state == CircuitState.HALF_OPEN:
+            self._close()
+            return
+        self._add_outcome(True)
+
+    def record_failure(self):
+        """Record a failed call"""
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+        self._add_outcome(False)
+        if len(self.outcomes) >= self.min_calls and self.error_rate() >= self.error_rate_threshold:
+            self._open()
+
+    def _add_outcome(self, ok: bool):
+        now = time.monotonic()
+        self.outcomes.append((now, ok))
+        self._prune(now)
+
+    def _open(self):
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def _close(self):
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker state for health reporting"""
+        retry_in = None
+        if self.state == CircuitState.OPEN:
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state.value,
+            "error_rate": round(self.error_rate(), 3),
+            "calls_in_window": len(self.outcomes),
+            "p50_latency": self.latencies.percentile(50),
+            "p95_latency": self.latencies.percentile(95),
+            "retry_in_seconds": retry_in,
+        }
+
+
+class SingleFlight:
+    """Deduplicates concurrent identical calls.
+
+    Callers using the same key while a call is in flight await the same
+    task instead of starting their own. The shared task is shielded, so a
+    caller that gets cancelled (e.g. a client disconnect) does not cancel
+    it for the others.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.shared_calls = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Run factory() for key, or join the call already in flight for it"""
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.shared_calls += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # Retrieve the exception in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
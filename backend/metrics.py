@@ -0,0 +1,379 @@
+import bisect
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from token_budget import estimate_tokens
+from tracing import SPAN_KIND_CLIENT, current_span, open_span, span as traced_span
+
+LabelValues = Tuple[str, ...]
+# (input tokens, output tokens) of one provider call
+TokenUsage = Tuple[int, int]
+
+# Latency buckets (seconds) sized for LLM calls: sub-second cache hits up to long titan generations
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+# Queue wait buckets (seconds): most calls are admitted at once, rate-limited ones wait up to a minute
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A named metric family with a fixed set of label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value per label set that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    @contextmanager
+    def track(self, **labels: str):
+        """Count the enclosed block as in progress"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+        self.series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self.series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+LLM_ATTEMPT_SECONDS = registry.histogram(
+    "llm_attempt_duration_seconds",
+    "Duration of individual provider calls",
+    ("provider", "mode", "outcome")
+)
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from starting a streamed provider call to its first chunk",
+    ("provider", "mode")
+)
+LLM_IN_FLIGHT = registry.gauge(
+    "llm_in_flight_requests",
+    "Provider calls currently in progress",
+    ("provider",)
+)
+LLM_FALLBACKS = registry.counter(
+    "llm_fallbacks_total",
+    "Times a request moved on from a provider (reason: error, circuit_open or hedge)",
+    ("provider", "mode", "reason")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total",
+    "Tokens sent to and received from providers (source: reported by the provider or estimated locally)",
+    ("provider", "direction", "source")
+)
+LLM_COST = registry.counter(
+    "llm_cost_usd_total",
+    "Estimated provider spend in US dollars",
+    ("provider",)
+)
+GENERATION_SECONDS = registry.histogram(
+    "prompt_generation_duration_seconds",
+    "End-to-end duration of DynamicPromptGenerator operations, including cache lookups and fallbacks",
+    ("mode", "outcome", "cache")
+)
+GENERATIONS_IN_FLIGHT = registry.gauge(
+    "prompt_generations_in_flight",
+    "DynamicPromptGenerator operations currently in progress",
+    ("mode",)
+)
+LLM_QUEUE_DEPTH = registry.gauge(
+    "llm_scheduler_queue_depth",
+    "Provider calls waiting for a scheduler slot",
+    ("provider", "priority")
+)
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "llm_scheduler_wait_seconds",
+    "Time provider calls waited for a scheduler slot and rate-limit tokens",
+    ("provider", "priority"),
+    WAIT_BUCKETS
+)
+PASSWORD_HASH_IN_FLIGHT = registry.gauge(
+    "password_hash_in_flight",
+    "Password hashes and checks running or queued on the hasher pool"
+)
+PASSWORD_HASH_QUEUE_DEPTH = registry.gauge(
+    "password_hash_queue_depth",
+    "Password hashes and checks waiting for a free hasher worker"
+)
+
+# USD per million (input, output) tokens, overridable with LLM_PRICE_<PROVIDER>_INPUT / _OUTPUT
+PROVIDER_PRICES = {
+    "gemini": (0.075, 0.30),
+    "openai": (30.0, 60.0),
+    "claude": (3.0, 15.0),
+}
+
+# The kind of work the current LLM calls are for ("sniper", "titan", "suggestions", ...)
+current_mode: contextvars.ContextVar[str] = contextvars.ContextVar("current_mode", default="other")
+
+
+@contextmanager
+def mode_scope(mode: str):
+    """Label LLM calls made in the enclosed block (and tasks it starts) with mode"""
+    token = current_mode.set(mode)
+    try:
+        yield
+    finally:
+        current_mode.reset(token)
+
+
+def provider_price(provider: str) -> Tuple[float, float]:
+    input_price, output_price = PROVIDER_PRICES.get(provider, (0.0, 0.0))
+    return (
+        float(os.getenv(f"LLM_PRICE_{provider.upper()}_INPUT", str(input_price))),
+        float(os.getenv(f"LLM_PRICE_{provider.upper()}_OUTPUT", str(output_price))),
+    )
+
+
+def record_tokens(provider: str, input_tokens: int, output_tokens: int, source: str = "reported") -> float:
+    """Count token usage of one provider call and its estimated cost, returning the cost"""
+    LLM_TOKENS.inc(input_tokens, provider=provider, direction="input", source=source)
+    LLM_TOKENS.inc(output_tokens, provider=provider, direction="output", source=source)
+    input_price, output_price = provider_price(provider)
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    LLM_COST.inc(cost, provider=provider)
+    return cost
+
+
+class AttemptSpan:
+    """Monotonic-clock span of one provider call.
+
+    Tracks the provider's in-flight gauge while open and records the
+    duration with its outcome when closed, also as a span of the request
+    trace. Extra per-attempt details go to the optional sink (see
+    set_attempt_sink).
+    """
+
+    def __init__(self, provider: str, attempt: int = 1, mode: Optional[str] = None):
+        self.provider = provider
+        self.attempt = attempt
+        self.mode = mode or current_mode.get()
+        self.started = 0.0
+        self.first_token_at: Optional[float] = None
+        self.tokens: Optional[int] = None
+        self.cost: Optional[float] = None
+        self.trace_id: Optional[str] = None
+        self.trace_span = None
+
+    def __enter__(self) -> "AttemptSpan":
+        LLM_IN_FLIGHT.inc(provider=self.provider)
+        parent = current_span.get()
+        self.trace_id = parent.trace.trace_id if parent is not None else None
+        self.trace_span = open_span(f"llm.{self.provider}", SPAN_KIND_CLIENT, mode=self.mode, attempt=self.attempt)
+        self.started = time.perf_counter()
+        return self
+
+    def record_usage(self, prompt: str, response: str, usage: Optional[TokenUsage] = None):
+        """Count the call's tokens, estimating them locally when the provider didn't report usage"""
+        source = "reported"
+        if usage is None:
+            usage = (estimate_tokens(prompt), estimate_tokens(response))
+            source = "estimated"
+        self.cost = record_tokens(self.provider, usage[0], usage[1], source)
+        self.tokens = usage[0] + usage[1]
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            LLM_FIRST_TOKEN_SECONDS.observe(self.first_token_at - self.started, provider=self.provider, mode=self.mode)
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        LLM_IN_FLIGHT.dec(provider=self.provider)
+        if exc_type is None:
+            outcome = "success"
+        elif issubclass(exc_type, Exception):
+            outcome = "error"
+        else:
+            # Cancelled (e.g. a losing hedge) or the stream consumer went away
+            outcome = "cancelled"
+        LLM_ATTEMPT_SECONDS.observe(elapsed, provider=self.provider, mode=self.mode, outcome=outcome)
+        self.trace_span.set(outcome=outcome, tokens=self.tokens)
+        self.trace_span.end(exc)
+        if attempt_sink is not None and outcome != "cancelled":
+            attempt_sink({
+                "llm_provider": self.provider,
+                "attempt_order": self.attempt,
+                "success": outcome == "success",
+                "error_message": str(exc)[:1000] if exc is not None else None,
+                "response_time": round(elapsed, 4),
+                "token_count": self.tokens,
+                "trace_id": self.trace_id,
+                "mode": self.mode,
+                "cost_usd": round(self.cost, 6) if self.cost is not None else None,
+            })
+        return False
+
+
+# Receives one record per finished attempt, shaped like an llm_performance row;
+# trace_id joins it to the request (see the llm_performance_hourly view for aggregates)
+attempt_sink: Optional[Callable[[Dict], None]] = None
+
+
+def set_attempt_sink(sink: Optional[Callable[[Dict], None]]):
+    global attempt_sink
+    attempt_sink = sink
+
+
+@contextmanager
+def generation_span(mode: str, scoped: bool = True):
+    """Time a generator operation; the body marks a cache hit by setting span["cache"] to 'hit'.
+
+    Async generators pass scoped=False: a context variable set across a
+    yield can't be reset safely, so they label their calls explicitly.
+    """
+    span = {"cache": "miss"}
+    started = time.perf_counter()
+    outcome = "success"
+    with mode_scope(mode) if scoped else nullcontext(), GENERATIONS_IN_FLIGHT.track(mode=mode):
+        # Provider attempts nest under this span unless it can't be made current
+        trace_span = traced_span(f"generate.{mode}") if scoped else nullcontext(open_span(f"generate.{mode}"))
+        with trace_span as current:
+            try:
+                yield span
+            except Exception as e:
+                outcome = "error"
+                current.end(e)
+                raise
+            except BaseException as e:
+                outcome = "cancelled"
+                current.end(e)
+                raise
+            finally:
+                GENERATION_SECONDS.observe(time.perf_counter() - started, mode=mode, outcome=outcome, cache=span["cache"])
+                current.set(outcome=outcome, cache=span["cache"])
+                current.end()
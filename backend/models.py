@@ -46,6 +46,9 @@ class PromptGenerate(BaseModel):
     user_input: str
     mode: str = "sniper"  # sniper or titan
     include_rag: bool = False
+    include_examples: bool = True
+    validation_level: str = "standard"  # minimal, standard or strict
+    include_clarifications: bool = True
 
 # Analytics Models
 class AnalyticsEvent(BaseModel):
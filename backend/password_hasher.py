@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import bcrypt
+
+from llm_routing import LatencyWindow
+from metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusyError(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+# Module-level so they can be shipped to a process pool
+def _hash_password(password: bytes, rounds: int) -> Tuple[bytes, float]:
+    started = time.time()
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)), started
+
+
+def _check_password(password: bytes, hashed: bytes) -> Tuple[bool, float]:
+    started = time.time()
+    return bcrypt.checkpw(password, hashed), started
+
+
+class PasswordHasher:
+    """bcrypt hashing on a bounded worker pool instead of the event loop.
+
+    At most `workers` hashes run at once and up to `max_queue` more may
+    wait; beyond that HasherBusyError is raised so a login storm sheds load
+    instead of building an unbounded backlog.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64, rounds: int = 12, use_processes: bool = False):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.use_processes = use_processes
+        self.executor: Executor = self._create_executor()
+
+        self._set_pending(0)
+        self.completed = 0
+        self.rejected = 0
+        self.waits = LatencyWindow()
+        self.durations = LatencyWindow()
+
+    def _create_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        # bcrypt releases the GIL, so threads hash in parallel
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args) -> Any:
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusyError("Password hashing queue is full")
+
+        self._set_pending(self.pending + 1)
+        submitted = time.time()
+        try:
+            result, started = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self._set_pending(self.pending - 1)
+
+        finished = time.time()
+        self.completed += 1
+        self.waits.record(max(0.0, started - submitted))
+        self.durations.record(finished - started)
+        return result
+
+    def _set_pending(self, pending: int):
+        self.pending = pending
+        PASSWORD_HASH_IN_FLIGHT.set(pending)
+        PASSWORD_HASH_QUEUE_DEPTH.set(max(0, pending - self.workers))
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        hashed = await self._run(_hash_password, password.encode('utf-8'), self.rounds)
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Check a password against its bcrypt hash"""
+        return await self._run(_check_password, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and timing metrics"""
+        return {
+            "workers": self.workers,
+            "mode": "process" if self.use_processes else "thread",
+            "rounds": self.rounds,
+            "in_flight": self.pending,
+            "queue_depth": max(0, self.pending - self.workers),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "p50_wait_seconds": self.waits.percentile(50),
+            "p99_wait_seconds": self.waits.percentile(99),
+            "p50_hash_seconds": self.durations.percentile(50),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64")),
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    use_processes=os.getenv("PASSWORD_HASH_MODE", "thread").lower() == "process",
+)
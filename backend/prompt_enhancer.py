@@ -1,10 +1,14 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 import asyncio
+import hashlib
 import json
 import logging
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 from enum import Enum
@@ -15,13 +19,43 @@ from openai import AsyncOpenAI
 import anthropic
 
 # Database imports
-from supabase_config import get_supabase_client
+from supabase_config import get_supabase_client, supabase_configured
+from llm_routing import HedgingPolicy, CircuitBreaker, CircuitOpenError, SingleFlight
+from response_cache import ResponseCache, create_response_cache
+from scheduler import ProviderScheduler, Priority
+from intent_matcher import IntentMatcher
+from intent_classifier import UNKNOWN_INTENT, load_intent_classifier
+from write_behind import create_write_behind_queue
+from prompt_templates import (
+    TemplateRegistry, create_template_registry,
+    SNIPER_EXAMPLES, TITAN_EXAMPLES, VALIDATION_INSTRUCTIONS
+)
+from token_budget import TokenBudget, create_token_budget, estimate_tokens
+from tracing import TracingMiddleware, create_tracer, span as traced_span
+from metrics import (
+    AttemptSpan, TokenUsage, LLM_FALLBACKS, current_mode, generation_span, mode_scope,
+    registry as metrics_registry, set_attempt_sink
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Prompt Enhancer API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await tracer.start()
+    await session_writer.start()
+    if performance_writer:
+        await performance_writer.start()
+    loaded = dynamic_generator.templates.load_rows(await db_service.get_prompt_templates())
+    logger.info(f"Loaded {loaded} prompt templates from the database")
+    yield
+    await session_writer.stop()
+    if performance_writer:
+        await performance_writer.stop()
+    await tracer.stop()
+
+app = FastAPI(title="Prompt Enhancer API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -30,8 +64,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Per-request spans, reported in Server-Timing headers and optionally exported
+tracer = create_tracer()
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 # Pydantic models
 class IntentType(str, Enum):
     CODING = "coding"
@@ -59,6 +98,7 @@ class EnhancedPromptResponse(BaseModel):
     processing_time: float
     llm_used: str
     session_id: str
+    stage_timings: Optional[Dict[str, float]] = None
 
 class GeneratePromptRequest(BaseModel):
     user_input: str
@@ -74,12 +114,36 @@ class GeneratePromptResponse(BaseModel):
     suggestions: Optional[Dict[str, Any]] = None
     processing_time: float
     llm_used: str
+    cache: Optional[Dict[str, Any]] = None
+    tokens: Optional[Dict[str, Any]] = None
+
+class GenerationResult(BaseModel):
+    prompt: str
+    llm_used: str
+    suggestions: Optional[Dict[str, Any]] = None
+    cache_hit: bool = False
+    suggestions_cache_hit: bool = False
+    tokens: Optional[Dict[str, Any]] = None
+
+class PromptPlan(BaseModel):
+    prompt: str
+    prompt_tokens: int
+    output_tokens: int
+    user_input_tokens: int
+    truncated: bool = False
 
 class LLMProvider(str, Enum):
     GEMINI = "gemini"
     OPENAI = "openai"
     CLAUDE = "claude"
 
+# Models used for prompt generation
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_INTENT_MODEL = "gemini-2.5-pro"
+OPENAI_MODEL = "gpt-4"
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+MAX_OUTPUT_TOKENS = 4000
+
 # LLM Configuration
 class LLMConfig:
     def __init__(self):
@@ -93,6 +157,20 @@ class LLMConfig:
         
         self.openai_client = AsyncOpenAI(api_key=self.openai_api_key) if self.openai_api_key else None
         self.claude_client = anthropic.AsyncAnthropic(api_key=self.claude_api_key) if self.claude_api_key else None
+        
+        # Gemini model objects are reused across calls
+        self.gemini_models: Dict[str, Any] = {}
+        
+        # Concurrency, rate limits and priority queueing per provider
+        self.scheduler = ProviderScheduler(provider.value for provider in LLMProvider)
+    
+    def gemini_model(self, model_name: str):
+        """Get a cached Gemini model object"""
+        model = self.gemini_models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self.gemini_models[model_name] = model
+        return model
 
 llm_config = LLMConfig()
 
@@ -129,6 +207,10 @@ class IntentRecognizer:
                 "study", "research", "investigate"
             ]
         }
+        self.matcher = IntentMatcher(self.intent_patterns)
+        # Local model consulted before the LLM when no keyword matches
+        self.classifier = load_intent_classifier()
+        self.classifier_threshold = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.6"))
     
     async def detect_intent_with_llm(self, user_prompt: str) -> IntentType:
         """Use LLM to detect intent when pattern matching is insufficient"""
@@ -151,8 +233,11 @@ class IntentRecognizer:
         try:
             # Try Gemini first
             if llm_config.gemini_api_key:
-                model = genai.GenerativeModel('gemini-2.5-pro')
-                response = await asyncio.to_thread(model.generate_content, intent_prompt)
+                model = llm_config.gemini_model(GEMINI_INTENT_MODEL)
+                async with llm_config.scheduler.slot(LLMProvider.GEMINI.value, Priority.HIGH, intent_prompt):
+                    with AttemptSpan(LLMProvider.GEMINI.value, mode="intent") as span:
+                        response = await model.generate_content_async(intent_prompt)
+                        span.record_usage(intent_prompt, response.text)
                 intent_str = response.text.strip().lower()
                 
                 # Map response to IntentType
@@ -167,18 +252,19 @@ class IntentRecognizer:
     
     async def detect_intent(self, user_prompt: str) -> IntentType:
         """Detect user intent from prompt"""
-        prompt_lower = user_prompt.lower()
-        
-        # Pattern-based detection first
-        intent_scores = {}
-        for intent, patterns in self.intent_patterns.items():
-            score = sum(1 for pattern in patterns if pattern in prompt_lower)
-            if score > 0:
-                intent_scores[intent] = score
+        # Pattern-based detection first (single pass over the prompt)
+        intent = self.matcher.best(user_prompt)
+        if intent is not None:
+            return intent
         
-        if intent_scores:
-            # Return intent with highest score
-            return max(intent_scores, key=intent_scores.get)
+        # Then the local classifier, if it is confident enough
+        if self.classifier is not None:
+            label, confidence = self.classifier.predict(user_prompt)
+            if confidence >= self.classifier_threshold:
+                try:
+                    return IntentType(label)
+                except ValueError:
+                    logger.warning(f"Intent classifier returned unknown intent: {label}")
         
         # Fallback to LLM-based detection
         return await self.detect_intent_with_llm(user_prompt)
@@ -188,72 +274,335 @@ class IntentRecognizer:
 
 # MasterPromptConstructor class removed - now using dynamic LLM-based prompt generation
 
+def record_fallback(provider: str, error: BaseException, mode: Optional[str] = None):
+    """Count a request moving on from a provider"""
+    reason = "circuit_open" if isinstance(error, CircuitOpenError) else "error"
+    LLM_FALLBACKS.inc(provider=provider, mode=mode or current_mode.get(), reason=reason)
+
 # LLM Service with Fallback
 class LLMService:
     def __init__(self):
         self.providers = [LLMProvider.GEMINI, LLMProvider.OPENAI, LLMProvider.CLAUDE]
+        # "sequential" tries providers one after another, "hedged" races them
+        self.strategy = os.getenv("LLM_FALLBACK_STRATEGY", "sequential").lower()
+        # Put the fastest healthy provider first instead of the fixed order above
+        self.adaptive_ordering = os.getenv("LLM_ADAPTIVE_ORDERING", "true").lower() == "true"
+        self.breakers = {provider.value: CircuitBreaker(provider.value) for provider in self.providers}
+        self.hedging = HedgingPolicy(provider.value for provider in self.providers)
+        # Identical prompts in flight at the same time share one provider call
+        self.coalesce = os.getenv("LLM_COALESCE_REQUESTS", "true").lower() == "true"
+        self.single_flight = SingleFlight()
     
-    async def call_gemini(self, prompt: str) -> str:
-        """Call Gemini API"""
+    async def call_gemini(self, prompt: str) -> tuple[str, Optional[TokenUsage]]:
+        """Call Gemini API, returning the text and token usage"""
         if not llm_config.gemini_api_key:
             raise Exception("Gemini API key not configured")
         
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = await asyncio.to_thread(model.generate_content, prompt)
-        return response.text
+        model = llm_config.gemini_model(GEMINI_MODEL)
+        response = await model.generate_content_async(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return response.text, None
+        return response.text, (usage.prompt_token_count, usage.candidates_token_count)
     
-    async def call_openai(self, prompt: str) -> str:
-        """Call OpenAI API"""
+    async def call_openai(self, prompt: str) -> tuple[str, Optional[TokenUsage]]:
+        """Call OpenAI API, returning the text and token usage"""
         if not llm_config.openai_client:
             raise Exception("OpenAI API key not configured")
         
         response = await llm_config.openai_client.chat.completions.create(
-            model="gpt-4",
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=4000,
+            max_tokens=MAX_OUTPUT_TOKENS,
             temperature=0.7
         )
-        return response.choices[0].message.content
+        usage = response.usage
+        if usage is None:
+            return response.choices[0].message.content, None
+        return response.choices[0].message.content, (usage.prompt_tokens, usage.completion_tokens)
     
-    async def call_claude(self, prompt: str) -> str:
-        """Call Claude API"""
+    async def call_claude(self, prompt: str) -> tuple[str, Optional[TokenUsage]]:
+        """Call Claude API, returning the text and token usage"""
         if not llm_config.claude_client:
             raise Exception("Claude API key not configured")
         
         response = await llm_config.claude_client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=4000,
+            model=CLAUDE_MODEL,
+            max_tokens=MAX_OUTPUT_TOKENS,
             messages=[
                 {"role": "user", "content": prompt}
             ]
         )
-        return response.content[0].text
+        return response.content[0].text, (response.usage.input_tokens, response.usage.output_tokens)
+    
+    async def stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        """Stream Gemini API output as it is generated"""
+        if not llm_config.gemini_api_key:
+            raise Exception("Gemini API key not configured")
+        
+        model = llm_config.gemini_model(GEMINI_MODEL)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    
+    async def stream_openai(self, prompt: str) -> AsyncIterator[str]:
+        """Stream OpenAI API output as it is generated"""
+        if not llm_config.openai_client:
+            raise Exception("OpenAI API key not configured")
+        
+        stream = await llm_config.openai_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=MAX_OUTPUT_TOKENS,
+            temperature=0.7,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     
-    async def generate_with_fallback(self, prompt: str) -> tuple[str, str]:
+    async def stream_claude(self, prompt: str) -> AsyncIterator[str]:
+        """Stream Claude API output as it is generated"""
+        if not llm_config.claude_client:
+            raise Exception("Claude API key not configured")
+        
+        async with llm_config.claude_client.messages.stream(
+            model=CLAUDE_MODEL,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+    
+    async def call_provider(
+        self,
+        provider: LLMProvider,
+        prompt: str,
+        priority: Priority = Priority.NORMAL,
+        attempt: int = 1
+    ) -> str:
+        """Call a single provider through its circuit breaker and scheduler lane"""
+        callers = {
+            LLMProvider.GEMINI: self.call_gemini,
+            LLMProvider.OPENAI: self.call_openai,
+            LLMProvider.CLAUDE: self.call_claude,
+        }
+        breaker = self.breakers[provider.value]
+        probe = breaker.acquire()
+        try:
+            async with llm_config.scheduler.slot(provider.value, priority, prompt):
+                started = time.monotonic()
+                with AttemptSpan(provider.value, attempt) as span:
+                    response, usage = await callers[provider](prompt)
+                    span.record_usage(prompt, response, usage)
+        except asyncio.CancelledError:
+            breaker.release(probe)
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.monotonic() - started)
+        return response
+    
+    def ordered_providers(self) -> List[LLMProvider]:
+        """Providers whose breaker allows a call, fastest healthy provider first.
+        
+        A provider whose breaker has cooled down comes first, so its single
+        half-open probe is made even while the other providers are healthy;
+        if the probe fails the breaker re-opens and it drops out again. The
+        rest are ordered by median latency once enough samples exist,
+        otherwise they keep their configured order.
+        """
+        available = [p for p in self.providers if self.breakers[p.value].is_available()]
+        if not self.adaptive_ordering:
+            return sorted(available, key=lambda p: not self.breakers[p.value].awaiting_probe())
+        
+        def sort_key(provider: LLMProvider):
+            breaker = self.breakers[provider.value]
+            state_rank = 0 if breaker.awaiting_probe() else 1
+            median = breaker.latencies.percentile(50)
+            if median is None or len(breaker.latencies) < self.hedging.min_samples:
+                median = float("inf")
+            return (state_rank, median, self.providers.index(provider))
+        
+        return sorted(available, key=sort_key)
+    
+    def provider_health(self) -> Dict[str, Any]:
+        """Circuit breaker state per provider and the current provider order"""
+        return {
+            "strategy": self.strategy,
+            "order": [provider.value for provider in self.ordered_providers()],
+            "coalesced_requests": self.single_flight.shared_calls,
+            "scheduler": llm_config.scheduler.stats(),
+            "providers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+        }
+    
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Seconds to wait on a provider before hedging to the next one"""
+        return self.hedging.delay_for(provider.value, self.breakers[provider.value].latencies)
+    
+    async def generate_with_fallback(self, prompt: str, priority: Priority = Priority.NORMAL) -> tuple[str, str]:
         """Generate response with fallback system"""
+        if self.coalesce:
+            key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+            return await self.single_flight.do(key, lambda: self._generate(prompt, priority))
+        return await self._generate(prompt, priority)
+    
+    async def _generate(self, prompt: str, priority: Priority) -> tuple[str, str]:
+        """Run the configured fallback strategy"""
+        if self.strategy == "hedged":
+            return await self._generate_hedged(prompt, priority)
+        return await self._generate_sequential(prompt, priority)
+    
+    async def _generate_sequential(self, prompt: str, priority: Priority) -> tuple[str, str]:
+        """Try each provider in turn until one succeeds"""
         last_error = None
         
-        for provider in self.providers:
+        for attempt, provider in enumerate(self.ordered_providers(), start=1):
             try:
                 logger.info(f"Trying {provider.value}...")
-                
-                if provider == LLMProvider.GEMINI:
-                    response = await self.call_gemini(prompt)
-                elif provider == LLMProvider.OPENAI:
-                    response = await self.call_openai(prompt)
-                elif provider == LLMProvider.CLAUDE:
-                    response = await self.call_claude(prompt)
-                
+                response = await self.call_provider(provider, prompt, priority, attempt)
                 logger.info(f"Successfully generated response using {provider.value}")
                 return response, provider.value
                 
             except Exception as e:
                 logger.warning(f"{provider.value} failed: {str(e)}")
+                record_fallback(provider.value, e)
                 last_error = e
                 continue
         
+        # If all providers fail
+        if last_error is None:
+            raise HTTPException(status_code=503, detail="All LLM providers unavailable (circuits open)")
+        raise HTTPException(
+            status_code=503,
+            detail=f"All LLM providers failed. Last error: {str(last_error)}"
+        )
+    
+    async def _generate_hedged(self, prompt: str, priority: Priority) -> tuple[str, str]:
+        """Race providers: start the next one when the newest exceeds its hedge delay
+        or fails, return the first success and cancel the rest"""
+        remaining = self.ordered_providers()
+        running: Dict[asyncio.Task, LLMProvider] = {}
+        last_error = None
+        
+        attempts = 0
+        
+        def launch() -> LLMProvider:
+            nonlocal attempts
+            attempts += 1
+            provider = remaining.pop(0)
+            logger.info(f"Trying {provider.value} ({len(running)} already in flight)...")
+            task = asyncio.create_task(self.call_provider(provider, prompt, priority, attempts))
+            # Losers are cancelled; make sure their errors are never reported as unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            running[task] = provider
+            return provider
+        
+        if not remaining:
+            raise HTTPException(status_code=503, detail="All LLM providers unavailable (circuits open)")
+        
+        newest = launch()
+        try:
+            while running:
+                timeout = self.hedge_delay(newest) if remaining else None
+                done, _ = await asyncio.wait(
+                    running.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    logger.info(f"{newest.value} exceeded hedge delay of {timeout:.2f}s, hedging")
+                    LLM_FALLBACKS.inc(provider=newest.value, mode=current_mode.get(), reason="hedge")
+                    newest = launch()
+                    continue
+                
+                for task in done:
+                    provider = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        logger.info(f"Successfully generated response using {provider.value}")
+                        return task.result(), provider.value
+                    logger.warning(f"{provider.value} failed: {str(error)}")
+                    record_fallback(provider.value, error)
+                    last_error = error
+                
+                # Replace the failed attempt right away
+                if remaining:
+                    newest = launch()
+        finally:
+            for task in running:
+                task.cancel()
+        
+        # If all providers fail
+        raise HTTPException(
+            status_code=503,
+            detail=f"All LLM providers failed. Last error: {str(last_error)}"
+        )
+    
+    async def stream_with_fallback(
+        self,
+        prompt: str,
+        priority: Priority = Priority.NORMAL,
+        mode: Optional[str] = None
+    ) -> AsyncIterator[tuple[str, str]]:
+        """Stream a response as (chunk, provider) pairs with the fallback system.
+        
+        A provider is only abandoned for the next one if it fails before
+        producing any output; once chunks have been sent to the caller a
+        mid-stream failure is raised as-is. mode labels the attempt metrics.
+        """
+        streamers = {
+            LLMProvider.GEMINI: self.stream_gemini,
+            LLMProvider.OPENAI: self.stream_openai,
+            LLMProvider.CLAUDE: self.stream_claude,
+        }
+        last_error = None
+        
+        for attempt, provider in enumerate(self.ordered_providers(), start=1):
+            breaker = self.breakers[provider.value]
+            started = False
+            probe = False
+            try:
+                probe = breaker.acquire()
+                logger.info(f"Streaming from {provider.value}...")
+                async with llm_config.scheduler.slot(provider.value, priority, prompt):
+                    with AttemptSpan(provider.value, attempt, mode) as span:
+                        chunks = []
+                        async for chunk in streamers[provider](prompt):
+                            started = True
+                            span.first_token()
+                            chunks.append(chunk)
+                            yield chunk, provider.value
+                        span.record_usage(prompt, "".join(chunks))
+                
+                breaker.record_success()
+                logger.info(f"Successfully streamed response using {provider.value}")
+                return
+                
+            except CircuitOpenError as e:
+                record_fallback(provider.value, e, mode)
+                last_error = e
+                continue
+            except Exception as e:
+                breaker.record_failure()
+                if started:
+                    raise
+                logger.warning(f"{provider.value} stream failed: {str(e)}")
+                record_fallback(provider.value, e, mode)
+                last_error = e
+                continue
+            except BaseException:
+                # Consumer went away mid-stream
+                breaker.release(probe)
+                raise
+        
         # If all providers fail
         raise HTTPException(
             status_code=503,
@@ -269,159 +618,481 @@ class DatabaseService:
         """Initialize the database connection"""
         if self.supabase is None:
             self.supabase = await get_supabase_client()
+        if not self.supabase.is_connected() and not await self.supabase.connect():
+            raise ConnectionError("Supabase is not connected")
     
     async def log_prompt_session(self, session_data: dict) -> str:
         """Log prompt session to database"""
         try:
             await self.initialize()
-            result = self.supabase.table('prompt_sessions').insert(session_data).execute()
-            return result.data[0]['id'] if result.data else None
+            return await self.supabase.create_prompt_session(session_data)
         except Exception as e:
             logger.error(f"Database logging failed: {e}")
             return None
     
+    async def log_prompt_sessions(self, sessions: List[dict]):
+        """Log a batch of prompt sessions; raises so the write-behind queue can spill them"""
+        await self.initialize()
+        await self.supabase.create_prompt_sessions(sessions)
+    
+    async def log_llm_performance(self, records: List[dict]):
+        """Log a batch of provider attempts; raises so the write-behind queue can spill them"""
+        await self.initialize()
+        await self.supabase.create_llm_performance_records(records)
+    
+    async def get_prompt_templates(self) -> List[dict]:
+        """Public prompt templates, or none if the database is unavailable"""
+        try:
+            await self.initialize()
+            return await self.supabase.get_prompt_templates()
+        except Exception as e:
+            logger.error(f"Failed to fetch prompt templates: {e}")
+            return []
+    
     async def get_user_sessions(self, user_id: str, limit: int = 10) -> List[dict]:
         """Get user's recent prompt sessions"""
         try:
             await self.initialize()
-            result = self.supabase.table('prompt_sessions').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(limit).execute()
-            return result.data
+            return await self.supabase.get_prompt_sessions(user_id, limit)
         except Exception as e:
             logger.error(f"Failed to fetch user sessions: {e}")
             return []
 
 # Dynamic Prompt Generator using LLM API
 class DynamicPromptGenerator:
-    def __init__(self, llm_service):
+    def __init__(
+        self,
+        llm_service,
+        cache: Optional[ResponseCache] = None,
+        templates: Optional[TemplateRegistry] = None,
+        budget: Optional[TokenBudget] = None
+    ):
         self.llm_service = llm_service
+        self.cache = cache
+        self.templates = templates or create_template_registry()
+        self.budget = budget or create_token_budget()
+        # Per-call deadlines (seconds) for concurrent generation; 0 disables the deadline
+        self.prompt_timeout = float(os.getenv("PROMPT_GENERATION_TIMEOUT", "60"))
+        self.suggestions_timeout = float(os.getenv("SUGGESTIONS_TIMEOUT", "20"))
+    
+    def provider_names(self) -> List[str]:
+        """Providers a call could currently fall back to"""
+        return [p.value for p in (self.llm_service.ordered_providers() or self.llm_service.providers)]
+    
+    def render(self, template_name: str, user_input: str, **values: Any) -> PromptPlan:
+        """Render a template with the user input cut down to fit the token budget"""
+        template = self.templates.get(template_name)
+        overhead = template.static_tokens + sum(estimate_tokens(str(value)) for value in values.values())
+        fitted_input, input_tokens, truncated = self.budget.fit(
+            user_input, self.provider_names(), MAX_OUTPUT_TOKENS, overhead
+        )
+        if truncated:
+            logger.info(f"Truncated {input_tokens}-token input to fit the {template_name} prompt budget")
+        prompt = template.render(user_input=fitted_input, **values)
+        return PromptPlan(
+            prompt=prompt,
+            prompt_tokens=estimate_tokens(prompt),
+            output_tokens=template.expected_output_tokens or MAX_OUTPUT_TOKENS,
+            user_input_tokens=input_tokens,
+            truncated=truncated
+        )
+    
+    def plan_sniper_prompt(self, user_input: str, include_examples: bool = True) -> PromptPlan:
+        return self.render("sniper", user_input, examples_instruction=SNIPER_EXAMPLES[include_examples])
+    
+    def plan_titan_prompt(self, user_input: str, include_examples: bool = True, validation_level: str = "standard") -> PromptPlan:
+        return self.render(
+            "titan",
+            user_input,
+            examples_instruction=TITAN_EXAMPLES[include_examples],
+            validation_level=validation_level,
+            validation_instructions=VALIDATION_INSTRUCTIONS.get(validation_level, "")
+        )
+    
+    def plan_generation_prompt(self, user_input: str, mode: str, include_examples: bool = True, validation_level: str = "standard") -> PromptPlan:
+        """Plan the meta-prompt for the given mode (titan for anything but sniper)"""
+        if mode == "sniper":
+            return self.plan_sniper_prompt(user_input, include_examples)
+        return self.plan_titan_prompt(user_input, include_examples, validation_level)
+    
+    @staticmethod
+    def token_estimate(*plans: PromptPlan) -> Dict[str, Any]:
+        """Estimated tokens in and out across the LLM calls behind a request"""
+        return {
+            "input_tokens": sum(plan.prompt_tokens for plan in plans),
+            "output_tokens": sum(plan.output_tokens for plan in plans),
+            "user_input_tokens": plans[0].user_input_tokens,
+            "input_truncated": any(plan.truncated for plan in plans)
+        }
+    
+    def plan_request(
+        self,
+        user_input: str,
+        mode: str,
+        include_examples: bool = True,
+        validation_level: str = "standard",
+        include_suggestions: bool = True
+    ) -> List[PromptPlan]:
+        """Meta-prompts for every LLM call of a generation request, prompt first"""
+        plans = [self.plan_generation_prompt(user_input, mode, include_examples, validation_level)]
+        if include_suggestions:
+            plans.append(self.render("suggestions", user_input, mode=mode))
+        return plans
+    
+    def estimate_generation(self, *args, **kwargs) -> Dict[str, Any]:
+        """Token estimate for a generation request (plan_request arguments), without calling a provider"""
+        return self.token_estimate(*self.plan_request(*args, **kwargs))
+    
+    def build_sniper_prompt(self, user_input: str, include_examples: bool = True) -> str:
+        """Build the meta-prompt for sniper mode"""
+        return self.plan_sniper_prompt(user_input, include_examples).prompt
+    
+    def build_titan_prompt(self, user_input: str, include_examples: bool = True, validation_level: str = "standard") -> str:
+        """Build the meta-prompt for titan mode"""
+        return self.plan_titan_prompt(user_input, include_examples, validation_level).prompt
+    
+    def build_generation_prompt(self, user_input: str, mode: str, include_examples: bool = True, validation_level: str = "standard") -> str:
+        """Build the meta-prompt for the given mode (titan for anything but sniper)"""
+        return self.plan_generation_prompt(user_input, mode, include_examples, validation_level).prompt
+    
+    def build_suggestions_prompt(self, user_input: str, mode: str) -> str:
+        """Build the meta-prompt for suggestions"""
+        return self.render("suggestions", user_input, mode=mode).prompt
+    
+    @staticmethod
+    def mode_priority(mode: str) -> Priority:
+        """Scheduling priority for a mode: short sniper calls go ahead of long titan ones"""
+        return Priority.HIGH if mode == "sniper" else Priority.LOW
+    
+    def prompt_cache_key(self, user_input: str, mode: str, include_examples: bool = True, validation_level: str = "standard") -> str:
+        """Cache key for a generated prompt (validation level only applies to titan)"""
+        return ResponseCache.make_key(
+            "prompt",
+            user_input,
+            mode="sniper" if mode == "sniper" else "titan",
+            include_examples=include_examples,
+            validation_level=None if mode == "sniper" else validation_level
+        )
+    
+    async def _generate_prompt(
+        self,
+        user_input: str,
+        mode: str,
+        include_examples: bool = True,
+        validation_level: str = "standard",
+        plan: Optional[PromptPlan] = None
+    ) -> tuple[str, str, bool]:
+        """Generate a prompt for the mode, returning (prompt, llm_used, cache_hit)"""
+        with generation_span(mode) as span:
+            cache_key = self.prompt_cache_key(user_input, mode, include_examples, validation_level)
+            if self.cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    span["cache"] = "hit"
+                    return cached["prompt"], cached["llm_used"], True
+            
+            plan = plan or self.plan_generation_prompt(user_input, mode, include_examples, validation_level)
+            generation_prompt = plan.prompt
+            response, llm_used = await self.llm_service.generate_with_fallback(generation_prompt, self.mode_priority(mode))
+            prompt = response.strip()
+            
+            if self.cache:
+                await self.cache.set(cache_key, {"prompt": prompt, "llm_used": llm_used})
+            return prompt, llm_used, False
     
     async def generate_sniper_prompt(self, user_input: str, include_examples: bool = True) -> tuple[str, str]:
         """Generate a concise, focused prompt using LLM API"""
-        generation_prompt = f"""
-You are an expert prompt engineer. Create a CONCISE, FOCUSED prompt for the following user request.
-
-User Request: "{user_input}"
-
-Generate a SHORT, PRECISE prompt (50-150 words) that:
-- Gets straight to the point
-- Includes essential context only
-- Uses clear, direct language
-- Focuses on immediate actionable results
-- Avoids unnecessary elaboration
-
-{"Include 1-2 brief examples if helpful." if include_examples else "Do not include examples."}
-
-Return ONLY the generated prompt, no explanations or meta-commentary.
-"""
-        
-        response, llm_used = await self.llm_service.generate_with_fallback(generation_prompt)
-        return response.strip(), llm_used
+        prompt, llm_used, _ = await self._generate_prompt(user_input, "sniper", include_examples)
+        return prompt, llm_used
     
     async def generate_titan_prompt(self, user_input: str, include_examples: bool = True, validation_level: str = "standard") -> tuple[str, str]:
         """Generate a comprehensive, structured prompt using LLM API"""
-        validation_instructions = {
-            "minimal": "Include basic validation steps.",
-            "standard": "Include thorough validation and error checking.",
-            "strict": "Include comprehensive validation, edge cases, and quality assurance steps."
-        }
-        
-        generation_prompt = f"""
-You are an expert prompt engineer. Create a COMPREHENSIVE, PROFESSIONAL prompt for the following user request.
-
-User Request: "{user_input}"
-
-Generate a DETAILED, STRUCTURED prompt (300-800 words) that includes:
-
-1. **Clear Role Definition**: Specify the AI's expertise and perspective
-2. **Detailed Task Description**: Break down what needs to be accomplished
-3. **Context and Background**: Provide relevant background information
-4. **Specific Requirements**: List clear, actionable requirements
-5. **Output Format**: Specify the desired structure and format
-6. **Quality Guidelines**: Include standards for excellence
-7. **Constraints and Considerations**: Mention limitations or special considerations
-{"8. **Examples**: Provide relevant examples to illustrate expectations" if include_examples else ""}
-
-Validation Level: {validation_level}
-{validation_instructions.get(validation_level, "")}
-
-Create a prompt that ensures high-quality, comprehensive results. Use professional language and clear structure.
-
-Return ONLY the generated prompt, no explanations or meta-commentary.
-"""
+        prompt, llm_used, _ = await self._generate_prompt(user_input, "titan", include_examples, validation_level)
+        return prompt, llm_used
+    
+    async def stream_prompt(
+        self,
+        user_input: str,
+        mode: str,
+        include_examples: bool = True,
+        validation_level: str = "standard"
+    ) -> AsyncIterator[tuple[str, str, bool]]:
+        """Stream a generated prompt as (chunk, llm_used, cache_hit) tuples.
         
-        response, llm_used = await self.llm_service.generate_with_fallback(generation_prompt)
-        return response.strip(), llm_used
+        A cached prompt is yielded as a single chunk; a freshly streamed
+        prompt is cached once the stream completes.
+        """
+        with generation_span(mode, scoped=False) as span:
+            cache_key = self.prompt_cache_key(user_input, mode, include_examples, validation_level)
+            if self.cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    span["cache"] = "hit"
+                    yield cached["prompt"], cached["llm_used"], True
+                    return
+            
+            generation_prompt = self.build_generation_prompt(user_input, mode, include_examples, validation_level)
+            chunks = []
+            llm_used = None
+            async for chunk, llm_used in self.llm_service.stream_with_fallback(
+                generation_prompt, self.mode_priority(mode), mode=mode
+            ):
+                chunks.append(chunk)
+                yield chunk, llm_used, False
+            
+            if self.cache and chunks:
+                await self.cache.set(cache_key, {"prompt": "".join(chunks).strip(), "llm_used": llm_used})
+    
+    async def _generate_suggestions(self, user_input: str, mode: str) -> tuple[Dict[str, Any], bool]:
+        """Generate suggestions, returning (suggestions, cache_hit)"""
+        with generation_span("suggestions") as span:
+            cache_key = ResponseCache.make_key("suggestions", user_input, mode=mode)
+            if self.cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    span["cache"] = "hit"
+                    return cached, True
+            
+            suggestion_prompt = self.build_suggestions_prompt(user_input, mode)
+            
+            try:
+                response, _ = await self.llm_service.generate_with_fallback(suggestion_prompt)
+                # Try to parse JSON, fallback to structured format if parsing fails
+                suggestions = json.loads(response.strip())
+            except asyncio.CancelledError:
+                raise
+            except:
+                # Fallback to basic suggestions if JSON parsing fails
+                return self.default_suggestions(), False
+            
+            if self.cache:
+                await self.cache.set(cache_key, suggestions)
+            return suggestions, False
     
     async def generate_suggestions(self, user_input: str, mode: str) -> Dict[str, Any]:
         """Generate suggestions and insights using LLM API"""
-        suggestion_prompt = f"""
-Analyze the following user request and provide helpful insights:
-
-User Request: "{user_input}"
-Mode: {mode}
-
-Provide a JSON response with:
-1. "clarifying_questions": Array of 2-3 questions that could help refine the request
-2. "assumptions_made": Array of 2-3 assumptions you're making about the request
-3. "improvement_tips": Array of 2-3 tips for better results
-
-Return ONLY valid JSON, no explanations.
-"""
+        suggestions, _ = await self._generate_suggestions(user_input, mode)
+        return suggestions
+    
+    def default_suggestions(self) -> Dict[str, Any]:
+        """Static suggestions used when the LLM suggestions are unavailable"""
+        return {
+            "clarifying_questions": [
+                "What specific outcome are you looking for?",
+                "Are there any constraints or requirements I should know about?"
+            ],
+            "assumptions_made": [
+                "Assuming you want a comprehensive response",
+                "Assuming standard quality expectations"
+            ],
+            "improvement_tips": [
+                "Provide more specific context for better results",
+                "Consider breaking complex requests into smaller parts"
+            ]
+        }
+    
+    def start_suggestions(self, user_input: str, mode: str) -> asyncio.Task:
+        """Start suggestion generation in the background, bounded by its deadline"""
+        return asyncio.create_task(
+            asyncio.wait_for(
+                self._generate_suggestions(user_input, mode),
+                timeout=self.suggestions_timeout or None
+            )
+        )
+    
+    async def collect_suggestions(self, suggestions_task: asyncio.Task) -> tuple[Dict[str, Any], bool]:
+        """Await a task from start_suggestions, returning (suggestions, cache_hit).
         
+        Falls back to the default suggestions on failure or timeout.
+        """
         try:
-            response, _ = await self.llm_service.generate_with_fallback(suggestion_prompt)
-            # Try to parse JSON, fallback to structured format if parsing fails
-            import json
-            return json.loads(response.strip())
-        except:
-            # Fallback to basic suggestions if JSON parsing fails
-            return {
-                "clarifying_questions": [
-                    "What specific outcome are you looking for?",
-                    "Are there any constraints or requirements I should know about?"
-                ],
-                "assumptions_made": [
-                    "Assuming you want a comprehensive response",
-                    "Assuming standard quality expectations"
-                ],
-                "improvement_tips": [
-                    "Provide more specific context for better results",
-                    "Consider breaking complex requests into smaller parts"
-                ]
-            }
+            return await suggestions_task
+        except asyncio.TimeoutError:
+            logger.warning(f"Suggestions timed out after {self.suggestions_timeout}s, using defaults")
+        except Exception as e:
+            logger.warning(f"Suggestions failed: {e}, using defaults")
+        return self.default_suggestions(), False
+    
+    async def generate_concurrently(
+        self,
+        user_input: str,
+        mode: str,
+        include_examples: bool = True,
+        validation_level: str = "standard",
+        include_suggestions: bool = True
+    ) -> GenerationResult:
+        """Generate the prompt and its suggestions in parallel.
+        
+        Both LLM round-trips are started at once, each bounded by its own
+        deadline. A failed or timed-out prompt generation is raised to the
+        caller; failed or timed-out suggestions fall back to the defaults so
+        the prompt is always returned.
+        """
+        plans = self.plan_request(user_input, mode, include_examples, validation_level, include_suggestions)
+        prompt_task = asyncio.create_task(
+            asyncio.wait_for(
+                self._generate_prompt(user_input, mode, include_examples, validation_level, plan=plans[0]),
+                timeout=self.prompt_timeout or None
+            )
+        )
+        suggestions_task = self.start_suggestions(user_input, mode) if include_suggestions else None
+        
+        try:
+            prompt, llm_used, cache_hit = await prompt_task
+        except BaseException:
+            if suggestions_task:
+                suggestions_task.cancel()
+            raise
+        
+        result = GenerationResult(prompt=prompt, llm_used=llm_used, cache_hit=cache_hit, tokens=self.token_estimate(*plans))
+        if suggestions_task:
+            result.suggestions, result.suggestions_cache_hit = await self.collect_suggestions(suggestions_task)
+        
+        return result
+    
+    def cache_metadata(self, prompt_hit: bool = False, suggestions_hit: bool = False) -> Dict[str, Any]:
+        """Cache hit flags for this request plus the cache-wide counters"""
+        if not self.cache:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "prompt_hit": prompt_hit,
+            "suggestions_hit": suggestions_hit,
+            **self.cache.stats()
+        }
 
 # Initialize services
 intent_recognizer = IntentRecognizer()
 llm_service = LLMService()
 db_service = DatabaseService()
-dynamic_generator = DynamicPromptGenerator(llm_service)
+# Without a database there is nothing to retry against, so failed writes are dropped rather than spilled
+session_writer = create_write_behind_queue("prompt_sessions", db_service.log_prompt_sessions, spill=supabase_configured())
+# Per-attempt rows for the llm_performance table, off unless LLM_PERFORMANCE_LOGGING=true
+performance_writer = None
+if os.getenv("LLM_PERFORMANCE_LOGGING", "false").lower() == "true":
+    performance_writer = create_write_behind_queue(
+        "llm_performance", db_service.log_llm_performance, spill=supabase_configured()
+    )
+    set_attempt_sink(performance_writer.enqueue)
+dynamic_generator = DynamicPromptGenerator(llm_service, cache=create_response_cache())
+
+# Enhancement pipeline
+# How long to wait for a still-running intent detection once the answer is ready
+INTENT_GRACE_SECONDS = float(os.getenv("ENHANCE_INTENT_GRACE_SECONDS", "1.0"))
+# How long a session record waits for intent detection before it is logged as unknown
+INTENT_LOG_TIMEOUT_SECONDS = float(os.getenv("ENHANCE_INTENT_LOG_TIMEOUT_SECONDS", "30"))
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class StageTimer:
+    """Wall-clock durations of named pipeline stages, in milliseconds"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+    
+    async def run(self, stage: str, awaitable):
+        """Await a stage and record how long it took"""
+        started = time.perf_counter()
+        try:
+            with traced_span(f"stage.{stage}"):
+                return await awaitable
+        finally:
+            self.timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+    
+    def elapsed(self) -> float:
+        """Seconds since the pipeline started"""
+        return time.perf_counter() - self.started
+    
+    def report(self) -> Dict[str, float]:
+        return {**self.timings, "total": round(self.elapsed() * 1000, 2)}
+
+def start_intent_detection(user_prompt: str, timer: StageTimer) -> asyncio.Task:
+    """Detect intent off the critical path; nothing downstream waits for it"""
+    return asyncio.create_task(timer.run("intent_detection", intent_recognizer.detect_intent(user_prompt)))
+
+async def resolve_intent(intent_task: asyncio.Task) -> IntentType:
+    """Result of the intent task for the response, or GENERAL if it overruns the grace period.
+    
+    The task is left running so the session record can log the real intent.
+    """
+    done, _ = await asyncio.wait({intent_task}, timeout=INTENT_GRACE_SECONDS)
+    if done:
+        return intent_task.result()
+    logger.warning("Intent detection overran the pipeline, answering with general")
+    return IntentType.GENERAL
+
+def log_session(
+    session_id: str,
+    request: PromptRequest,
+    enhanced_prompt: str,
+    intent_task: asyncio.Task,
+    llm_response: str,
+    llm_used: str,
+    processing_time: float
+):
+    """Queue the session record for the background writer once intent detection finishes.
+    
+    Logged intents are the intent classifier's training labels, so the
+    record gets the detected intent rather than the response's GENERAL
+    fallback; detection that fails or outlasts INTENT_LOG_TIMEOUT_SECONDS
+    is logged as unknown.
+    """
+    record = {
+        'session_id': session_id,
+        'user_id': request.user_id,
+        'original_prompt': request.user_prompt,
+        'enhanced_prompt': enhanced_prompt,
+        'assigned_role': "Dynamic AI Assistant",
+        'llm_response': llm_response,
+        'llm_used': llm_used,
+        'processing_time': processing_time,
+        'context': request.context,
+        'created_at': datetime.now().isoformat()
+    }
+    
+    def write(task: asyncio.Task):
+        detected = task.result().value if not task.cancelled() and task.exception() is None else UNKNOWN_INTENT
+        session_writer.enqueue({**record, 'detected_intent': detected})
+    
+    if not intent_task.done():
+        timeout = asyncio.get_running_loop().call_later(INTENT_LOG_TIMEOUT_SECONDS, intent_task.cancel)
+        intent_task.add_done_callback(lambda task: timeout.cancel())
+    intent_task.add_done_callback(write)
+
+def new_session_id(user_prompt: str) -> str:
+    return f"session_{int(time.time())}_{hash(user_prompt) % 10000}"
 
 # API Endpoints
 @app.post("/enhance-prompt", response_model=EnhancedPromptResponse)
 async def enhance_prompt(request: PromptRequest):
-    """Main endpoint to enhance user prompts"""
-    start_time = datetime.now()
-    session_id = f"session_{int(start_time.timestamp())}_{hash(request.user_prompt) % 10000}"
+    """Main endpoint to enhance user prompts.
+    
+    Intent detection runs concurrently with prompt and answer generation,
+    so the wall time is the generation critical path.
+    """
+    timer = StageTimer()
+    session_id = new_session_id(request.user_prompt)
+    logger.info(f"Processing prompt: {request.user_prompt[:100]}...")
+    intent_task = start_intent_detection(request.user_prompt, timer)
+    session_logged = False
     
     try:
-        # Step 1: Detect intent
-        logger.info(f"Processing prompt: {request.user_prompt[:100]}...")
-        detected_intent = await intent_recognizer.detect_intent(request.user_prompt)
-        logger.info(f"Detected intent: {detected_intent}")
-        
-        # Step 2: Generate enhanced prompt using dynamic generator
-        enhanced_prompt, llm_used = await dynamic_generator.generate_sniper_prompt(
-            request.user_prompt, 
-            include_examples=True
+        enhanced_prompt, llm_used = await timer.run(
+            "prompt_generation",
+            dynamic_generator.generate_sniper_prompt(request.user_prompt, include_examples=True)
         )
+        with mode_scope("answer"):
+            llm_response, response_llm = await timer.run(
+                "response_generation",
+                llm_service.generate_with_fallback(enhanced_prompt)
+            )
+        detected_intent = await resolve_intent(intent_task)
+        logger.info(f"Detected intent: {detected_intent}")
         
-        # Step 3: Generate response with the enhanced prompt
-        llm_response, response_llm = await llm_service.generate_with_fallback(enhanced_prompt)
-        
-        # Step 4: Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
-        # Step 5: Prepare response
+        processing_time = timer.elapsed()
         response = EnhancedPromptResponse(
             original_prompt=request.user_prompt,
             enhanced_prompt=enhanced_prompt,
@@ -430,25 +1101,12 @@ async def enhance_prompt(request: PromptRequest):
             llm_response=llm_response,
             processing_time=processing_time,
             llm_used=llm_used,
-            session_id=session_id
+            session_id=session_id,
+            stage_timings=timer.report()
         )
         
-        # Step 6: Log to database
-        session_data = {
-            'session_id': session_id,
-            'user_id': request.user_id,
-            'original_prompt': request.user_prompt,
-            'enhanced_prompt': enhanced_prompt,
-            'detected_intent': detected_intent.value,
-            'assigned_role': response.assigned_role,
-            'llm_response': llm_response,
-            'llm_used': llm_used,
-            'processing_time': processing_time,
-            'context': request.context,
-            'created_at': start_time.isoformat()
-        }
-        
-        await db_service.log_prompt_session(session_data)
+        log_session(session_id, request, enhanced_prompt, intent_task, llm_response, llm_used, processing_time)
+        session_logged = True
         logger.info(f"Session {session_id} completed successfully")
         
         return response
@@ -456,47 +1114,103 @@ async def enhance_prompt(request: PromptRequest):
     except Exception as e:
         logger.error(f"Error processing prompt: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if not session_logged:
+            intent_task.cancel()
+
+@app.post("/enhance-prompt/stream")
+async def enhance_prompt_stream(request: PromptRequest):
+    """Enhance a prompt and stream the answer as server-sent events.
+    
+    Events: prompt (the enhanced prompt), token (answer chunks), intent
+    (as soon as it is known), done (timings and session id) or error.
+    """
+    async def event_stream():
+        timer = StageTimer()
+        session_id = new_session_id(request.user_prompt)
+        intent_task = start_intent_detection(request.user_prompt, timer)
+        detected_intent = None
+        session_logged = False
+        
+        try:
+            enhanced_prompt, llm_used = await timer.run(
+                "prompt_generation",
+                dynamic_generator.generate_sniper_prompt(request.user_prompt, include_examples=True)
+            )
+            yield sse_event("prompt", {"enhanced_prompt": enhanced_prompt, "llm_used": llm_used})
+            
+            chunks = []
+            answer_started = time.perf_counter()
+            async for chunk, response_llm in llm_service.stream_with_fallback(enhanced_prompt, mode="answer"):
+                if not chunks:
+                    timer.timings["response_first_token"] = round((time.perf_counter() - answer_started) * 1000, 2)
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk, "llm_used": response_llm})
+                if detected_intent is None and intent_task.done():
+                    detected_intent = await resolve_intent(intent_task)
+                    yield sse_event("intent", {"detected_intent": detected_intent.value})
+            timer.timings["response_generation"] = round((time.perf_counter() - answer_started) * 1000, 2)
+            
+            if detected_intent is None:
+                detected_intent = await resolve_intent(intent_task)
+                yield sse_event("intent", {"detected_intent": detected_intent.value})
+            
+            processing_time = timer.elapsed()
+            log_session(session_id, request, enhanced_prompt, intent_task, "".join(chunks), llm_used, processing_time)
+            session_logged = True
+            yield sse_event("done", {
+                "session_id": session_id,
+                "processing_time": processing_time,
+                "stage_timings": timer.report()
+            })
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as e:
+            logger.error(f"Error streaming enhanced prompt: {str(e)}")
+            yield sse_event("error", {"detail": f"Internal server error: {str(e)}", "status_code": 500})
+        finally:
+            if not session_logged:
+                intent_task.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/prompts/generate", response_model=GeneratePromptResponse)
 async def generate_prompt(request: GeneratePromptRequest):
     """Generate prompts dynamically using LLM API based on selected mode"""
-    start_time = datetime.now()
+    start_time = time.perf_counter()
     
     try:
         logger.info(f"Generating {request.mode} prompt for: {request.user_input[:100]}...")
         
-        # Generate prompt based on selected mode only
-        llm_used = "unknown"
-        if request.mode == "sniper":
-            quick_prompt, llm_used = await dynamic_generator.generate_sniper_prompt(
-                request.user_input, 
-                request.include_examples
-            )
-            professional_prompt = None
-        elif request.mode == "titan":
-            professional_prompt, llm_used = await dynamic_generator.generate_titan_prompt(
-                request.user_input, 
-                request.include_examples,
-                request.validation_level
-            )
-            quick_prompt = None
-        else:
+        if request.mode not in ("sniper", "titan"):
             raise HTTPException(status_code=400, detail="Invalid mode. Must be 'sniper' or 'titan'")
         
-        # Generate suggestions if requested
-        suggestions = None
-        if request.include_clarifications:
-            suggestions = await dynamic_generator.generate_suggestions(request.user_input, request.mode)
+        # Generate the prompt and (if requested) suggestions concurrently
+        result = await dynamic_generator.generate_concurrently(
+            request.user_input,
+            request.mode,
+            include_examples=request.include_examples,
+            validation_level=request.validation_level,
+            include_suggestions=request.include_clarifications
+        )
+        quick_prompt = result.prompt if request.mode == "sniper" else None
+        professional_prompt = result.prompt if request.mode == "titan" else None
         
         # Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         
         response = GeneratePromptResponse(
             quick_prompt=quick_prompt,
             professional_prompt=professional_prompt,
-            suggestions=suggestions,
+            suggestions=result.suggestions,
             processing_time=processing_time,
-            llm_used=llm_used
+            llm_used=result.llm_used,
+            cache=dynamic_generator.cache_metadata(result.cache_hit, result.suggestions_cache_hit),
+            tokens=result.tokens
         )
         
         logger.info(f"Successfully generated {request.mode} prompt in {processing_time:.2f}s")
@@ -516,6 +1230,24 @@ async def get_user_sessions(user_id: str, limit: int = 10):
         logger.error(f"Error fetching user sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch sessions: {str(e)}")
 
+@app.post("/prompts/estimate")
+async def estimate_prompt(request: GeneratePromptRequest):
+    """Estimated input and output tokens of a /prompts/generate request, without calling a provider"""
+    if request.mode not in ("sniper", "titan"):
+        raise HTTPException(status_code=400, detail="Invalid mode. Must be 'sniper' or 'titan'")
+    return dynamic_generator.estimate_generation(
+        request.user_input,
+        request.mode,
+        include_examples=request.include_examples,
+        validation_level=request.validation_level,
+        include_suggestions=request.include_clarifications
+    )
+
+@app.get("/templates")
+async def list_templates():
+    """Prompt templates available to the generator"""
+    return {"templates": dynamic_generator.templates.describe()}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -525,9 +1257,17 @@ async def health_check():
         "available_llms": [
             provider.value for provider in [LLMProvider.GEMINI, LLMProvider.OPENAI, LLMProvider.CLAUDE]
             if getattr(llm_config, f"{provider.value}_api_key") or getattr(llm_config, f"{provider.value}_client")
-        ]
+        ],
+        "llm_providers": llm_service.provider_health(),
+        "session_writer": session_writer.stats(),
+        "tracing": tracer.stats()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Provider latency, token and cost metrics in the Prometheus text format"""
+    return Response(content=metrics_registry.render(), media_type=metrics_registry.content_type)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -536,9 +1276,13 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             "/enhance-prompt",
+            "/enhance-prompt/stream",
             "/prompts/generate",
+            "/prompts/estimate",
+            "/templates",
             "/user-sessions/{user_id}",
-            "/health"
+            "/health",
+            "/metrics"
         ]
     }
 
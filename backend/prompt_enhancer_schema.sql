@@ -47,9 +47,19 @@ CREATE TABLE IF NOT EXISTS llm_performance (
     error_message TEXT,
     response_time DECIMAL(10, 4),
     token_count INTEGER,
+    trace_id VARCHAR(32), -- Trace of the request that made the attempt
+    mode VARCHAR(50), -- sniper, titan, suggestions, answer, intent, ...
+    cost_usd DECIMAL(12, 6),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Columns added after the table was first created
+ALTER TABLE llm_performance ADD COLUMN IF NOT EXISTS trace_id VARCHAR(32);
+ALTER TABLE llm_performance ADD COLUMN IF NOT EXISTS mode VARCHAR(50);
+ALTER TABLE llm_performance ADD COLUMN IF NOT EXISTS cost_usd DECIMAL(12, 6);
+CREATE INDEX IF NOT EXISTS idx_llm_performance_trace_id ON llm_performance(trace_id);
+CREATE INDEX IF NOT EXISTS idx_llm_performance_created_at ON llm_performance(created_at DESC);
+
 -- Create user_preferences table for storing user-specific prompt enhancement preferences
 CREATE TABLE IF NOT EXISTS user_preferences (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -149,6 +159,22 @@ FROM prompt_sessions
 GROUP BY DATE_TRUNC('day', created_at), detected_intent, llm_used
 ORDER BY date DESC, session_count DESC;
 
+-- Create view for hourly LLM latency, token and cost aggregates
+CREATE OR REPLACE VIEW llm_performance_hourly AS
+SELECT 
+    DATE_TRUNC('hour', created_at) as hour,
+    llm_provider,
+    mode,
+    COUNT(*) as attempts,
+    COUNT(*) FILTER (WHERE success) as successes,
+    AVG(response_time) as avg_response_time,
+    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY response_time) as p95_response_time,
+    SUM(token_count) as total_tokens,
+    SUM(cost_usd) as total_cost_usd
+FROM llm_performance
+GROUP BY DATE_TRUNC('hour', created_at), llm_provider, mode
+ORDER BY hour DESC, attempts DESC;
+
 -- Create view for user activity summary
 CREATE OR REPLACE VIEW user_activity_summary AS
 SELECT 
@@ -173,4 +199,5 @@ COMMENT ON TABLE prompt_templates IS 'Reusable prompt templates for different in
 COMMENT ON COLUMN prompt_sessions.session_id IS 'Unique identifier for each prompt enhancement session';
 COMMENT ON COLUMN prompt_sessions.processing_time IS 'Time taken to process the prompt in seconds';
 COMMENT ON COLUMN intent_analytics.confidence_score IS 'Confidence score for intent detection (0.00 to 1.00)';
-COMMENT ON COLUMN llm_performance.attempt_order IS 'Order of LLM attempt (1=primary, 2=first fallback, etc.)';
\ No newline at end of file
+COMMENT ON COLUMN llm_performance.attempt_order IS 'Order of LLM attempt (1=primary, 2=first fallback, etc.)';
+COMMENT ON COLUMN llm_performance.trace_id IS 'Trace id of the request, as reported in X-Trace-Id and exported traces';
\ No newline at end of file
@@ -0,0 +1,202 @@
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+VARIABLE_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+TEMPLATE_FILE_EXTENSIONS = (".txt", ".md", ".tmpl")
+
+
+class PromptTemplate:
+    """A {{variable}} template, split into literal and variable segments once.
+
+    Rendering is a single join over the precompiled segments, and the
+    token count of the literal text is known up front, so a caller can
+    budget the variable parts before rendering.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        content: str,
+        description: Optional[str] = None,
+        intent_type: Optional[str] = None,
+        expected_output_tokens: Optional[int] = None,
+    ):
+        self.name = name
+        self.content = content
+        self.description = description
+        self.intent_type = intent_type
+        self.expected_output_tokens = expected_output_tokens
+
+        parts = VARIABLE_RE.split(content)
+        self.literals: List[str] = parts[0::2]
+        self.slots: List[str] = parts[1::2]
+        self.variables: List[str] = list(dict.fromkeys(self.slots))
+        self.static_tokens = estimate_tokens("".join(self.literals))
+
+    def render(self, **values: Any) -> str:
+        """Fill in every variable; raises ValueError if one is missing"""
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ValueError(f"Template {self.name} is missing variables: {', '.join(missing)}")
+        rendered = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            rendered.append(str(values[slot]))
+            rendered.append(literal)
+        return "".join(rendered)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "intent_type": self.intent_type,
+            "variables": self.variables,
+            "static_tokens": self.static_tokens,
+            "expected_output_tokens": self.expected_output_tokens,
+        }
+
+
+# Meta-prompts used by DynamicPromptGenerator. A file or database template
+# with the same name replaces one of these, provided it uses no other variables.
+SNIPER_TEMPLATE = PromptTemplate("sniper", """
+You are an expert prompt engineer. Create a CONCISE, FOCUSED prompt for the following user request.
+
+User Request: "{{user_input}}"
+
+Generate a SHORT, PRECISE prompt (50-150 words) that:
+- Gets straight to the point
+- Includes essential context only
+- Uses clear, direct language
+- Focuses on immediate actionable results
+- Avoids unnecessary elaboration
+
+{{examples_instruction}}
+
+Return ONLY the generated prompt, no explanations or meta-commentary.
+""", description="Meta-prompt for sniper mode", expected_output_tokens=200)
+
+TITAN_TEMPLATE = PromptTemplate("titan", """
+You are an expert prompt engineer. Create a COMPREHENSIVE, PROFESSIONAL prompt for the following user request.
+
+User Request: "{{user_input}}"
+
+Generate a DETAILED, STRUCTURED prompt (300-800 words) that includes:
+
+1. **Clear Role Definition**: Specify the AI's expertise and perspective
+2. **Detailed Task Description**: Break down what needs to be accomplished
+3. **Context and Background**: Provide relevant background information
+4. **Specific Requirements**: List clear, actionable requirements
+5. **Output Format**: Specify the desired structure and format
+6. **Quality Guidelines**: Include standards for excellence
+7. **Constraints and Considerations**: Mention limitations or special considerations
+{{examples_instruction}}
+
+Validation Level: {{validation_level}}
+{{validation_instructions}}
+
+Create a prompt that ensures high-quality, comprehensive results. Use professional language and clear structure.
+
+Return ONLY the generated prompt, no explanations or meta-commentary.
+""", description="Meta-prompt for titan mode", expected_output_tokens=1100)
+
+SUGGESTIONS_TEMPLATE = PromptTemplate("suggestions", """
+Analyze the following user request and provide helpful insights:
+
+User Request: "{{user_input}}"
+Mode: {{mode}}
+
+Provide a JSON response with:
+1. "clarifying_questions": Array of 2-3 questions that could help refine the request
+2. "assumptions_made": Array of 2-3 assumptions you're making about the request
+3. "improvement_tips": Array of 2-3 tips for better results
+
+Return ONLY valid JSON, no explanations.
+""", description="Meta-prompt for clarifying suggestions", expected_output_tokens=250)
+
+BUILTIN_TEMPLATES = {t.name: t for t in (SNIPER_TEMPLATE, TITAN_TEMPLATE, SUGGESTIONS_TEMPLATE)}
+
+SNIPER_EXAMPLES = {
+    True: "Include 1-2 brief examples if helpful.",
+    False: "Do not include examples.",
+}
+TITAN_EXAMPLES = {
+    True: "8. **Examples**: Provide relevant examples to illustrate expectations",
+    False: "",
+}
+VALIDATION_INSTRUCTIONS = {
+    "minimal": "Include basic validation steps.",
+    "standard": "Include thorough validation and error checking.",
+    "strict": "Include comprehensive validation, edge cases, and quality assurance steps."
+}
+
+
+class TemplateRegistry:
+    """Named prompt templates: the built-ins plus any loaded from files or the database"""
+
+    def __init__(self):
+        self.templates: Dict[str, PromptTemplate] = dict(BUILTIN_TEMPLATES)
+
+    def get(self, name: str) -> PromptTemplate:
+        return self.templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def register(self, template: PromptTemplate) -> bool:
+        """Add or replace a template; built-ins are only replaced by compatible templates"""
+        builtin = BUILTIN_TEMPLATES.get(template.name)
+        if builtin is not None:
+            unknown = set(template.variables) - set(builtin.variables)
+            if unknown:
+                logger.warning(
+                    f"Ignoring template {template.name}: unknown variables {', '.join(sorted(unknown))}"
+                )
+                return False
+            if template.expected_output_tokens is None:
+                template.expected_output_tokens = builtin.expected_output_tokens
+        self.templates[template.name] = template
+        return True
+
+    def load_directory(self, path: str) -> int:
+        """Register every template file in path, named after the file"""
+        loaded = 0
+        for filename in sorted(os.listdir(path)):
+            name, extension = os.path.splitext(filename)
+            if extension not in TEMPLATE_FILE_EXTENSIONS:
+                continue
+            with open(os.path.join(path, filename), encoding="utf-8") as source:
+                loaded += self.register(PromptTemplate(name, source.read()))
+        return loaded
+
+    def load_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Register rows of the prompt_templates table"""
+        loaded = 0
+        for row in rows:
+            loaded += self.register(PromptTemplate(
+                row["name"],
+                row["template_content"],
+                description=row.get("description"),
+                intent_type=row.get("intent_type"),
+            ))
+        return loaded
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [template.describe() for template in self.templates.values()]
+
+
+def create_template_registry() -> TemplateRegistry:
+    """Built-in templates, overridden by files in PROMPT_TEMPLATES_DIR if it is set"""
+    registry = TemplateRegistry()
+    path = os.getenv("PROMPT_TEMPLATES_DIR")
+    if path:
+        try:
+            loaded = registry.load_directory(path)
+            logger.info(f"✅ Loaded {loaded} prompt templates from {path}")
+        except OSError as e:
+            logger.error(f"❌ Failed to load prompt templates from {path}: {e}")
+    return registry
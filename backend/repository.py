@@ -0,0 +1,201 @@
+import base64
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Protocol, Tuple, Union, runtime_checkable
+
+from llm_routing import LatencyWindow
+from user_cache import UserCache, user_cache
+
+# Keyset position in a user's prompt history: (created_at, id) of the last row seen
+PromptCursor = Tuple[datetime, str]
+
+# Length of the input/output previews in prompt summaries
+PREVIEW_CHARS = 200
+SUMMARY_FIELDS = ("id", "user_id", "detected_role", "persona", "source", "analytics", "created_at")
+
+
+def encode_cursor(prompt: Dict[str, Any]) -> str:
+    """Opaque pagination cursor pointing just after the given prompt"""
+    created_at: Union[datetime, str] = prompt["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps([created_at, prompt["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> PromptCursor:
+    """Parse a cursor produced by encode_cursor; raises ValueError if it is malformed.
+
+    Prompt ids are UUIDs; anything else is rejected so the id is safe to
+    embed in backend filter expressions. Timestamps must carry a UTC
+    offset, like the created_at values they are compared with.
+    """
+    try:
+        created_at, prompt_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            raise ValueError("cursor timestamp has no UTC offset")
+        return created_at, str(uuid.UUID(str(prompt_id)))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def summarize_prompt(prompt: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary projection of a prompt row: metadata plus short text previews"""
+    summary = {field: prompt.get(field) for field in SUMMARY_FIELDS}
+    summary["input_preview"] = prompt["raw_input"][:PREVIEW_CHARS]
+    summary["output_preview"] = prompt["generated_output"][:PREVIEW_CHARS]
+    return summary
+
+
+@runtime_checkable
+class UserRepository(Protocol):
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]: ...
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]: ...
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]: ...
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool: ...
+    async def delete_user(self, user_id: str) -> bool: ...
+
+
+@runtime_checkable
+class PromptRepository(Protocol):
+    async def create_prompt(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]: ...
+    async def create_prompts(self, prompts: List[Dict[str, Any]]) -> int: ...
+    async def get_user_prompts(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]: ...
+    async def get_user_prompt_summaries(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]: ...
+    async def get_prompt(self, prompt_id: str, user_id: str) -> Optional[Dict[str, Any]]: ...
+    async def search_prompts(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]: ...
+    async def delete_prompt(self, prompt_id: str, user_id: str) -> bool: ...
+
+
+@runtime_checkable
+class AnalyticsRepository(Protocol):
+    async def create_analytics_event(self, event_data: Dict[str, Any]) -> bool: ...
+    async def get_analytics_events(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]: ...
+
+
+@runtime_checkable
+class Repository(UserRepository, PromptRepository, AnalyticsRepository, Protocol):
+    """Data access interface implemented by every database backend"""
+
+    def is_connected(self) -> bool: ...
+    async def get_stats(self) -> Dict[str, int]: ...
+
+
+class OperationStats:
+    """Call count, error count and latency window for one repository operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latencies = LatencyWindow()
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latencies.percentile(50)
+        p99 = self.latencies.percentile(99)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+        }
+
+
+class InstrumentedRepository:
+    """Cross-cutting layer in front of any Repository backend.
+
+    Records per-operation call counts, errors and latencies, and serves
+    user-by-id lookups from the user cache, invalidating it on writes.
+    Backends stay plain data access; anything added here applies to all
+    of them.
+    """
+
+    def __init__(self, backend: Repository, cache: Optional[UserCache] = user_cache):
+        self.backend = backend
+        self.cache = cache
+        self.operations: Dict[str, OperationStats] = {}
+
+    async def _call(self, operation: str, *args, **kwargs) -> Any:
+        stats = self.operations.setdefault(operation, OperationStats())
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            return await getattr(self.backend, operation)(*args, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.latencies.record(time.perf_counter() - started)
+
+    # User operations
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("create_user", user_data)
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self._call("get_user_by_email", email)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return await self._call("get_user_by_id", user_id)
+        return await self.cache.get_or_load(user_id, lambda uid: self._call("get_user_by_id", uid))
+
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        try:
+            return await self._call("update_user", user_id, update_data)
+        finally:
+            self.invalidate_user(user_id)
+
+    async def delete_user(self, user_id: str) -> bool:
+        try:
+            return await self._call("delete_user", user_id)
+        finally:
+            self.invalidate_user(user_id)
+
+    def invalidate_user(self, user_id: str):
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
+
+    # Prompt operations
+    async def create_prompt(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("create_prompt", prompt_data)
+
+    async def create_prompts(self, prompts: List[Dict[str, Any]]) -> int:
+        return await self._call("create_prompts", prompts)
+
+    async def get_user_prompts(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        return await self._call("get_user_prompts", user_id, limit=limit, before=before)
+
+    async def get_user_prompt_summaries(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        return await self._call("get_user_prompt_summaries", user_id, limit=limit, before=before)
+
+    async def get_prompt(self, prompt_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call("get_prompt", prompt_id, user_id)
+
+    async def search_prompts(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        return await self._call("search_prompts", user_id, query, limit=limit, offset=offset)
+
+    async def delete_prompt(self, prompt_id: str, user_id: str) -> bool:
+        return await self._call("delete_prompt", prompt_id, user_id)
+
+    # Analytics operations
+    async def create_analytics_event(self, event_data: Dict[str, Any]) -> bool:
+        return await self._call("create_analytics_event", event_data)
+
+    async def get_analytics_events(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        return await self._call("get_analytics_events", user_id, limit=limit)
+
+    # Status
+    def is_connected(self) -> bool:
+        return self.backend.is_connected()
+
+    async def get_stats(self) -> Dict[str, int]:
+        return await self.backend.get_stats()
+
+    def operation_stats(self) -> Dict[str, Any]:
+        """Per-operation metrics plus user cache counters"""
+        stats = {name: op.snapshot() for name, op in sorted(self.operations.items())}
+        if self.cache is not None:
+            stats["user_cache"] = self.cache.stats()
+        return stats
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Interface for response cache storage backends"""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    async def run(self, fn, *args):
+        """Call one of the methods above from async code"""
+        return fn(*args)
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL expiry"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class DiskCache(CacheBackend):
+    """Local on-disk cache backed by a SQLite file; values must be JSON serializable.
+
+    Queries block, so async callers go through run(), which executes them
+    on a single dedicated thread. The row count is kept in memory (read
+    once at startup) so writes don't count the table to enforce the limit.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-cache")
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed_at ON cache(accessed_at)")
+        self.count = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        row = self.conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self.delete(key)
+            return None
+        self.conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        serialized = json.dumps(value)
+        updated = self.conn.execute(
+            "UPDATE cache SET value = ?, expires_at = ?, accessed_at = ? WHERE key = ?",
+            (serialized, now + ttl, now, key)
+        ).rowcount
+        if not updated:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, serialized, now + ttl, now)
+            )
+            self.count += 1
+            if self.count > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self.count -= self.conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,)).rowcount
+        overflow = self.count - self.max_entries
+        if overflow > 0:
+            self.count -= self.conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            ).rowcount
+
+    def delete(self, key: str):
+        self.count -= self.conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+
+    def clear(self):
+        self.conn.execute("DELETE FROM cache")
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def normalize_input(user_input: str) -> str:
+    """Normalize user input for cache keys (case and whitespace insensitive)"""
+    return re.sub(r"\s+", " ", user_input.strip().lower())
+
+
+class ResponseCache:
+    """Exact-match cache for generated prompts and suggestions, with hit/miss counters"""
+
+    def __init__(self, backend: CacheBackend, ttl: float = 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(namespace: str, user_input: str, **params: Any) -> str:
+        """Cache key from the normalized input and the generation parameters"""
+        payload = json.dumps(
+            {"namespace": namespace, "input": normalize_input(user_input), **params},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.run(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"Cache read failed: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        try:
+            await self.backend.run(self.backend.set, key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for response metadata"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache from PROMPT_CACHE_* environment variables.
+
+    PROMPT_CACHE_BACKEND selects "memory" (default), "disk" or "none".
+    """
+    backend_name = os.getenv("PROMPT_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+    max_entries = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1000"))
+
+    if backend_name == "none":
+        return None
+    if backend_name == "disk":
+        path = os.getenv("PROMPT_CACHE_PATH", "prompt_cache.sqlite3")
+        logger.info(f"📦 Using on-disk prompt cache at {path}")
+        return ResponseCache(DiskCache(path, max_entries=max_entries), ttl=ttl)
+
+    return ResponseCache(LRUCache(max_entries=max_entries), ttl=ttl)
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from llm_routing import LatencyWindow
+from metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS
+from token_budget import estimate_tokens
+
+
+class Priority(IntEnum):
+    """Scheduling priority for provider calls (lower is served first)"""
+    HIGH = 0    # short interactive calls, e.g. sniper prompts
+    NORMAL = 1  # suggestions and other auxiliary calls
+    LOW = 2     # long generations, e.g. titan prompts
+
+
+# Expected completion size per priority, charged against the tokens/min budget
+EXPECTED_OUTPUT_TOKENS = {
+    Priority.HIGH: 300,
+    Priority.NORMAL: 500,
+    Priority.LOW: 1200,
+}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)"""
+        # Requests larger than the bucket would never fit; let them drain it instead
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLane:
+    """Concurrency slots, rate limits and a priority wait queue for one provider.
+
+    Waiters are admitted strictly in priority order, and only once both a
+    concurrency slot and the rate-limit tokens for the call are available;
+    both are taken together, so a call waiting on the rate limit never
+    holds a slot. When the head of the queue is waiting on the rate limit,
+    a timer wakes the queue once its tokens have refilled.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+        self.active = 0
+        # (priority, sequence, token cost, future)
+        self.waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        for priority in Priority:
+            LLM_QUEUE_DEPTH.inc(0, provider=name, priority=priority.name.lower())
+
+        self.completed = 0
+        self.wait_count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = LatencyWindow()
+
+    def queue_depth(self) -> int:
+        return len(self.waiters)
+
+    def _dequeued(self, priority: int):
+        LLM_QUEUE_DEPTH.dec(provider=self.name, priority=Priority(priority).name.lower())
+
+    def _rate_delay(self, tokens: int) -> float:
+        """Seconds until the rate limits allow a call costing tokens"""
+        delay = 0.0
+        if self.requests:
+            delay = self.requests.wait_time(1)
+        if self.tokens:
+            delay = max(delay, self.tokens.wait_time(tokens))
+        return delay
+
+    def _admit(self, tokens: int):
+        self.active += 1
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    async def _acquire(self, priority: Priority, tokens: int):
+        if not self.waiters and self.active < self.max_concurrency and not self._rate_delay(tokens):
+            self._admit(tokens)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (int(priority), next(self.sequence), tokens, future)
+        heapq.heappush(self.waiters, entry)
+        LLM_QUEUE_DEPTH.inc(provider=self.name, priority=priority.name.lower())
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before the cancellation
+                self._release_slot()
+            elif entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self._dequeued(entry[0])
+                self._wake()
+            raise
+
+    def _release_slot(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.active < self.max_concurrency:
+            priority, _, tokens, future = self.waiters[0]
+            if future.done():
+                # Cancelled, and about to remove itself
+                heapq.heappop(self.waiters)
+                self._dequeued(priority)
+                continue
+            delay = self._rate_delay(tokens)
+            if delay:
+                self._wake_later(delay)
+                return
+            heapq.heappop(self.waiters)
+            self._dequeued(priority)
+            self._admit(tokens)
+            future.set_result(None)
+
+    def _wake_later(self, delay: float):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self.timer = None
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, tokens: int) -> AsyncIterator[None]:
+        """Hold a concurrency slot once the rate limits allow the call"""
+        queued_at = time.monotonic()
+        await self._acquire(priority, tokens)
+        try:
+            waited = time.monotonic() - queued_at
+            self.wait_count += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.waits.record(waited)
+            LLM_QUEUE_WAIT_SECONDS.observe(waited, provider=self.name, priority=priority.name.lower())
+
+            yield
+        finally:
+            self.completed += 1
+            self._release_slot()
+
+    def stats(self) -> Dict[str, Any]:
+        queued_by_priority = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, _, _ in self.waiters:
+            queued_by_priority[Priority(priority).name.lower()] += 1
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": sum(queued_by_priority.values()),
+            "queued_by_priority": queued_by_priority,
+            "completed": self.completed,
+            "avg_wait_seconds": round(self.total_wait / self.wait_count, 4) if self.wait_count else 0.0,
+            "p95_wait_seconds": self.waits.percentile(95),
+            "max_wait_seconds": round(self.max_wait, 4),
+            "requests_available": round(self.requests.available(), 1) if self.requests else None,
+            "tokens_available": round(self.tokens.available(), 1) if self.tokens else None,
+        }
+
+
+class ProviderScheduler:
+    """Per-provider lanes configured from the environment.
+
+    For each provider: LLM_MAX_CONCURRENCY_<PROVIDER> (default
+    LLM_MAX_CONCURRENCY, 32) concurrent calls, LLM_RPM_<PROVIDER> requests
+    per minute and LLM_TPM_<PROVIDER> tokens per minute (0 = unlimited).
+    Waiting calls are served strictly by priority, FIFO within a priority.
+    """
+
+    def __init__(self, providers: Iterable[str]):
+        default_limit = os.getenv("LLM_MAX_CONCURRENCY", "32")
+        self.lanes: Dict[str, ProviderLane] = {}
+        for provider in providers:
+            key = provider.upper()
+            self.lanes[provider] = ProviderLane(
+                provider,
+                max_concurrency=int(os.getenv(f"LLM_MAX_CONCURRENCY_{key}", default_limit)),
+                requests_per_minute=float(os.getenv(f"LLM_RPM_{key}", "0")),
+                tokens_per_minute=float(os.getenv(f"LLM_TPM_{key}", "0")),
+            )
+
+    def slot(self, provider: str, priority: Priority = Priority.NORMAL, prompt: Optional[str] = None):
+        """Async context manager holding a slot on the provider's lane"""
+        tokens = (estimate_tokens(prompt) if prompt else 0) + EXPECTED_OUTPUT_TOKENS[priority]
+        return self.lanes[provider].slot(priority, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait time per provider"""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Very common words carry no ranking signal and would make every posting list huge
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its me my of on or our so "
+    "that the this to was we were will with you your".split()
+)
+
+
+# Only the most recent matches are ranked, which bounds the cost of very common terms
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "5000"))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of text, without stop words"""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class UserSearchIndex:
+    """Inverted index over one user's prompts"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # Posting dicts keep insertion order, i.e. oldest to newest prompt
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add(self, prompt_id: str, text: str):
+        if prompt_id in self.lengths:
+            self.remove(prompt_id, text)
+        tokens = tokenize(text)
+        for term, count in Counter(tokens).items():
+            self.postings.setdefault(term, {})[prompt_id] = count
+        self.lengths[prompt_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, prompt_id: str, text: str):
+        if prompt_id not in self.lengths:
+            return
+        for term in set(tokenize(text)):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(prompt_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(prompt_id)
+
+
+class PromptSearchIndex:
+    """Incrementally maintained per-user inverted index with BM25 ranking.
+
+    Documents match when they contain every query term (like Postgres'
+    plainto_tsquery); candidates are found by walking the rarest term's
+    posting list from newest to oldest and probing the others, so common
+    terms don't dominate query cost. Raw input and generated output are
+    indexed together. When more than max_candidates prompts match, only
+    the most recently indexed ones are ranked.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_candidates: int = SEARCH_MAX_CANDIDATES):
+        self.k1 = k1
+        self.b = b
+        self.max_candidates = max_candidates
+        self.users: Dict[str, UserSearchIndex] = {}
+
+    @staticmethod
+    def document_text(prompt: Dict) -> str:
+        return f"{prompt.get('raw_input') or ''}\n{prompt.get('generated_output') or ''}"
+
+    def add(self, prompt: Dict):
+        """Index a prompt"""
+        index = self.users.setdefault(prompt["user_id"], UserSearchIndex())
+        index.add(prompt["id"], self.document_text(prompt))
+
+    def remove(self, prompt: Dict):
+        """Remove a prompt from the index"""
+        index = self.users.get(prompt["user_id"])
+        if index is not None:
+            index.remove(prompt["id"], self.document_text(prompt))
+
+    def clear(self):
+        self.users.clear()
+
+    def search(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Tuple[str, float]]:
+        """(prompt_id, score) pairs for the user's best matches, highest score first"""
+        index = self.users.get(user_id)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if index is None or not terms or not index.lengths:
+            return []
+
+        term_docs = []
+        for term in terms:
+            docs = index.postings.get(term)
+            if not docs:
+                return []
+            term_docs.append(docs)
+        term_docs.sort(key=len)
+
+        rarest, others = term_docs[0], term_docs[1:]
+        if others:
+            matches = (prompt_id for prompt_id in reversed(rarest) if all(prompt_id in docs for docs in others))
+        else:
+            matches = reversed(rarest)
+        candidates = list(itertools.islice(matches, self.max_candidates))
+
+        doc_count = len(index.lengths)
+        lengths = index.lengths
+        k1 = self.k1
+        # Per-document length normalization: k1 * (1 - b + b * length / avg_length)
+        base = k1 * (1 - self.b)
+        per_token = k1 * self.b * doc_count / (index.total_length or 1)
+        scored_terms = [
+            (docs, math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5)) * (k1 + 1))
+            for docs in term_docs
+        ]
+
+        def score(prompt_id: str) -> float:
+            norm = base + per_token * lengths[prompt_id]
+            total = 0.0
+            for docs, weight in scored_terms:
+                tf = docs[prompt_id]
+                total += weight * tf / (tf + norm)
+            return total
+
+        ranked = heapq.nlargest(offset + limit, candidates, key=score)
+        return [(prompt_id, score(prompt_id)) for prompt_id in ranked[offset:]]
@@ -1,23 +1,29 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 import uuid
 import jwt
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
-import bcrypt
 from datetime import datetime, timedelta, timezone
 import re
 import json
+import time
 
 # Import our modules
-from database import connect_to_database, close_database_connection, get_database, is_using_supabase
+from database import connect_to_database, close_database_connection, get_repository, get_database_type, check_database_health
+from repository import encode_cursor, decode_cursor
 from supabase_config import get_supabase_client
+from password_hasher import password_hasher, HasherBusyError
+from batch_runner import BatchRunner, batch_prompt_id, read_batch
+from job_queue import FINISHED_STATES, create_job_store, create_job_worker
 
 # Load environment variables first
 ROOT_DIR = Path(__file__).parent
@@ -26,7 +32,13 @@ load_dotenv(ROOT_DIR / '.env')
 # Add imports for dynamic prompt generation
 import sys
 sys.path.append('.')
-from prompt_enhancer import DynamicPromptGenerator, LLMService
+from prompt_enhancer import sse_event, performance_writer
+from generation import (
+    llm_service, dynamic_generator, prompt_writer, job_handlers, load_templates,
+    run_generation, save_generated_prompt, build_generation_metadata
+)
+from metrics import registry as metrics_registry
+from tracing import TracingMiddleware, create_tracer, span
 from models import (
     User, UserCreate, UserLogin, UserUpdate,
     AnalyticsEvent, AnalyticsEventCreate,
@@ -43,21 +55,43 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Batch generation limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+
 # Security
 security = HTTPBearer()
 
-# Initialize services
-llm_service = LLMService()
-dynamic_generator = DynamicPromptGenerator(llm_service)
+# Queued generations; JOB_WORKERS=0 leaves execution to `python job_queue.py worker`
+job_store = create_job_store()
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "1.0"))
 
 # Database lifecycle
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    await tracer.start()
     await connect_to_database()
+    await load_templates()
+    await prompt_writer.start()
+    if performance_writer:
+        await performance_writer.start()
+    await job_store.connect()
+    job_worker = create_job_worker(job_store, job_handlers)
+    await job_worker.start()
+    app.state.job_worker = job_worker
     yield
     # Shutdown
+    await job_worker.stop()
+    await job_store.close()
+    await prompt_writer.stop()
+    if performance_writer:
+        await performance_writer.stop()
     await close_database_connection()
+    password_hasher.shutdown()
+    await tracer.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -74,8 +108,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Trace-Id"],
 )
 
+# Per-request spans, reported in Server-Timing headers and optionally exported
+tracer = create_tracer()
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 # API Router
 api_router = APIRouter(prefix="/api")
 
@@ -92,7 +131,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.jwt"):
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -115,12 +155,17 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 async def get_current_user(user_id: str = Depends(verify_token)) -> User:
-    db = get_database()
-    
-    if is_using_supabase():
-        user_data = await db.get_user_by_id(user_id)
-    else:
-        user_data = db.users.get(user_id)
+    db = get_repository()
+    try:
+        with span("auth.user_lookup"):
+            user_data = await db.get_user_by_id(user_id)
+    except Exception as e:
+        logger.error(f"User lookup failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="User lookup temporarily unavailable",
+            headers={"Retry-After": "1"},
+        )
     
     if user_data is None:
         raise HTTPException(
@@ -129,6 +174,14 @@ async def get_current_user(user_id: str = Depends(verify_token)) -> User:
         )
     return User(**user_data)
 
+def raise_hasher_busy():
+    logger.warning("Password hashing queue full, rejecting request")
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 # Basic Routes
 @api_router.get("/health")
 async def health_check():
@@ -137,51 +190,56 @@ async def health_check():
     return {
         "status": "healthy",
         "database": db_status,
+        "llm_providers": llm_service.provider_health(),
+        "prompt_writer": prompt_writer.stats(),
+        "password_hasher": password_hasher.stats(),
+        "jobs": {**await job_store.counts(), "worker": app.state.job_worker.stats()},
+        "tracing": tracer.stats(),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @api_router.post("/register")
 async def register(user_data: UserCreate):
     """Register a new user"""
-    db = get_database()
+    db = get_repository()
     
     # Check if user already exists
-    if is_using_supabase():
-        existing_user = await db.get_user_by_email(user_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-    else:
-        # In-memory database check
-        for existing_user in db.users.values():
-            if existing_user["email"] == user_data.email:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Email already registered"
-                )
+    existing_user = await db.get_user_by_email(user_data.email)
+    if existing_user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     # Hash password
-    hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), bcrypt.gensalt())
+    try:
+        with span("auth.password_hash"):
+            hashed_password = await password_hasher.hash(user_data.password)
+    except HasherBusyError:
+        raise_hasher_busy()
     
     # Create user
     user = User(
         id=str(uuid.uuid4()),
         email=user_data.email,
         username=user_data.username,
-        hashed_password=hashed_password.decode('utf-8'),
+        hashed_password=hashed_password,
         is_active=True,
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc)
     )
     
-    # Save to database
-    if is_using_supabase():
+    # Save to database; a concurrent registration may have taken the email while hashing
+    try:
         await db.create_user(user.model_dump())
-    else:
-        db.users[user.id] = user.model_dump()
-    
+    except Exception:
+        if await db.get_user_by_email(user_data.email):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        raise
+
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -201,18 +259,10 @@ async def register(user_data: UserCreate):
 @api_router.post("/login")
 async def login(user_data: UserLogin):
     """Login user"""
-    db = get_database()
+    db = get_repository()
     
     # Find user
-    if is_using_supabase():
-        user_doc = await db.get_user_by_email(user_data.email)
-    else:
-        # In-memory database search
-        user_doc = None
-        for user_id, user_data_stored in db.users.items():
-            if user_data_stored["email"] == user_data.email:
-                user_doc = user_data_stored
-                break
+    user_doc = await db.get_user_by_email(user_data.email)
     
     if not user_doc:
         raise HTTPException(
@@ -223,7 +273,12 @@ async def login(user_data: UserLogin):
     user = User(**user_doc)
     
     # Verify password
-    if not bcrypt.checkpw(user_data.password.encode('utf-8'), user.hashed_password.encode('utf-8')):
+    try:
+        with span("auth.password_verify"):
+            password_valid = await password_hasher.verify(user_data.password, user.hashed_password)
+    except HasherBusyError:
+        raise_hasher_busy()
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -256,76 +311,78 @@ async def get_profile(current_user: User = Depends(get_current_user)):
         "is_active": current_user.is_active
     }
 
+@api_router.put("/profile")
+async def update_profile(update: UserUpdate, current_user: User = Depends(get_current_user)):
+    """Update current user profile"""
+    db = get_repository()
+    update_data = update.model_dump(exclude_none=True)
+    
+    if "email" in update_data and update_data["email"] != current_user.email:
+        existing_user = await db.get_user_by_email(update_data["email"])
+        if existing_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+    
+    if update_data and not await db.update_user(current_user.id, update_data):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Profile update failed"
+        )
+    
+    updated_user = current_user.model_copy(update=update_data)
+    return {
+        "id": updated_user.id,
+        "email": updated_user.email,
+        "username": updated_user.username,
+        "created_at": updated_user.created_at,
+        "is_active": updated_user.is_active
+    }
+
+def job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"],
+        "status_url": f"/api/jobs/{job['id']}",
+        "events_url": f"/api/jobs/{job['id']}/events"
+    }
+
 @api_router.post("/prompts/generate")
-async def generate_prompt(request: PromptGenerate, current_user: User = Depends(get_current_user)):
-    """Dynamic prompt generation using LLM-based enhancement"""
+async def generate_prompt(
+    request: PromptGenerate,
+    response: Response,
+    run_async: bool = Query(False, alias="async"),
+    current_user: User = Depends(get_current_user)
+):
+    """Dynamic prompt generation using LLM-based enhancement.
+    
+    With ?async=true the request is queued as a job instead: the response
+    is 202 with the job id, and the result is fetched from /api/jobs/{id}
+    or its event stream.
+    """
+    if run_async:
+        job = await job_store.submit("prompt_generation", request.model_dump(), user_id=current_user.id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/api/jobs/{job['id']}"
+        return job_response(job)
+    
     try:
-        start_time = datetime.now()
-        
-        # Generate prompts based on mode
-        if request.mode == 'sniper':
-            quick_prompt, llm_used = await dynamic_generator.generate_sniper_prompt(
-                request.user_input, 
-                include_examples=getattr(request, 'include_examples', True)
-            )
-            professional_prompt = quick_prompt  # Same for sniper mode
-        else:  # titan mode
-            professional_prompt, llm_used = await dynamic_generator.generate_titan_prompt(
-                request.user_input,
-                include_examples=getattr(request, 'include_examples', True),
-                validation_level=getattr(request, 'validation_level', 'standard')
-            )
-            quick_prompt = professional_prompt  # Same for titan mode
+        return await run_generation(current_user.id, request)
         
-        # Generate suggestions
-        suggestions = await dynamic_generator.generate_suggestions(request.user_input, request.mode)
-        
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        
-        # Create prompt record
-        prompt = Prompt(
-            id=str(uuid.uuid4()),
-            user_id=current_user.id,
-            raw_input=request.user_input,
-            generated_output=quick_prompt if request.mode == 'sniper' else professional_prompt,
-            detected_role="Dynamic AI Assistant",
-            persona="Expert Assistant",
-            source="dynamic_generation",
-            analytics={
-                "input_length": len(request.user_input),
-                "output_length": len(quick_prompt if request.mode == 'sniper' else professional_prompt),
-                "processing_time": processing_time,
-                "mode_used": request.mode,
-                "llm_used": llm_used
-            },
-            created_at=datetime.now(timezone.utc)
+    except asyncio.TimeoutError:
+        logger.error(f"Prompt generation timed out after {dynamic_generator.prompt_timeout}s")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Prompt generation timed out"
         )
-        
-        # Save to database
-        try:
-            db = get_database()
-            if is_using_supabase():
-                await db.create_prompt(prompt.model_dump())
-            else:
-                db.prompts[prompt.id] = prompt.model_dump()
-        except Exception as db_error:
-            logger.warning(f"Database save failed: {db_error}")
-        
-        return {
-            "quick_prompt": quick_prompt,
-            "professional_prompt": professional_prompt,
-            "metadata": {
-                "detected_intent": {"name": "dynamic", "slug": "dynamic"},
-                "assigned_persona": {"name": "Dynamic AI Assistant", "slug": "dynamic"},
-                "confidence_score": 0.9,
-                "processing_time": processing_time,
-                "validation_passed": True,
-                "llm_used": llm_used
-            },
-            "suggestions": suggestions,
-            "source": "dynamic_generation"
-        }
-        
     except Exception as e:
         logger.error(f"Prompt generation failed: {e}")
         raise HTTPException(
@@ -333,42 +390,250 @@ async def generate_prompt(request: PromptGenerate, current_user: User = Depends(
             detail=f"Prompt generation failed: {str(e)}"
         )
 
+@api_router.post("/prompts/generate/stream")
+async def generate_prompt_stream(request: PromptGenerate, current_user: User = Depends(get_current_user)):
+    """Dynamic prompt generation streamed as server-sent events.
+    
+    Emits `token` events as the prompt is generated, then `suggestions`
+    (if requested) and a final `done` event once the prompt is persisted.
+    Failures are reported as an `error` event.
+    """
+    async def event_stream():
+        start_time = time.perf_counter()
+        tokens = dynamic_generator.estimate_generation(
+            request.user_input,
+            request.mode,
+            include_examples=request.include_examples,
+            validation_level=request.validation_level,
+            include_suggestions=request.include_clarifications
+        )
+        suggestions_task = None
+        if request.include_clarifications:
+            suggestions_task = dynamic_generator.start_suggestions(request.user_input, request.mode)
+        
+        chunks = []
+        llm_used = "unknown"
+        cache_hit = False
+        try:
+            async for chunk, llm_used, cache_hit in dynamic_generator.stream_prompt(
+                request.user_input,
+                request.mode,
+                include_examples=request.include_examples,
+                validation_level=request.validation_level
+            ):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+        except Exception as e:
+            if suggestions_task:
+                suggestions_task.cancel()
+            logger.error(f"Streaming prompt generation failed: {e}")
+            yield sse_event("error", {"detail": f"Prompt generation failed: {getattr(e, 'detail', str(e))}"})
+            return
+        except BaseException:
+            # Client disconnected
+            if suggestions_task:
+                suggestions_task.cancel()
+            raise
+        
+        generated_prompt = "".join(chunks).strip()
+        
+        suggestions_cache_hit = False
+        if suggestions_task:
+            suggestions, suggestions_cache_hit = await dynamic_generator.collect_suggestions(suggestions_task)
+            yield sse_event("suggestions", suggestions)
+        
+        processing_time = (time.perf_counter() - start_time) * 1000
+        prompt = save_generated_prompt(current_user.id, request, generated_prompt, llm_used, processing_time)
+        
+        yield sse_event("done", {
+            "prompt_id": prompt.id,
+            "quick_prompt": generated_prompt,
+            "professional_prompt": generated_prompt,
+            "metadata": build_generation_metadata(
+                llm_used,
+                processing_time,
+                dynamic_generator.cache_metadata(cache_hit, suggestions_cache_hit),
+                tokens
+            ),
+            "source": "dynamic_generation"
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Status, and once finished the result, of a queued generation"""
+    job = await job_store.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_response(job)
+
+@api_router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, current_user: User = Depends(get_current_user)):
+    """Job progress as server-sent events.
+    
+    Emits a `status` event whenever the job's status changes and ends
+    with `done` (the finished job, including its result or error).
+    """
+    job = await job_store.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current is None:
+                yield sse_event("error", {"detail": "Job not found"})
+                return
+            if current["status"] in FINISHED_STATES:
+                yield sse_event("done", job_response(current))
+                return
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event("status", {"job_id": job_id, "status": last_status, "attempts": current["attempts"]})
+            await job_store.wait(JOB_EVENTS_POLL_INTERVAL)
+            current = await job_store.get(job_id, current_user.id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class BatchResponse(StreamingResponse):
+    """Streaming response for an endpoint that is still reading its request body.
+    
+    StreamingResponse normally reads receive() to notice disconnects, which
+    would take body chunks away from request.stream(); the body reader
+    notices a disconnect itself instead.
+    """
+    
+    async def listen_for_disconnect(self, receive):
+        await asyncio.Event().wait()
+
+@api_router.post("/prompts/batch")
+async def generate_prompt_batch(
+    request: Request,
+    concurrency: int = Query(BATCH_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY),
+    batch_id: Optional[str] = Query(None, min_length=1, max_length=128),
+    current_user: User = Depends(get_current_user)
+):
+    """Generate prompts for a JSONL body of PromptGenerate objects.
+    
+    Items run on a bounded worker pool with per-item retries, and one
+    result per item is streamed back as JSONL in completion order, keyed
+    by the item's line index (and its "id", if given). The body is parsed
+    as it arrives, and generated prompts are persisted through the
+    write-behind queue in multi-row batches.
+    
+    With a batch_id, finished items are saved in the job store and their
+    prompts get ids derived from the batch, so sending the same body with
+    the same batch_id after an interruption replays the saved results and
+    only runs the items that have none.
+    """
+    done: Dict[int, Dict[str, Any]] = {}
+    if batch_id:
+        done = {record["index"]: record for record in await job_store.batch_results(current_user.id, batch_id)}
+    runner = BatchRunner(dynamic_generator, concurrency, BATCH_MAX_ATTEMPTS)
+    
+    async def remaining():
+        async for item in read_batch(request.stream(), BATCH_MAX_ITEMS):
+            if item.index not in done:
+                yield item
+    
+    async def result_stream():
+        for record in done.values():
+            yield json.dumps(record, default=str) + "\n"
+        async for item, record in runner.run(remaining()):
+            if record["status"] == "ok":
+                prompt = save_generated_prompt(
+                    current_user.id, item.request, record["prompt"], record["llm_used"], record["processing_time"],
+                    batch_prompt_id(current_user.id, batch_id, item.index) if batch_id else None
+                )
+                record["prompt_id"] = prompt.id
+            if batch_id and (record["status"] == "ok" or not record["retryable"]):
+                await job_store.save_batch_result(current_user.id, batch_id, record)
+            yield json.dumps(record, default=str) + "\n"
+    
+    return BatchResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/prompts")
-async def get_prompts(current_user: User = Depends(get_current_user)):
-    """Get user's prompts"""
-    db = get_database()
+async def get_prompts(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
+    current_user: User = Depends(get_current_user)
+):
+    """Get a page of the user's prompts, newest first.
+    
+    The cursor for the next page is returned in the X-Next-Cursor header;
+    view=summary returns previews instead of the full prompt text.
+    """
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    if is_using_supabase():
-        user_prompts = await db.get_user_prompts(current_user.id, limit=50)
+    db = get_repository()
+    if view == "summary":
+        prompts = await db.get_user_prompt_summaries(current_user.id, limit=limit, before=before)
     else:
-        user_prompts = [prompt for prompt in db.prompts.values() if prompt["user_id"] == current_user.id]
-        # Sort by created_at descending and limit to 50
-        user_prompts.sort(key=lambda x: x["created_at"], reverse=True)
-        user_prompts = user_prompts[:50]
+        prompts = await db.get_user_prompts(current_user.id, limit=limit, before=before)
     
-    return user_prompts
+    if len(prompts) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(prompts[-1])
+    return prompts
+
+@api_router.get("/prompts/search")
+async def search_prompts(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over the user's prompt history, best matches first"""
+    db = get_repository()
+    return await db.search_prompts(current_user.id, q, limit=limit, offset=offset)
+
+@api_router.get("/prompts/{prompt_id}")
+async def get_prompt(prompt_id: str, current_user: User = Depends(get_current_user)):
+    """Get the full text of a single prompt"""
+    db = get_repository()
+    prompt = await db.get_prompt(prompt_id, current_user.id)
+    if prompt is None:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    return prompt
 
 @api_router.get("/database/status")
 async def get_database_status(current_user: User = Depends(get_current_user)):
     """Get database status"""
-    db = get_database()
-    
-    if is_using_supabase():
-        return {
-            "database_type": "supabase",
-            "connected": db.is_connected(),
-            "status": "connected" if db.is_connected() else "disconnected",
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-    else:
-        return {
-            "database_type": "in_memory",
-            "connected": True,
-            "status": "connected",
-            "users_count": len(db.users),
-            "prompts_count": len(db.prompts),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
+    db = get_repository()
+    connected = db.is_connected()
+    
+    try:
+        stats = await db.get_stats() if connected else {}
+    except Exception as e:
+        logger.error(f"Failed to read database stats: {e}")
+        stats = {}
+    
+    return {
+        "database_type": get_database_type(),
+        "connected": connected,
+        "status": "connected" if connected else "disconnected",
+        **stats,
+        "operations": db.operation_stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
 
 # Include API router
 app.include_router(api_router)
@@ -378,6 +643,11 @@ app.include_router(api_router)
 async def root():
     return {"message": "PromptPilot API", "status": "running"}
 
+@app.get("/metrics")
+async def metrics():
+    """Provider latency, token and cost metrics in the Prometheus text format"""
+    return Response(content=metrics_registry.render(), media_type=metrics_registry.content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from repository import PREVIEW_CHARS, PromptCursor
+from search_index import SEARCH_MAX_CANDIDATES, tokenize
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    hashed_password TEXT NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS prompts (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    raw_input TEXT NOT NULL,
+    generated_output TEXT NOT NULL,
+    detected_role TEXT,
+    persona TEXT,
+    source TEXT,
+    analytics TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_prompts_user_created ON prompts(user_id, created_at DESC, id DESC);
+
+-- Full-text index over prompts, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+    raw_input, generated_output, content='prompts', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN
+    INSERT INTO prompts_fts(rowid, raw_input, generated_output)
+    VALUES (new.rowid, new.raw_input, new.generated_output);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_fts_delete AFTER DELETE ON prompts BEGIN
+    INSERT INTO prompts_fts(prompts_fts, rowid, raw_input, generated_output)
+    VALUES ('delete', old.rowid, old.raw_input, old.generated_output);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_fts_update AFTER UPDATE OF raw_input, generated_output ON prompts BEGIN
+    INSERT INTO prompts_fts(prompts_fts, rowid, raw_input, generated_output)
+    VALUES ('delete', old.rowid, old.raw_input, old.generated_output);
+    INSERT INTO prompts_fts(rowid, raw_input, generated_output)
+    VALUES (new.rowid, new.raw_input, new.generated_output);
+END;
+
+CREATE TABLE IF NOT EXISTS analytics_events (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    session_id TEXT,
+    event_type TEXT NOT NULL,
+    event_data TEXT NOT NULL DEFAULT '{}',
+    page_url TEXT,
+    user_agent TEXT,
+    ip_address TEXT,
+    device_info TEXT NOT NULL DEFAULT '{}',
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analytics_user_timestamp ON analytics_events(user_id, timestamp DESC);
+"""
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "is_active", "created_at", "updated_at")
+PROMPT_COLUMNS = ("id", "user_id", "raw_input", "generated_output", "detected_role", "persona", "source", "analytics", "created_at")
+EVENT_COLUMNS = ("id", "user_id", "session_id", "event_type", "event_data", "page_url", "user_agent", "ip_address", "device_info", "timestamp")
+JSON_COLUMNS = {"analytics", "event_data", "device_info"}
+PROMPT_SUMMARY_COLUMNS = (
+    "prompts.id, prompts.user_id, prompts.detected_role, prompts.persona, prompts.source, "
+    "prompts.analytics, prompts.created_at, "
+    f"substr(prompts.raw_input, 1, {PREVIEW_CHARS}) AS input_preview, "
+    f"substr(prompts.generated_output, 1, {PREVIEW_CHARS}) AS output_preview"
+)
+
+
+def _to_db(column: str, value: Any) -> Any:
+    """Convert a Python value to its SQLite column representation"""
+    if column in JSON_COLUMNS:
+        return json.dumps(value or {}, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    for column in JSON_COLUMNS & data.keys():
+        data[column] = json.loads(data[column]) if data[column] else {}
+    if "is_active" in data:
+        data["is_active"] = bool(data["is_active"])
+    return data
+
+
+class SQLiteDatabase:
+    """Embedded SQLite backend with the same async interface as SupabaseDatabase.
+
+    Runs in WAL mode so reads don't block behind writes. All statements are
+    parameterized (and therefore cached as prepared statements by sqlite3)
+    and execute on a single dedicated thread, which keeps the event loop
+    free and serializes access to the connection.
+    """
+
+    def __init__(self, path: str = "promptpilot.sqlite3"):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def connect(self) -> bool:
+        """Open the database file and create the schema"""
+        try:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+            await self._run(self._connect)
+            logger.info(f"✅ SQLite database ready at {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to open SQLite database: {e}")
+            self.conn = None
+            return False
+
+    def _connect(self):
+        self.conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prompts_fts'"
+        ).fetchone()
+        self.conn.executescript(SCHEMA)
+        if not has_fts:
+            # Index prompts stored before the full-text table existed
+            self.conn.execute("INSERT INTO prompts_fts(prompts_fts) VALUES ('rebuild')")
+
+    async def disconnect(self):
+        """Close the database file"""
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        logger.info("🔌 SQLite connection closed")
+
+    def is_connected(self) -> bool:
+        return self.conn is not None
+
+    def _insert(self, table: str, columns: tuple, data: Dict[str, Any]):
+        placeholders = ", ".join("?" for _ in columns)
+        self.conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [_to_db(column, data.get(column)) for column in columns]
+        )
+
+    def _upsert_many(self, table: str, columns: tuple, rows: List[Dict[str, Any]]):
+        placeholders = ", ".join("?" for _ in columns)
+        # An existing row with the same id (and owner) is overwritten, so retried writes are idempotent
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in ("id", "user_id"))
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates} WHERE {table}.user_id = excluded.user_id",
+                [[_to_db(column, row.get(column)) for column in columns] for row in rows]
+            )
+
+    def _fetch_one(self, sql: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(sql, params).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def _fetch_all(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        return [_row_to_dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    # User operations
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new user"""
+        await self._run(self._insert, "users", USER_COLUMNS, user_data)
+        return user_data
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        return await self._run(self._fetch_one, "SELECT * FROM users WHERE email = ?", (email,))
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        return await self._run(self._fetch_one, "SELECT * FROM users WHERE id = ?", (user_id,))
+
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update user data"""
+        update_data = {k: v for k, v in update_data.items() if k in USER_COLUMNS and k != "id"}
+        update_data["updated_at"] = datetime.now(timezone.utc)
+        assignments = ", ".join(f"{column} = ?" for column in update_data)
+        params = [_to_db(column, value) for column, value in update_data.items()] + [user_id]
+
+        def update() -> bool:
+            return self.conn.execute(f"UPDATE users SET {assignments} WHERE id = ?", params).rowcount > 0
+
+        try:
+            return await self._run(update)
+        except Exception as e:
+            logger.error(f"Error updating user: {e}")
+            return False
+
+    async def delete_user(self, user_id: str) -> bool:
+        """Delete a user and their prompts"""
+        def delete() -> bool:
+            return self.conn.execute("DELETE FROM users WHERE id = ?", (user_id,)).rowcount > 0
+
+        return await self._run(delete)
+
+    # Prompt operations
+    async def create_prompt(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new prompt"""
+        await self._run(self._insert, "prompts", PROMPT_COLUMNS, prompt_data)
+        return prompt_data
+
+    async def create_prompts(self, prompts: List[Dict[str, Any]]) -> int:
+        """Create several prompts in one transaction, replacing any with the same id"""
+        await self._run(self._upsert_many, "prompts", PROMPT_COLUMNS, prompts)
+        return len(prompts)
+
+    async def _page_prompts(self, columns: str, user_id: str, limit: int, before: Optional[PromptCursor]) -> List[Dict[str, Any]]:
+        # Keyset pagination, served by idx_prompts_user_created
+        if before is None:
+            return await self._run(
+                self._fetch_all,
+                f"SELECT {columns} FROM prompts WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, limit)
+            )
+        created_at, prompt_id = before
+        return await self._run(
+            self._fetch_all,
+            f"SELECT {columns} FROM prompts WHERE user_id = ? AND (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (user_id, created_at.isoformat(), prompt_id, limit)
+        )
+
+    async def get_user_prompts(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get user's prompts, newest first, starting after the before cursor"""
+        return await self._page_prompts("*", user_id, limit, before)
+
+    async def get_user_prompt_summaries(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get summaries of user's prompts, newest first"""
+        return await self._page_prompts(PROMPT_SUMMARY_COLUMNS, user_id, limit, before)
+
+    async def get_prompt(self, prompt_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single prompt owned by the user"""
+        return await self._run(
+            self._fetch_one, "SELECT * FROM prompts WHERE id = ? AND user_id = ?", (prompt_id, user_id)
+        )
+
+    async def delete_prompt(self, prompt_id: str, user_id: str) -> bool:
+        """Delete a prompt"""
+        def delete() -> bool:
+            return self.conn.execute(
+                "DELETE FROM prompts WHERE id = ? AND user_id = ?", (prompt_id, user_id)
+            ).rowcount > 0
+
+        return await self._run(delete)
+
+    async def search_prompts(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Full-text search over user's prompts, best matches first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Quote every term so user input can't inject FTS5 query syntax
+        match = " ".join(f'"{term}"' for term in terms)
+        # Rank only the newest SEARCH_MAX_CANDIDATES matches so common terms stay cheap
+        rows = await self._run(
+            self._fetch_all,
+            "WITH matches AS ("
+            "SELECT prompts_fts.rowid AS match_rowid, bm25(prompts_fts) AS rank FROM prompts_fts "
+            "JOIN prompts ON prompts.rowid = prompts_fts.rowid "
+            "WHERE prompts_fts MATCH ? AND prompts.user_id = ? "
+            "ORDER BY prompts_fts.rowid DESC LIMIT ?"
+            f") SELECT {PROMPT_SUMMARY_COLUMNS}, -matches.rank AS score FROM matches "
+            "JOIN prompts ON prompts.rowid = matches.match_rowid "
+            "ORDER BY matches.rank LIMIT ? OFFSET ?",
+            (match, user_id, SEARCH_MAX_CANDIDATES, limit, offset)
+        )
+        for row in rows:
+            row["score"] = round(row["score"], 4)
+        return rows
+
+    # Analytics operations
+    async def create_analytics_event(self, event_data: Dict[str, Any]) -> bool:
+        """Create analytics event"""
+        try:
+            await self._run(self._insert, "analytics_events", EVENT_COLUMNS, event_data)
+            return True
+        except Exception as e:
+            logger.error(f"Error creating analytics event: {e}")
+            return False
+
+    async def get_analytics_events(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get user's analytics events, newest first"""
+        return await self._run(
+            self._fetch_all,
+            "SELECT * FROM analytics_events WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, limit)
+        )
+
+    async def get_stats(self) -> Dict[str, int]:
+        """Row counts for status reporting"""
+        def count() -> Dict[str, int]:
+            return {
+                "users_count": self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+                "prompts_count": self.conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0],
+            }
+        return await self._run(count)
+
+
+# Global SQLite instance
+sqlite_db = SQLiteDatabase(os.getenv("SQLITE_PATH", "promptpilot.sqlite3"))
@@ -1,9 +1,15 @@
 import os
+import asyncio
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, List
 from supabase import create_client, Client
+from postgrest import SyncPostgrestClient
 from datetime import datetime, timezone
 import json
+from repository import PromptCursor
+from tracing import SPAN_KIND_CLIENT, span
 
 logger = logging.getLogger(__name__)
 
@@ -22,21 +28,57 @@ class SupabaseDatabase:
     def __init__(self):
         self.client: Optional[Client] = None
         self.connected = False
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # Failed connects are retried at most once per SUPABASE_RECONNECT_INTERVAL seconds
+        self.reconnect_interval = float(os.getenv('SUPABASE_RECONNECT_INTERVAL', '5'))
+        self.last_attempt: Optional[float] = None
+    
+    async def _execute(self, query):
+        """Run a blocking query's execute() on the bounded executor.
+        
+        The supabase client is synchronous; running it here keeps the event
+        loop free so DB round-trips overlap with other requests' I/O.
+        """
+        loop = asyncio.get_running_loop()
+        with span("db.query", SPAN_KIND_CLIENT, **{"db.system": "postgrest", "db.path": getattr(query, "path", None)}):
+            return await loop.run_in_executor(self.executor, query.execute)
         
     async def connect(self):
-        """Initialize Supabase connection"""
+        """Initialize Supabase connection.
+        
+        POSTGREST_URL points the client straight at a PostgREST server
+        (e.g. a local PostgREST + Postgres stand-in) instead of Supabase.
+        Returns False without trying if the last attempt failed less than
+        reconnect_interval seconds ago.
+        """
+        now = time.monotonic()
+        if self.last_attempt is not None and now - self.last_attempt < self.reconnect_interval:
+            return False
+        self.last_attempt = now
         try:
             supabase_url = os.getenv('SUPABASE_URL')
             supabase_key = os.getenv('SUPABASE_ANON_KEY')
+            postgrest_url = os.getenv('POSTGREST_URL')
             
-            if not supabase_url or not supabase_key:
+            if not postgrest_url and (not supabase_url or not supabase_key):
                 logger.error("Missing Supabase credentials in environment variables")
                 return False
-                
-            self.client = create_client(supabase_url, supabase_key)
+            
+            # Bounded pool for blocking queries; the client's HTTP connection pool is shared by it.
+            # Kept across reconnect attempts so retries during an outage don't leak threads.
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('SUPABASE_MAX_WORKERS', '8')),
+                    thread_name_prefix='supabase'
+                )
+            
+            if postgrest_url:
+                self.client = SyncPostgrestClient(postgrest_url)
+            else:
+                self.client = create_client(supabase_url, supabase_key)
             
             # Test connection
-            response = self.client.table('users').select('id').limit(1).execute()
+            response = await self._execute(self.client.table('users').select('id').limit(1))
             
             self.connected = True
             logger.info("✅ Supabase database connected successfully")
@@ -49,8 +91,12 @@ class SupabaseDatabase:
     
     async def disconnect(self):
         """Close Supabase connection"""
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
         self.client = None
         self.connected = False
+        self.last_attempt = None
         logger.info("🔌 Supabase connection closed")
     
     def is_connected(self) -> bool:
@@ -63,7 +109,7 @@ class SupabaseDatabase:
         try:
             # Serialize datetime objects to ISO format strings
             serialized_data = serialize_datetime(user_data)
-            response = self.client.table('users').insert(serialized_data).execute()
+            response = await self._execute(self.client.table('users').insert(serialized_data))
             return response.data[0] if response.data else {}
         except Exception as e:
             logger.error(f"Error creating user: {e}")
@@ -72,79 +118,200 @@ class SupabaseDatabase:
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         try:
-            response = self.client.table('users').select('*').eq('email', email).execute()
+            response = await self._execute(self.client.table('users').select('*').eq('email', email))
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
-            return None
+            raise
     
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         try:
-            response = self.client.table('users').select('*').eq('id', user_id).execute()
+            response = await self._execute(self.client.table('users').select('*').eq('id', user_id))
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
-            return None
+            raise
     
     async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update user data"""
         try:
             update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-            response = self.client.table('users').update(update_data).eq('id', user_id).execute()
+            response = await self._execute(self.client.table('users').update(update_data).eq('id', user_id))
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Error updating user: {e}")
             return False
     
+    async def delete_user(self, user_id: str) -> bool:
+        """Delete a user"""
+        try:
+            response = await self._execute(self.client.table('users').delete().eq('id', user_id))
+            return len(response.data) > 0
+        except Exception as e:
+            logger.error(f"Error deleting user: {e}")
+            return False
+    
     # Prompt operations
     async def create_prompt(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new prompt"""
         try:
             # Serialize datetime objects to ISO format strings
             serialized_data = serialize_datetime(prompt_data)
-            response = self.client.table('prompts').insert(serialized_data).execute()
+            response = await self._execute(self.client.table('prompts').insert(serialized_data))
             return response.data[0] if response.data else {}
         except Exception as e:
             logger.error(f"Error creating prompt: {e}")
             raise
     
-    async def get_user_prompts(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get user's prompts"""
+    async def create_prompts(self, prompts: List[Dict[str, Any]]) -> int:
+        """Create several prompts with a single multi-row upsert, replacing any with the same id"""
         try:
-            response = (
-                self.client.table('prompts')
-                .select('*')
-                .eq('user_id', user_id)
-                .order('created_at', desc=True)
-                .limit(limit)
-                .execute()
+            serialized_data = serialize_datetime(prompts)
+            response = await self._execute(self.client.table('prompts').upsert(serialized_data, on_conflict='id'))
+            return len(response.data or [])
+        except Exception as e:
+            logger.error(f"Error creating prompts: {e}")
+            raise
+    
+    async def _page_prompts(self, source: str, user_id: str, limit: int, before: Optional[PromptCursor]) -> List[Dict[str, Any]]:
+        query = self.client.table(source).select('*').eq('user_id', user_id)
+        if before is not None:
+            # Keyset pagination on (created_at, id), served by idx_prompts_user_created
+            created_at, prompt_id = before
+            created_at = created_at.isoformat()
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{prompt_id}")')
+        response = await self._execute(
+            query.order('created_at', desc=True).order('id', desc=True).limit(limit)
+        )
+        return response.data or []
+    
+    async def get_user_prompts(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get user's prompts, newest first, starting after the before cursor"""
+        try:
+            return await self._page_prompts('prompts', user_id, limit, before)
+        except Exception as e:
+            logger.error(f"Error getting user prompts: {e}")
+            return []
+    
+    async def get_user_prompt_summaries(self, user_id: str, limit: int = 50, before: Optional[PromptCursor] = None) -> List[Dict[str, Any]]:
+        """Get summaries of user's prompts from the prompt_summaries view"""
+        try:
+            return await self._page_prompts('prompt_summaries', user_id, limit, before)
+        except Exception as e:
+            logger.error(f"Error getting user prompt summaries: {e}")
+            return []
+    
+    async def get_prompt(self, prompt_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single prompt owned by the user"""
+        try:
+            response = await self._execute(
+                self.client.table('prompts').select('*').eq('id', prompt_id).eq('user_id', user_id).limit(1)
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting prompt: {e}")
+            return None
+    
+    async def search_prompts(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Full-text search over user's prompts via the search_prompts function"""
+        try:
+            response = await self._execute(
+                self.client.rpc('search_prompts', {
+                    'p_user_id': user_id,
+                    'p_query': query,
+                    'p_limit': limit,
+                    'p_offset': offset
+                })
             )
             return response.data or []
         except Exception as e:
-            logger.error(f"Error getting user prompts: {e}")
+            logger.error(f"Error searching prompts: {e}")
             return []
     
     async def delete_prompt(self, prompt_id: str, user_id: str) -> bool:
         """Delete a prompt"""
         try:
-            response = (
+            response = await self._execute(
                 self.client.table('prompts')
                 .delete()
                 .eq('id', prompt_id)
                 .eq('user_id', user_id)
-                .execute()
             )
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Error deleting prompt: {e}")
             return False
     
+    # Prompt session operations (prompt enhancer)
+    async def create_prompt_session(self, session_data: Dict[str, Any]) -> Optional[str]:
+        """Log a prompt enhancement session, returning its id"""
+        try:
+            serialized_data = serialize_datetime(session_data)
+            response = await self._execute(self.client.table('prompt_sessions').insert(serialized_data))
+            return response.data[0]['id'] if response.data else None
+        except Exception as e:
+            logger.error(f"Error creating prompt session: {e}")
+            raise
+    
+    async def create_prompt_sessions(self, sessions: List[Dict[str, Any]]) -> int:
+        """Log several prompt sessions with a single multi-row insert"""
+        try:
+            serialized_data = serialize_datetime(sessions)
+            response = await self._execute(self.client.table('prompt_sessions').insert(serialized_data))
+            return len(response.data or [])
+        except Exception as e:
+            logger.error(f"Error creating prompt sessions: {e}")
+            raise
+    
+    async def create_llm_performance_records(self, records: List[Dict[str, Any]]) -> int:
+        """Log several provider attempts with a single multi-row insert"""
+        try:
+            response = await self._execute(self.client.table('llm_performance').insert(records))
+            return len(response.data or [])
+        except Exception as e:
+            logger.error(f"Error creating llm performance records: {e}")
+            raise
+    
+    async def get_intent_training_data(self, limit: int = 50000) -> List[Dict[str, Any]]:
+        """Most recent (original_prompt, detected_intent) pairs for training the intent classifier"""
+        response = await self._execute(
+            self.client.table('prompt_sessions')
+            .select('original_prompt, detected_intent')
+            .order('created_at', desc=True)
+            .limit(limit)
+        )
+        return response.data or []
+    
+    async def get_prompt_templates(self) -> List[Dict[str, Any]]:
+        """Public prompt templates"""
+        response = await self._execute(
+            self.client.table('prompt_templates')
+            .select('name, description, intent_type, template_content, variables')
+            .eq('is_public', True)
+        )
+        return response.data or []
+    
+    async def get_prompt_sessions(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get user's recent prompt sessions"""
+        try:
+            response = await self._execute(
+                self.client.table('prompt_sessions')
+                .select('*')
+                .eq('user_id', user_id)
+                .order('created_at', desc=True)
+                .limit(limit)
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Error getting prompt sessions: {e}")
+            return []
+    
     # Analytics operations
     async def create_analytics_event(self, event_data: Dict[str, Any]) -> bool:
         """Create analytics event"""
         try:
-            response = self.client.table('analytics_events').insert(event_data).execute()
+            response = await self._execute(self.client.table('analytics_events').insert(event_data))
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Error creating analytics event: {e}")
@@ -153,22 +320,31 @@ class SupabaseDatabase:
     async def get_analytics_events(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get user's analytics events"""
         try:
-            response = (
+            response = await self._execute(
                 self.client.table('analytics_events')
                 .select('*')
                 .eq('user_id', user_id)
                 .order('timestamp', desc=True)
                 .limit(limit)
-                .execute()
             )
             return response.data or []
         except Exception as e:
             logger.error(f"Error getting analytics events: {e}")
             return []
 
+    async def get_stats(self) -> Dict[str, int]:
+        """Row counts for status reporting"""
+        users = await self._execute(self.client.table('users').select('id', count='exact').limit(1))
+        prompts = await self._execute(self.client.table('prompts').select('id', count='exact').limit(1))
+        return {"users_count": users.count or 0, "prompts_count": prompts.count or 0}
+
 # Global Supabase instance
 supabase_db = SupabaseDatabase()
 
+def supabase_configured() -> bool:
+    """Whether Supabase (or a PostgREST stand-in) credentials are set"""
+    return bool(os.getenv('POSTGREST_URL') or (os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_ANON_KEY')))
+
 async def get_supabase_client() -> SupabaseDatabase:
     """Get Supabase database client"""
     return supabase_db
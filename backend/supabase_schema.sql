@@ -34,6 +34,55 @@ CREATE TABLE IF NOT EXISTS prompts (
 -- Create indexes for prompts
 CREATE INDEX IF NOT EXISTS idx_prompts_user_id ON prompts(user_id);
 CREATE INDEX IF NOT EXISTS idx_prompts_created_at ON prompts(created_at DESC);
+-- Keyset pagination of a user's history on (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_prompts_user_created ON prompts(user_id, created_at DESC, id DESC);
+
+-- Prompt history summaries: metadata plus short previews instead of the full text
+-- (preview length must match PREVIEW_CHARS in repository.py)
+CREATE OR REPLACE VIEW prompt_summaries AS
+SELECT
+    id,
+    user_id,
+    detected_role,
+    persona,
+    source,
+    analytics,
+    created_at,
+    LEFT(raw_input, 200) AS input_preview,
+    LEFT(generated_output, 200) AS output_preview
+FROM prompts;
+
+-- Full-text search over a user's prompts (raw input weighted above generated output)
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+ALTER TABLE prompts ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(raw_input, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(generated_output, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_prompts_user_search ON prompts USING GIN (user_id, search_vector);
+
+CREATE OR REPLACE FUNCTION search_prompts(p_user_id UUID, p_query TEXT, p_limit INTEGER DEFAULT 20, p_offset INTEGER DEFAULT 0)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    detected_role VARCHAR,
+    persona VARCHAR,
+    source VARCHAR,
+    analytics JSONB,
+    created_at TIMESTAMPTZ,
+    input_preview TEXT,
+    output_preview TEXT,
+    score REAL
+) AS $$
+    SELECT
+        p.id, p.user_id, p.detected_role, p.persona, p.source, p.analytics, p.created_at,
+        LEFT(p.raw_input, 200), LEFT(p.generated_output, 200),
+        ts_rank_cd(p.search_vector, q) AS score
+    FROM prompts p, plainto_tsquery('english', p_query) q
+    WHERE p.user_id = p_user_id AND p.search_vector @@ q
+    ORDER BY score DESC, p.created_at DESC
+    LIMIT p_limit OFFSET p_offset;
+$$ LANGUAGE sql STABLE;
 
 -- Analytics events table
 CREATE TABLE IF NOT EXISTS analytics_events (
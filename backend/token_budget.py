@@ -0,0 +1,127 @@
+import math
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+# Words, runs of digits and individual symbols, roughly how BPE tokenizers split text
+PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_+")
+
+# Context window (tokens) of the model each provider generates with
+PROVIDER_CONTEXT_TOKENS = {
+    "gemini": 1048576,
+    "openai": 8192,
+    "claude": 200000,
+}
+
+TRUNCATION_MARKER = "\n[... {omitted} tokens omitted ...]\n"
+
+
+def piece_tokens(piece: str) -> int:
+    """Approximate token count of a single word, number or symbol"""
+    if not piece.isascii():
+        # CJK and most other scripts average about one token per character
+        return len(piece)
+    if piece.isdigit():
+        return math.ceil(len(piece) / 3)
+    # Common English words are single tokens; longer ones split into ~6 character pieces
+    return math.ceil(len(piece) / 6)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text, without calling a tokenizer.
+
+    Tracks cl100k / SentencePiece counts within about 15% on English
+    prose and code, which is enough for budgeting and cost estimates.
+    """
+    return sum(piece_tokens(piece) for piece in PIECE_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, head_share: float = 0.7) -> Tuple[str, int, bool]:
+    """Fit text into max_tokens, returning (text, original_tokens, truncated).
+
+    Over-long text keeps its beginning and end (where requests usually
+    state the task and the question) and replaces the middle with a
+    marker saying how much was omitted.
+    """
+    spans = [(match.end(), piece_tokens(match.group())) for match in PIECE_RE.finditer(text)]
+    total = sum(tokens for _, tokens in spans)
+    if total <= max_tokens:
+        return text, total, False
+
+    keep = max(max_tokens - estimate_tokens(TRUNCATION_MARKER.format(omitted=total)), 0)
+    head_budget = int(keep * head_share)
+    tail_budget = keep - head_budget
+
+    head_end = used = 0
+    for end, tokens in spans:
+        if used + tokens > head_budget:
+            break
+        used += tokens
+        head_end = end
+
+    tail_start = len(text)
+    used = 0
+    for index in range(len(spans) - 1, -1, -1):
+        tokens = spans[index][1]
+        if used + tokens > tail_budget:
+            break
+        used += tokens
+        tail_start = spans[index - 1][0] if index > 0 else 0
+    # Don't cut through a word that spans several pieces ("gpt4o")
+    while head_end > 0 and head_end < len(text) and not text[head_end].isspace() and not text[head_end - 1].isspace():
+        head_end -= 1
+    while tail_start < len(text) and tail_start > 0 and not text[tail_start].isspace() and not text[tail_start - 1].isspace():
+        tail_start += 1
+    tail_start = max(tail_start, head_end)
+
+    omitted = total - estimate_tokens(text[:head_end]) - estimate_tokens(text[tail_start:])
+    return text[:head_end] + TRUNCATION_MARKER.format(omitted=omitted) + text[tail_start:], total, True
+
+
+class TokenBudget:
+    """Input token budgets derived from each provider's context window.
+
+    A request may be served by any provider in the fallback chain, so the
+    input has to fit the smallest context window among them after
+    reserving room for the output. max_input_tokens additionally caps
+    user input regardless of the provider.
+    """
+
+    def __init__(
+        self,
+        context_tokens: Optional[Dict[str, int]] = None,
+        max_input_tokens: int = 6000,
+        safety_margin: float = 0.1,
+    ):
+        self.context_tokens = dict(context_tokens or PROVIDER_CONTEXT_TOKENS)
+        self.max_input_tokens = max_input_tokens
+        # Headroom for estimation error
+        self.safety_margin = safety_margin
+
+    def prompt_budget(self, providers: Iterable[str], output_tokens: int) -> int:
+        """Largest prompt (in tokens) every listed provider can accept"""
+        windows = [self.context_tokens[p] for p in providers if p in self.context_tokens]
+        window = min(windows) if windows else min(self.context_tokens.values())
+        return int((window - output_tokens) * (1 - self.safety_margin))
+
+    def input_budget(self, providers: Iterable[str], output_tokens: int, overhead_tokens: int) -> int:
+        """Tokens left for user input once the template and output are accounted for"""
+        available = self.prompt_budget(providers, output_tokens) - overhead_tokens
+        return max(min(available, self.max_input_tokens), 0)
+
+    def fit(self, text: str, providers: Iterable[str], output_tokens: int, overhead_tokens: int) -> Tuple[str, int, bool]:
+        """Truncate text to the input budget; see truncate_to_tokens"""
+        return truncate_to_tokens(text, self.input_budget(providers, output_tokens, overhead_tokens))
+
+
+def create_token_budget() -> TokenBudget:
+    """Build a token budget from <PROVIDER>_CONTEXT_TOKENS and PROMPT_MAX_INPUT_TOKENS"""
+    context_tokens = {
+        provider: int(os.getenv(f"{provider.upper()}_CONTEXT_TOKENS", str(tokens)))
+        for provider, tokens in PROVIDER_CONTEXT_TOKENS.items()
+    }
+    return TokenBudget(
+        context_tokens,
+        max_input_tokens=int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "6000")),
+        safety_margin=float(os.getenv("PROMPT_TOKEN_SAFETY_MARGIN", "0.1")),
+    )
@@ -0,0 +1,461 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SERVER_TIMING_NAME_RE = re.compile(r"[^\w.-]")
+SERVER_TIMING_MAX_ENTRIES = 20
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Span:
+    """One timed operation within a request trace"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "attributes", "started", "ended", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        """Close the span; only the first call counts"""
+        if self.ended is not None:
+            return
+        self.ended = time.perf_counter()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:500]
+
+    @property
+    def duration(self) -> float:
+        return (self.ended or time.perf_counter()) - self.started
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.trace.unix_ns(self.started)),
+            "endTimeUnixNano": str(self.trace.unix_ns(self.ended or time.perf_counter())),
+            "attributes": otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class NoopSpan:
+    """Stands in for a span when the request isn't traced"""
+
+    def set(self, **attributes: Any):
+        pass
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+# Innermost open span of the current request; new spans become its children
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """The spans recorded for one request.
+
+    Span times come from the monotonic clock and are converted to Unix
+    time against the trace's start, so exported timestamps stay ordered
+    even if the wall clock is adjusted mid-request.
+    """
+
+    def __init__(
+        self,
+        trace_id: Optional[str] = None,
+        remote_parent_id: Optional[str] = None,
+        sampled: bool = False,
+        max_spans: int = 256
+    ):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.remote_parent_id = remote_parent_id
+        # Sampled traces are exported once the request finishes
+        self.sampled = sampled
+        self.max_spans = max_spans
+        self.started = time.perf_counter()
+        self.started_ns = time.time_ns()
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def start_span(self, name: str, parent: Optional[Span], kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return NOOP_SPAN
+        span = Span(self, name, parent.span_id if parent else self.remote_parent_id, kind, attributes)
+        self.spans.append(span)
+        return span
+
+    def unix_ns(self, at: float) -> int:
+        return self.started_ns + int((at - self.started) * 1e9)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: time per span name, plus the total so far"""
+        totals: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            if span.ended is not None:
+                name = SERVER_TIMING_NAME_RE.sub("_", span.name)
+                totals[name] = totals.get(name, 0.0) + span.duration
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+        entries = entries[:SERVER_TIMING_MAX_ENTRIES]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    converted = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            converted.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            converted.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            converted.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            converted.append({"key": key, "value": {"stringValue": str(value)}})
+    return converted
+
+
+def open_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+    """Start a child of the current span without making it current; the caller ends it"""
+    parent = current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return parent.trace.start_span(name, parent, kind, **attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+    """Time the enclosed block as a child of the current span.
+
+    Costs one context variable lookup when the request isn't traced.
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = parent.trace.start_span(name, parent, kind, **attributes)
+    token = current_span.set(child) if isinstance(child, Span) else None
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        child.end()
+        if token is not None:
+            current_span.reset(token)
+
+
+def otlp_payload(traces: List[Trace], service_name: str) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for finished traces"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "promptpilot.tracing"},
+                "spans": [span.to_otlp() for trace in traces for span in trace.spans],
+            }],
+        }]
+    }
+
+
+class TraceExporter:
+    """Exports sampled traces in batches, off the request path.
+
+    Traces are written as OTLP/JSON: one ExportTraceServiceRequest per
+    line of file_path and/or POSTed to an OTLP/HTTP collector endpoint
+    (e.g. http://localhost:4318/v1/traces). When the exporter falls
+    behind, traces beyond max_pending are dropped rather than queued.
+    """
+
+    def __init__(
+        self,
+        file_path: Optional[str] = None,
+        collector_url: Optional[str] = None,
+        service_name: str = "promptpilot",
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_pending: int = 5000,
+    ):
+        self.file_path = file_path
+        self.collector_url = collector_url
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.pending: List[Trace] = []
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.closing = False
+
+        self.exported = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def enqueue(self, trace: Trace):
+        """Queue a finished trace; returns immediately"""
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append(trace)
+        if len(self.pending) >= self.batch_size:
+            self.wake.set()
+
+    async def start(self):
+        if self.task is not None:
+            return
+        self.closing = False
+        if self.collector_url:
+            self.client = httpx.AsyncClient(timeout=5.0)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Export what is still pending and stop"""
+        if self.task is None:
+            return
+        self.closing = True
+        self.wake.set()
+        try:
+            await asyncio.wait_for(self.task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"⚠️ Trace export drain timed out, dropping {len(self.pending)} traces")
+        finally:
+            self.task = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def _run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self):
+        while self.pending:
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+            try:
+                await self._export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.failed_batches += 1
+                logger.warning(f"Exporting {len(batch)} traces failed: {e}")
+
+    async def _export(self, traces: List[Trace]):
+        payload = otlp_payload(traces, self.service_name)
+        if self.file_path:
+            line = json.dumps(payload, default=str) + "\n"
+            await asyncio.get_running_loop().run_in_executor(None, self._append, line)
+        if self.client:
+            response = await self.client.post(self.collector_url, json=payload)
+            response.raise_for_status()
+
+    def _append(self, line: str):
+        with open(self.file_path, "a", encoding="utf-8") as export:
+            export.write(line)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+
+class Tracer:
+    """Decides which requests are traced and hands finished traces to the exporter.
+
+    Every request is traced while Server-Timing headers are enabled (a
+    few dozen span objects per request); sample_rate only decides which
+    traces are also exported. An incoming traceparent header continues
+    the caller's trace and its sampled flag overrides sample_rate.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        server_timing: bool = True,
+        exporter: Optional[TraceExporter] = None,
+        max_spans: int = 256,
+    ):
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        self.exporter = exporter
+        self.max_spans = max_spans
+
+    def begin(self, traceparent: Optional[str] = None) -> Optional[Trace]:
+        """A new trace for a request, or None if it needn't be traced"""
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = None, None, random.random() < self.sample_rate
+        sampled = sampled and self.exporter is not None
+        if not sampled and not self.server_timing:
+            return None
+        return Trace(trace_id, parent_id, sampled, self.max_spans)
+
+    def finish(self, trace: Trace):
+        if trace.sampled:
+            self.exporter.enqueue(trace)
+
+    async def start(self):
+        if self.exporter:
+            await self.exporter.start()
+
+    async def stop(self):
+        if self.exporter:
+            await self.exporter.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "server_timing": self.server_timing,
+            "exporter": self.exporter.stats() if self.exporter else None,
+        }
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header"""
+    if not header:
+        return None
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens the root span of each request.
+
+    Adds a Server-Timing header summarising the request's spans and an
+    X-Trace-Id header to the response. For streamed responses the
+    Server-Timing header covers the work done before the first byte.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        trace = self.tracer.begin(traceparent)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        root = trace.start_span(
+            f"{scope['method']} {scope['path']}",
+            None,
+            SPAN_KIND_SERVER,
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        )
+        token = current_span.set(root)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status_code": message["status"]})
+                headers = list(message.get("headers", []))
+                if self.tracer.server_timing:
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                # Also identifies the request's llm_performance rows when the trace isn't exported
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException as e:
+            root.end(e)
+            raise
+        finally:
+            # Name the span after the matched route to keep span names low-cardinality
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                root.name = f"{scope['method']} {route.path}"
+            root.end()
+            current_span.reset(token)
+            self.tracer.finish(trace)
+
+
+def create_tracer() -> Tracer:
+    """Build a tracer from TRACE_* environment variables.
+
+    Traces are exported to TRACE_EXPORT_FILE and/or TRACE_COLLECTOR_URL
+    when either is set, for a TRACE_SAMPLE_RATE share of requests.
+    """
+    file_path = os.getenv("TRACE_EXPORT_FILE")
+    collector_url = os.getenv("TRACE_COLLECTOR_URL")
+    exporter = None
+    if file_path or collector_url:
+        exporter = TraceExporter(
+            file_path=file_path,
+            collector_url=collector_url,
+            service_name=os.getenv("TRACE_SERVICE_NAME", "promptpilot"),
+            batch_size=int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("TRACE_EXPORT_INTERVAL", "2.0")),
+            max_pending=int(os.getenv("TRACE_EXPORT_MAX_PENDING", "5000")),
+        )
+    return Tracer(
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.0")),
+        server_timing=os.getenv("TRACE_SERVER_TIMING", "true").lower() == "true",
+        exporter=exporter,
+        max_spans=int(os.getenv("TRACE_MAX_SPANS", "256")),
+    )
@@ -0,0 +1,82 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from response_cache import LRUCache
+
+# Marker stored for ids that are known not to exist
+_MISSING = object()
+
+
+class UserCache:
+    """Short-TTL cache of user records keyed by id.
+
+    Unknown ids are cached as misses for a shorter negative TTL so repeated
+    lookups of bogus ids don't each cost a database round-trip, and the LRU
+    bound keeps memory flat however many distinct ids are tried. Loader
+    errors are never cached, so the loader must raise (not return None)
+    when it can't tell whether the user exists.
+    Writers must call invalidate() when a user is updated or deleted; a
+    load that was already running when invalidate() was called is
+    returned but not cached.
+    """
+
+    def __init__(self, ttl: float = 30, negative_ttl: float = 5, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = LRUCache(max_entries=max_entries)
+        # Per id with loads in flight: [invalidation count, loads in flight]
+        self.loads: Dict[str, List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        user_id: str,
+        loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached user, loading (and caching) it on a miss"""
+        cached = self.entries.get(user_id)
+        if cached is not None:
+            self.hits += 1
+            return None if cached is _MISSING else cached
+
+        self.misses += 1
+        state = self.loads.setdefault(user_id, [0, 0])
+        generation = state[0]
+        state[1] += 1
+        try:
+            user = await loader(user_id)
+        finally:
+            state[1] -= 1
+            if not state[1]:
+                del self.loads[user_id]
+        if state[0] != generation:
+            # Invalidated while loading; the result may predate the write
+            return user
+        if user is None:
+            self.entries.set(user_id, _MISSING, self.negative_ttl)
+        else:
+            self.entries.set(user_id, user, self.ttl)
+        return user
+
+    def invalidate(self, user_id: str):
+        """Drop a user from the cache after it changed"""
+        self.entries.delete(user_id)
+        state = self.loads.get(user_id)
+        if state is not None:
+            state[0] += 1
+
+    def clear(self):
+        self.entries.clear()
+        for state in self.loads.values():
+            state[0] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+user_cache = UserCache(
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "30")),
+    negative_ttl=float(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "5")),
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+)
@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+# [failed write attempts, record]
+Entry = List[Any]
+
+
+class WriteBehindQueue:
+    """Buffers records in memory and writes them to the database in batches.
+
+    enqueue() never waits on the database: records are flushed by a
+    background task once batch_size records are pending or every
+    flush_interval seconds, whichever comes first, using a single
+    multi-row write per batch. A failing batch is split in halves to
+    isolate the records that fail on their own, so one bad row doesn't
+    hold back the rest; if both halves fail the database is assumed to be
+    down and the whole batch is kept. Failed records (and records beyond
+    max_pending) are appended to an on-disk spill file as JSON lines,
+    which is replayed on the next start() and after the next successful
+    flush. A record that has failed max_attempts times is moved to a
+    dead-letter file instead. Spill files stop growing at max_spill_bytes;
+    with spill_path=None failed records are logged and dropped. stop()
+    drains everything that is still pending.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        writer: Callable[[List[Record]], Awaitable[Any]],
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        spill_path: Optional[str] = None,
+        decode: Optional[Callable[[Record], Record]] = None,
+        max_attempts: int = 5,
+        max_spill_bytes: int = 50 * 1024 * 1024,
+    ):
+        self.name = name
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.dead_letter_path = None
+        if spill_path:
+            base = spill_path[:-len(".spill.jsonl")] if spill_path.endswith(".spill.jsonl") else spill_path
+            self.dead_letter_path = f"{base}.dead.jsonl"
+        self.decode = decode
+        self.max_attempts = max_attempts
+        self.max_spill_bytes = max_spill_bytes
+
+        self.pending: List[Record] = []
+        # Entries taken off pending (or out of the spill file) and not yet written or spilled
+        self.in_flight: List[Entry] = []
+        self.wake = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.closing = False
+
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+
+    def enqueue(self, record: Record):
+        """Queue a record for writing; returns immediately"""
+        if len(self.pending) >= self.max_pending:
+            # The database is falling behind; keep memory bounded
+            self._spill([[0, record]])
+            return
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            self.wake.set()
+
+    async def start(self):
+        """Replay any spilled records and start the background flusher"""
+        if self.task is not None:
+            return
+        self.closing = False
+        self.task = asyncio.create_task(self._run())
+        await self.replay_spill()
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush everything still pending and stop the flusher"""
+        if self.task is None:
+            return
+        self.closing = True
+        self.wake.set()
+        try:
+            await asyncio.wait_for(self.task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"⚠️ {self.name} write-behind drain timed out, spilling "
+                f"{len(self.in_flight) + len(self.pending)} records"
+            )
+        finally:
+            self.task = None
+        # Includes a batch whose write was cancelled by the timeout
+        leftover = self.in_flight + [[0, record] for record in self.pending]
+        self.in_flight = []
+        self.pending = []
+        spilled = self._spill(leftover) if leftover else True
+        # The unwritten records of an interrupted replay are part of the leftover
+        if spilled and self.spill_path and os.path.exists(self._replay_path()):
+            os.remove(self._replay_path())
+
+    async def _run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"{self.name} write-behind flush failed: {e}")
+        await self.flush()
+
+    async def flush(self):
+        """Write all pending records, one batch at a time"""
+        async with self.lock:
+            wrote_any = False
+            while self.pending:
+                batch = [[0, record] for record in self.pending[:self.batch_size]]
+                del self.pending[:self.batch_size]
+                self.in_flight = batch
+                if await self._write(batch):
+                    wrote_any = True
+            if wrote_any and not self.closing and self.spill_path and os.path.exists(self.spill_path):
+                await self._replay()
+
+    async def _write(self, entries: List[Entry]) -> bool:
+        """Write entries, spilling the ones that fail; True if any were written"""
+        error = await self._try(entries)
+        if error is None:
+            return True
+        return await self._isolate(entries, error)
+
+    async def _isolate(self, entries: List[Entry], error: Exception) -> bool:
+        """Split a failed batch to find the records that fail on their own"""
+        if len(entries) == 1:
+            self._failed(entries, error)
+            return False
+        middle = len(entries) // 2
+        halves = (entries[:middle], entries[middle:])
+        errors = [await self._try(half) for half in halves]
+        if errors[0] is not None and errors[1] is not None:
+            # Everything failing looks like an outage rather than bad records
+            self._failed(entries, errors[0])
+            return False
+        for half, half_error in zip(halves, errors):
+            if half_error is not None:
+                await self._isolate(half, half_error)
+        return True
+
+    async def _try(self, entries: List[Entry]) -> Optional[Exception]:
+        try:
+            await self.writer([record for _, record in entries])
+        except Exception as e:
+            self.failed_batches += 1
+            return e
+        self.written += len(entries)
+        self.batches += 1
+        self._settle(entries)
+        return None
+
+    def _settle(self, entries: List[Entry]):
+        done = {id(entry) for entry in entries}
+        self.in_flight = [entry for entry in self.in_flight if id(entry) not in done]
+
+    def _failed(self, entries: List[Entry], error: Exception):
+        self._settle(entries)
+        retry, dead = [], []
+        for entry in entries:
+            entry[0] += 1
+            (dead if entry[0] >= self.max_attempts else retry).append(entry)
+        if retry:
+            if self.spill_path:
+                logger.warning(f"{self.name} write of {len(retry)} records failed, spilling to disk: {error}")
+            else:
+                logger.warning(f"{self.name} write of {len(retry)} records failed: {error}")
+            self._spill(retry)
+        if dead and self.dead_letter_path:
+            logger.error(
+                f"❌ {len(dead)} {self.name} records failed {self.max_attempts} times, "
+                f"moving to {self.dead_letter_path}: {error}"
+            )
+            if self._append(self.dead_letter_path, dead):
+                self.dead_lettered += len(dead)
+        elif dead:
+            self._spill(dead)
+
+    def _spill(self, entries: List[Entry]) -> bool:
+        if not self._append(self.spill_path, entries):
+            return False
+        self.spilled += len(entries)
+        return True
+
+    def _append(self, path: Optional[str], entries: List[Entry]) -> bool:
+        if path is None:
+            logger.warning(f"Dropping {len(entries)} {self.name} records (spilling disabled)")
+            self.dropped += len(entries)
+            return False
+        try:
+            if os.path.exists(path) and os.path.getsize(path) >= self.max_spill_bytes:
+                logger.error(f"❌ {path} reached {self.max_spill_bytes} bytes, dropping {len(entries)} {self.name} records")
+                self.dropped += len(entries)
+                return False
+            with open(path, "a", encoding="utf-8") as spill:
+                for attempts, record in entries:
+                    spill.write(json.dumps({"attempts": attempts, "record": record}, default=str) + "\n")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Could not spill {len(entries)} {self.name} records: {e}")
+            self.dropped += len(entries)
+            return False
+
+    async def replay_spill(self):
+        """Write records left in the spill file by earlier failures"""
+        async with self.lock:
+            await self._replay()
+
+    def _read_spill(self, path: str) -> List[Entry]:
+        entries = []
+        with open(path, encoding="utf-8") as spill:
+            for line in spill:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt {self.name} spill line")
+                    continue
+                if isinstance(entry, dict) and set(entry) == {"attempts", "record"}:
+                    attempts, record = entry["attempts"], entry["record"]
+                else:
+                    # Written before attempts were tracked
+                    attempts, record = 1, entry
+                entries.append([attempts, self.decode(record) if self.decode else record])
+        return entries
+
+    def _replay_path(self) -> str:
+        return f"{self.spill_path}.replay"
+
+    async def _replay(self):
+        if not self.spill_path:
+            return
+        # Move the file aside first so failures during replay spill to a fresh file.
+        # A replay file left by a process that died mid-replay is replayed again
+        # (records may be written twice, but none are lost).
+        replay_path = self._replay_path()
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+
+        entries = self._read_spill(replay_path)
+        self.in_flight = list(entries)
+
+        if entries:
+            logger.info(f"🔁 Replaying {len(entries)} spilled {self.name} records")
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            before = self.written
+            await self._write(batch)
+            self.replayed += self.written - before
+        # Every record is now written, re-spilled or dead-lettered
+        os.remove(replay_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue counters for health reporting"""
+        return {
+            "pending": len(self.pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dead_lettered": self.dead_lettered,
+            "dropped": self.dropped,
+        }
+
+
+def create_write_behind_queue(
+    name: str,
+    writer: Callable[[List[Record]], Awaitable[Any]],
+    decode: Optional[Callable[[Record], Record]] = None,
+    spill: bool = True,
+) -> WriteBehindQueue:
+    """Build a write-behind queue from WRITE_BEHIND_* environment variables.
+
+    spill=False drops records that fail to write instead of keeping them
+    on disk, for writers whose database may not be configured at all.
+    """
+    spill_dir = os.getenv("WRITE_BEHIND_SPILL_DIR", ".")
+    return WriteBehindQueue(
+        name,
+        writer,
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50")),
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5")),
+        max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000")),
+        spill_path=os.path.join(spill_dir, f"{name}.spill.jsonl") if spill else None,
+        decode=decode,
+        max_attempts=int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5")),
+        max_spill_bytes=int(os.getenv("WRITE_BEHIND_MAX_SPILL_BYTES", str(50 * 1024 * 1024))),
+    )
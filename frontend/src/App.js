@@ -1497,7 +1497,7 @@ const History = () => {
 
   const fetchHistory = async () => {
     try {
-      const response = await axios.get(`${API}/prompts`);
+      const response = await axios.get(`${API}/prompts`, { params: { view: "summary" } });
       setPrompts(response.data);
     } catch (error) {
       console.error("Failed to fetch history:", error);
@@ -1505,6 +1505,15 @@ const History = () => {
     setLoading(false);
   };
 
+  const selectPrompt = async (id) => {
+    try {
+      const response = await axios.get(`${API}/prompts/${id}`);
+      setSelectedPrompt(response.data);
+    } catch (error) {
+      console.error("Failed to fetch prompt:", error);
+    }
+  };
+
   const deletePrompt = async (id) => {
     try {
       await axios.delete(`${API}/prompts/${id}`);
@@ -1549,10 +1558,10 @@ const History = () => {
                 <div 
                   key={prompt.id} 
                   className={`history-item ${selectedPrompt?.id === prompt.id ? 'selected' : ''}`}
-                  onClick={() => setSelectedPrompt(prompt)}
+                  onClick={() => selectPrompt(prompt.id)}
                 >
                   <div className="history-item-header">
-                    <h3>{prompt.raw_input.substring(0, 50)}...</h3>
+                    <h3>{prompt.input_preview.substring(0, 50)}...</h3>
                     <button 
                       onClick={(e) => {
                         e.stopPropagation();